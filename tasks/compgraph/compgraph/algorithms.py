@@ -15,30 +15,43 @@ def word_count_graph(input_stream_name: str, text_column: str = 'text', count_co
         .map(operations.FilterPunctuation(text_column)) \
         .map(operations.LowerCase(text_column)) \
         .map(operations.Split(text_column)) \
-        .sort([text_column]) \
+        .sort([text_column], parallelism=None) \
         .reduce(operations.Count(count_column), [text_column]) \
         .sort([count_column, text_column])
 
 
 def inverted_index_graph(input_stream_name: str, doc_column: str = 'doc_id', text_column: str = 'text',
-                         result_column: str = 'tf_idf') -> Graph:
-    """Constructs graph which calculates td-idf for every word/document pair"""
+                         result_column: str = 'tf_idf', docs_sorted: bool = False) -> Graph:
+    """Constructs graph which calculates td-idf for every word/document pair.
+
+    ``docs_sorted`` declares that input rows come ordered by ``doc_column``, so per-document sorts only sort
+    within documents.
+    """
 
     class IDFMapper(operations.Mapper):
-        def __init__(self, word_column: str, docs_with_word_col: str, total_docs_col: str, result: str) -> None:
+        def __init__(self, word_column: str, docs_with_word_col: str, total_docs_param: str, result: str,
+                     total_docs: int = 0) -> None:
             self._word_column = word_column
             self._docs_with_word_col = docs_with_word_col
-            self._total_docs_col = total_docs_col
+            self._total_docs_param = total_docs_param
             self._result = result
+            self._total_docs = total_docs
 
         def __call__(self, row: operations.TRow) -> operations.TRowsGenerator:
             docs_with_word = row[self._docs_with_word_col]
-            total_docs = row[self._total_docs_col]
+            total_docs = self._total_docs
             idf_value = math.log(total_docs / docs_with_word) if docs_with_word else 0
             new_row = dict(row)
             new_row[self._result] = idf_value
             yield new_row
 
+        def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+            return operations.order_prefix(order, {self._result})
+
+        def with_params(self, params: tp.Mapping[str, tp.Any]) -> 'IDFMapper':
+            return IDFMapper(self._word_column, self._docs_with_word_col, self._total_docs_param, self._result,
+                             params[self._total_docs_param])
+
     class TfIdfMapper(operations.Mapper):
         def __init__(self, tf_column: str, idf_column: str, result: str) -> None:
             self._tf_column = tf_column
@@ -52,8 +65,11 @@ def inverted_index_graph(input_stream_name: str, doc_column: str = 'doc_id', tex
             new_row[self._result] = tf_val * idf_val
             yield new_row
 
+        def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+            return operations.order_prefix(order, {self._result})
+
     # prepare words
-    split_words = Graph.graph_from_iter(input_stream_name) \
+    split_words = Graph.graph_from_iter(input_stream_name, sorted_by=[doc_column] if docs_sorted else []) \
         .map(operations.FilterPunctuation(text_column)) \
         .map(operations.LowerCase(text_column)) \
         .map(operations.Split(text_column))
@@ -68,8 +84,9 @@ def inverted_index_graph(input_stream_name: str, doc_column: str = 'doc_id', tex
         .reduce(operations.FirstReducer(), [doc_column, text_column]) \
         .sort([text_column]) \
         .reduce(operations.Count('docs_with_word'), [text_column]) \
-        .join(operations.InnerJoiner(), count_docs, []) \
-        .map(IDFMapper(text_column, 'docs_with_word', 'doc_count', 'idf'))
+        .with_scalar('doc_count', count_docs) \
+        .map(IDFMapper(text_column, 'docs_with_word', 'doc_count', 'idf')) \
+        .sort([text_column])
 
     # tf part
     tf_graph = split_words \
@@ -87,8 +104,11 @@ def inverted_index_graph(input_stream_name: str, doc_column: str = 'doc_id', tex
 
 
 def pmi_graph(input_stream_name: str, doc_column: str = 'doc_id', text_column: str = 'text',
-              result_column: str = 'pmi') -> Graph:
-    """Constructs graph which gives for every document the top 10 words ranked by pointwise mutual information"""
+              result_column: str = 'pmi', docs_sorted: bool = False) -> Graph:
+    """Constructs graph which gives for every document the top 10 words ranked by pointwise mutual information.
+
+    ``docs_sorted`` declares that input rows come ordered by ``doc_column`` (see :func:`inverted_index_graph`).
+    """
 
     class PmiMapper(operations.Mapper):
         def __init__(self, num_col: str, denom_col: str, result: str) -> None:
@@ -103,6 +123,9 @@ def pmi_graph(input_stream_name: str, doc_column: str = 'doc_id', text_column: s
             new_row[self._result] = math.log(numerator / denominator)
             yield new_row
 
+        def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+            return operations.order_prefix(order, {self._result})
+
     class RatioMapper(operations.Mapper):
         def __init__(self, num_col: str, denom_col: str, result: str) -> None:
             self._num_col = num_col
@@ -116,36 +139,37 @@ def pmi_graph(input_stream_name: str, doc_column: str = 'doc_id', text_column: s
             new_row[self._result] = numerator / denominator if denominator else 0
             yield new_row
 
-    base_words = Graph.graph_from_iter(input_stream_name) \
+        def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+            return operations.order_prefix(order, {self._result})
+
+    base_words = Graph.graph_from_iter(input_stream_name, sorted_by=[doc_column] if docs_sorted else []) \
         .map(operations.FilterPunctuation(text_column)) \
         .map(operations.LowerCase(text_column)) \
         .map(operations.Split(text_column))
 
     doc_counts = base_words \
-        .sort([doc_column, text_column]) \
+        .sort([doc_column, text_column], parallelism=None) \
         .reduce(operations.Count('doc_count'), [doc_column, text_column]) \
         .map(operations.Filter(lambda row: len(row[text_column]) > 4 and row['doc_count'] >= 2))
 
-    doc_lengths = doc_counts \
-        .sort([doc_column]) \
-        .reduce(operations.Sum('doc_count'), [doc_column]) \
-        .map(operations.Project([doc_column, 'doc_count']))
-
     global_counts = doc_counts \
-        .sort([text_column]) \
+        .sort([text_column], parallelism=None) \
         .reduce(operations.Sum('doc_count'), [text_column])
 
     total_words = doc_counts.reduce(operations.Sum('doc_count'), [])
 
+    def _global_freq(row: operations.TRow, total_words: int) -> float:
+        return row['doc_count'] / total_words if total_words else 0
+
     global_freq = global_counts \
-        .join(operations.InnerJoiner(), total_words, []) \
-        .map(RatioMapper('doc_count_1', 'doc_count_2', 'global_freq')) \
+        .with_scalar('total_words', total_words, 'doc_count') \
+        .map(operations.ComputeColumn('global_freq', _global_freq, params=['total_words'])) \
         .map(operations.Project([text_column, 'global_freq'])) \
         .sort([text_column])
 
     doc_freq = doc_counts \
-        .join(operations.InnerJoiner(), doc_lengths, [doc_column]) \
-        .map(RatioMapper('doc_count_1', 'doc_count_2', 'doc_freq')) \
+        .annotate(operations.Aggregate({'doc_length': operations.Sum('doc_count')}), [doc_column]) \
+        .map(RatioMapper('doc_count', 'doc_length', 'doc_freq')) \
         .sort([text_column, doc_column])
 
     return doc_freq \
@@ -240,9 +264,9 @@ def yandex_maps_graph(
         .map(operations.Project([edge_id_column, "length_km"]))
     )
 
-    # ---------------- Join time_graph и length_graph ----------------
+    # ---------------- Join time_graph и length_graph (стратегия по размерам) ----------------
     joined_graph = time_graph.join(
-        operations.InnerJoiner(), length_graph, keys=[edge_id_column]
+        operations.InnerJoiner(), length_graph, keys=[edge_id_column], strategy="auto"
     )
 
     # ---------------- Вычисление скорости ----------------
@@ -263,7 +287,7 @@ def yandex_maps_graph(
     )
 
     # ---------------- Агрегация: средняя скорость по weekday + hour ----------------
-    agg_graph = joined_graph.reduce(
+    agg_graph = joined_graph.aggregate(
         operations.Average("speed", "speed"),
         [
             weekday_result_column,
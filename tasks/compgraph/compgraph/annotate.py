@@ -0,0 +1,57 @@
+"""Group broadcast: attaching an aggregate of every key group to each row of the group."""
+from __future__ import annotations
+
+import itertools
+import typing as tp
+
+from .external_sort import DEFAULT_MEMORY_LIMIT
+from .keys import key_getter
+from .operations import Aggregator, Operation, ScalarAggregator, TRow, TRowsGenerator, TRowsIterable
+from .spill import SpillBuffer
+
+
+class Annotate(Operation):
+    """Attach the aggregate of every ``keys`` group to each of its rows, in one pass over grouped input.
+
+    Consecutive rows with equal ``keys`` form a group (as in :class:`operations.Reduce`). Rows of a group are
+    buffered while ``aggregator`` folds them; then the value of a :class:`operations.ScalarAggregator` (in its
+    result column) or the single finalized row of another aggregator (such as :class:`operations.Aggregate`)
+    minus the key columns is merged into every buffered row, overwriting columns of the same name. Rows keep their
+    order. Once a group buffers more than about ``memory_limit`` bytes, the rest of it goes to a temporary file
+    compressed with ``codec``.
+    """
+
+    def __init__(self, aggregator: Aggregator, keys: tp.Sequence[str], memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                 codec: str = 'none') -> None:
+        self._aggregator = aggregator
+        self._keys = tuple(keys)
+        self.memory_limit = memory_limit
+        self.codec = codec
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
+        for _, group in itertools.groupby(rows, key_getter(self._keys)):
+            yield from self._annotate_group(group)
+
+    def _annotate_group(self, group: tp.Iterator[TRow]) -> TRowsGenerator:
+        aggregator = self._aggregator
+        update = aggregator.update
+        first = next(group)
+        state = aggregator.init(self._keys, first)
+        with SpillBuffer(self.memory_limit, self.codec) as buffered:
+            buffered.append(first)
+            for row in group:
+                state = update(state, row)
+                buffered.append(row)
+
+            annotations = self._annotations(state)
+            for row in buffered:
+                yield {**row, **annotations}
+
+    def _annotations(self, state: tp.Any) -> TRow:
+        if isinstance(self._aggregator, ScalarAggregator):
+            return {self._aggregator.result_column: self._aggregator.value(state)}
+        results = list(self._aggregator.finalize(self._keys, state))
+        if len(results) != 1:
+            raise ValueError(f'{type(self._aggregator).__name__} gave {len(results)} rows for a group, '
+                             f'annotation needs exactly one')
+        return {column: value for column, value in results[0].items() if column not in self._keys}
@@ -0,0 +1,88 @@
+"""Bloom filters over join keys, used to drop rows that cannot match before they are sorted and joined."""
+from __future__ import annotations
+
+import math
+import typing as tp
+
+from .operations import TRow, TRowsGenerator, TRowsIterable
+
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+SIDES = ('a', 'b')
+
+
+def _next_prime(n: int) -> int:
+    while any(n % divisor == 0 for divisor in range(2, math.isqrt(n) + 1)):
+        n += 1
+    return n
+
+
+class BloomFilter:
+    """Set of hashable keys answering membership with no false negatives and about ``false_positive_rate`` false
+    positives once ``capacity`` keys are added.
+
+    Keys are hashed with the built-in :func:`hash`, so a filter is only meaningful in the process that built it.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE) -> None:
+        if not 0 < false_positive_rate < 1:
+            raise ValueError(f'false positive rate must be between 0 and 1, got {false_positive_rate}')
+        capacity = max(capacity, 1)
+        # a prime size keeps every probe step coprime with it, so the probes of a key do not cycle early
+        self.size = _next_prime(max(64, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: tp.Any) -> tp.Iterator[int]:
+        # double hashing: the i-th probe is h1 + i * h2
+        first = hash((key, 0))
+        step = hash((key, 1)) % (self.size - 1) + 1
+        size = self.size
+        return ((first + i * step) % size for i in range(self.hashes))
+
+    def add(self, key: tp.Any) -> None:
+        bits = self._bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: tp.Any) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class BloomPrefilter:
+    """Semi-join prefilter of :meth:`Graph.join`: a Bloom filter over the join keys of the ``side`` graph (``'a'``
+    for the joined graph, ``'b'`` for the graph joined to it) drops the rows of the other graph that cannot match,
+    before the sort producing that graph when there is one.
+
+    ``checked`` and ``passed`` count the rows of the filtered graph seen by the filter and let through over all
+    runs, so ``pruned`` is the number of rows the sort and the join were spared.
+    """
+
+    def __init__(self, side: str = 'b', false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE) -> None:
+        if side not in SIDES:
+            raise ValueError(f'prefilter side must be one of {SIDES}, got {side!r}')
+        self.side = side
+        self.false_positive_rate = false_positive_rate
+        self.checked = 0
+        self.passed = 0
+
+    @property
+    def pruned(self) -> int:
+        return self.checked - self.passed
+
+    @property
+    def pruned_fraction(self) -> float:
+        return self.pruned / self.checked if self.checked else 0.0
+
+    def filter(self, rows: TRowsIterable, bloom: BloomFilter, key: tp.Callable[[TRow], tp.Any]) -> TRowsGenerator:
+        """Yield the ``rows`` whose key may be in ``bloom``, counting them."""
+        checked = passed = 0
+        try:
+            for row in rows:
+                checked += 1
+                if key(row) in bloom:
+                    passed += 1
+                    yield row
+        finally:
+            self.checked += checked
+            self.passed += passed
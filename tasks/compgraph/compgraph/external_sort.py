@@ -1,48 +1,611 @@
+import atexit
+import bisect
+import heapq
+import io
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import random
+import struct
+import tempfile
+import threading
 import typing as tp
-from multiprocessing import Pipe, Process, connection
-from operator import itemgetter
+from multiprocessing import connection
 
-from .operations import Operation, TRowsIterable, TRowsGenerator
+from .keys import key_getter
+from .operations import Operation, TRow, TRowsIterable, TRowsGenerator
+from .spill import SpillFile, approx_row_size, read_rows, write_rows
 
+MiB = 1024 * 1024
+DEFAULT_MEMORY_LIMIT = 64 * MiB
+DEFAULT_BATCH_BYTES = 256 * 1024
+DEFAULT_PREFETCH = 2
+DEFAULT_IN_MEMORY_ROWS = 10_000
+DEFAULT_IN_MEMORY_BYTES = 4 * MiB
+DEFAULT_MERGE_FAN_IN = 64
 
-def do_sort(endpoint: connection.Connection, keys: tuple[str, ...]) -> None:
-    rows = []
-    while True:
-        row = endpoint.recv()
-        if row is None:
-            break
-        rows.append(row)
-    rows.sort(key=itemgetter(*keys))
+_INITIAL_BATCH_ROWS = 16
+_MAX_BATCH_ROWS = 65536
+_BATCH_HEADER = struct.Struct('<I')
+_STOP_TIMEOUT = 1.0
+_SAMPLES_PER_PARTITION = 100
+
+
+def _write_run(rows: list[TRow], directory: str, codec: str) -> str:
+    """Dump already sorted ``rows`` into a new row file inside ``directory`` and return its path."""
+    fd, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    os.close(fd)
+    write_rows(path, rows, codec)
+    return path
+
+
+def _take_budget(rows: tp.Iterator[TRow], memory_limit: int) -> tuple[list[TRow], bool]:
+    """Collect rows until about ``memory_limit`` bytes are buffered; the flag tells whether the input is over."""
+    buffer: list[TRow] = []
+    buffered_size = 0
     for row in rows:
-        endpoint.send(row)
-    endpoint.send(None)
+        buffer.append(row)
+        buffered_size += approx_row_size(row)
+        if buffered_size >= memory_limit:
+            return buffer, False
+    return buffer, True
+
+
+def _merge_runs(runs: list[str], key: tp.Callable[[TRow], tp.Any], directory: str, codec: str,
+                fan_in: int) -> list[str]:
+    """Merge groups of ``fan_in`` consecutive runs into new runs until at most ``fan_in`` runs are left."""
+    while len(runs) > fan_in:
+        merged = []
+        for start in range(0, len(runs), fan_in):
+            group = runs[start:start + fan_in]
+            if len(group) == 1:
+                merged.extend(group)
+                continue
+            fd, path = tempfile.mkstemp(suffix='.run', dir=directory)
+            os.close(fd)
+            write_rows(path, heapq.merge(*map(read_rows, group), key=key), codec)
+            for run in group:
+                os.unlink(run)
+            merged.append(path)
+        runs = merged
+    return runs
+
+
+def sort_rows(rows: TRowsIterable, keys: tp.Sequence[str], memory_limit: int = DEFAULT_MEMORY_LIMIT,
+              codec: str = 'none', normalize_keys: bool = False,
+              fan_in: int = DEFAULT_MERGE_FAN_IN) -> TRowsGenerator:
+    """Stable sort of ``rows`` by ``keys`` holding at most about ``memory_limit`` bytes of rows in memory.
+
+    Rows are accumulated until the budget is exhausted, then the buffer is sorted and written to a temporary
+    file as a sorted run (in the :mod:`compgraph.spill` format, compressed with ``codec``). Once the input is
+    over, the runs are merged back with a k-way heap merge, so only one block per run is kept in memory while
+    streaming the result. At most ``fan_in`` runs are open at a time: with more runs, groups of consecutive runs
+    are first merged into longer intermediate runs, pass after pass. Inputs fitting into the budget never touch
+    disk (nor create a temporary directory).
+    With ``normalize_keys`` rows are ordered by normalized keys (see :mod:`compgraph.keys`), which also orders
+    ``None`` and mixed-type keys.
+    """
+    key = key_getter(keys, normalize_keys)
+    rows_iter = iter(rows)
+    buffer, exhausted = _take_budget(rows_iter, memory_limit)
+    buffer.sort(key=key)
+    if exhausted:
+        yield from buffer
+        return
+
+    with tempfile.TemporaryDirectory(prefix='compgraph-sort-') as tmp_dir:
+        runs = [_write_run(buffer, tmp_dir, codec)]
+        while not exhausted:
+            buffer, exhausted = _take_budget(rows_iter, memory_limit)
+            buffer.sort(key=key)
+            if buffer:
+                runs.append(_write_run(buffer, tmp_dir, codec))
+        buffer = []
+        # heapq.merge prefers earlier iterables on ties, so run order keeps the sort stable
+        runs = _merge_runs(runs, key, tmp_dir, codec, fan_in)
+        yield from heapq.merge(*map(read_rows, runs), key=key)
+
+
+def _send_batch(endpoint: connection.Connection, rows: list[TRow]) -> int:
+    """Send ``rows`` as a single message and return the size of the pickled payload.
+
+    Rows are pickled with protocol 5; buffers that support out-of-band pickling (``PickleBuffer`` wrapped
+    ``bytearray`` and friends) are sent as separate frames right after the payload instead of being copied into it.
+    The payload is prefixed with the number of such frames.
+    """
+    buffers: list[pickle.PickleBuffer] = []
+    stream = io.BytesIO()
+    stream.write(_BATCH_HEADER.pack(0))
+    pickle.Pickler(stream, protocol=5, buffer_callback=buffers.append).dump(rows)
+    message = stream.getbuffer()
+    _BATCH_HEADER.pack_into(message, 0, len(buffers))
+    endpoint.send_bytes(message)
+    for buffer in buffers:
+        endpoint.send_bytes(buffer.raw())
+    return len(message)
+
+
+def _recv_batch(endpoint: connection.Connection) -> list[TRow]:
+    """Receive one message sent by :func:`_send_batch`. An empty batch marks the end of the stream."""
+    message = endpoint.recv_bytes()
+    (buffers_count,) = _BATCH_HEADER.unpack_from(message)
+    buffers = [endpoint.recv_bytes() for _ in range(buffers_count)]
+    return pickle.loads(memoryview(message)[_BATCH_HEADER.size:], buffers=buffers)
+
+
+class _BatchSender:
+    """Group rows into batches of about ``batch_bytes`` pickled bytes each.
+
+    The number of rows per batch adapts to the observed row size after every batch, so narrow rows travel in
+    big batches and wide rows in small ones. ``batch_bytes=0`` sends every row on its own.
+    """
+
+    def __init__(self, endpoint: connection.Connection, batch_bytes: int = DEFAULT_BATCH_BYTES) -> None:
+        self._endpoint = endpoint
+        self._batch_bytes = batch_bytes
+        self._batch_rows = _INITIAL_BATCH_ROWS if batch_bytes > 0 else 1
+        self._rows: list[TRow] = []
+
+    def send(self, row: TRow) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= self._batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        size = _send_batch(self._endpoint, self._rows)
+        if self._batch_bytes > 0:
+            row_size = max(1, size // len(self._rows))
+            self._batch_rows = max(1, min(_MAX_BATCH_ROWS, self._batch_bytes // row_size))
+        self._rows = []
+
+    def close(self) -> None:
+        """Flush buffered rows and send the end-of-stream marker."""
+        self.flush()
+        _send_batch(self._endpoint, [])
+
+
+def _recv_rows(endpoint: connection.Connection, prefetch: int = DEFAULT_PREFETCH) -> TRowsGenerator:
+    """Yield rows sent by :class:`_BatchSender` until the end-of-stream marker.
+
+    With ``prefetch > 0`` a background thread receives and unpickles up to ``prefetch`` batches ahead, so the
+    transfer of the next batch overlaps with the consumer draining the current one.
+    """
+    if prefetch <= 0:
+        while True:
+            batch = _recv_batch(endpoint)
+            if not batch:
+                return
+            yield from batch
+
+    batches: queue.Queue[list[TRow] | BaseException] = queue.Queue(maxsize=prefetch)
+    stopped = threading.Event()
+
+    def put(item: list[TRow] | BaseException) -> None:
+        while not stopped.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def pump() -> None:
+        try:
+            while not stopped.is_set():
+                batch = _recv_batch(endpoint)
+                put(batch)
+                if not batch:
+                    return
+        except BaseException as exc:  # handed over to the consuming thread
+            put(exc)
+
+    thread = threading.Thread(target=pump, name='compgraph-sort-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = batches.get()
+            if isinstance(item, BaseException):
+                raise item
+            if not item:
+                return
+            yield from item
+    finally:
+        stopped.set()
+
+
+def do_sort(
+    endpoint: connection.Connection,
+    keys: tuple[str, ...],
+    memory_limit: int = DEFAULT_MEMORY_LIMIT,
+    batch_bytes: int = DEFAULT_BATCH_BYTES,
+    prefetch: int = DEFAULT_PREFETCH,
+    codec: str = 'none',
+    normalize_keys: bool = False,
+) -> None:
+    sender = _BatchSender(endpoint, batch_bytes)
+    for row in sort_rows(_recv_rows(endpoint, prefetch), keys, memory_limit, codec, normalize_keys):
+        sender.send(row)
+    sender.close()
+
+
+def _sort_worker(endpoint: connection.Connection) -> None:
+    """Serve sort tasks sent by :class:`SortWorkerPool` until the stop marker arrives.
+
+    A task is a tuple of :func:`do_sort` arguments (except the endpoint) followed by the rows stream. The worker
+    first reports that it has started, i.e. survived the import of the parent's main module.
+    """
+    endpoint.send(True)
+    while True:
+        task = endpoint.recv()
+        if task is None:
+            return
+        do_sort(endpoint, *task)
+
+
+class SortWorkerError(RuntimeError):
+    """Sort worker process died while serving a sort."""
+
+
+class SortWorkerStartError(SortWorkerError):
+    """Sort worker process exited before serving any sort.
+
+    With the ``forkserver`` and ``spawn`` start methods a worker imports the main module of the parent first, so
+    a script running a graph at module level without an ``if __name__ == '__main__':`` guard makes it fail.
+    """
+
+
+class _SortWorker:
+    """Long-lived sort process together with the parent end of its pipe."""
+
+    def __init__(self, context: tp.Any) -> None:
+        self.connection, remote = context.Pipe()
+        self.process = context.Process(target=_sort_worker, args=(remote,), name='compgraph-sort-worker',
+                                       daemon=True)
+        self.process.start()
+        remote.close()
+        try:
+            self.connection.recv()
+        except EOFError:
+            self.process.join()
+            self.connection.close()
+            raise SortWorkerStartError(f'sort worker {self.process.pid} exited with code {self.process.exitcode} '
+                                       f'before it started') from None
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self) -> None:
+        """Ask worker to exit after its current task, killing it if it does not comply in time."""
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(_STOP_TIMEOUT)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+
+class SortWorkerPool:
+    """Pool of sort processes reused by every :class:`ExternalSort` and every graph run.
+
+    Workers are started lazily with the ``forkserver`` start method (``spawn`` where it is unavailable), so
+    forking neither copies the memory of a busy parent nor its helper threads. A pool grows on demand, since
+    chained sorts of a graph stream into each other concurrently, and keeps up to ``max_idle`` idle workers
+    around. Workers that died while idle are replaced transparently; a worker whose sort was abandoned or failed
+    midway is killed, because its pipe may still hold rows of that sort. Once a worker fails to start
+    (:class:`SortWorkerStartError`), no more are started and :meth:`acquire` raises the same error right away.
+    """
+
+    def __init__(self, max_idle: int | None = None, start_method: str | None = None) -> None:
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver':
+            self._context.set_forkserver_preload([__name__])
+        self._max_idle = max_idle if max_idle is not None else max(4, os.cpu_count() or 1)
+        self._lock = threading.Lock()
+        self._idle: list[_SortWorker] = []
+        self._busy: set[_SortWorker] = set()
+        self._closed = False
+        self._start_error: SortWorkerStartError | None = None
+
+    def acquire(self) -> _SortWorker:
+        """Take an idle live worker or start a new one."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('sort worker pool is shut down')
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.is_alive():
+                    self._busy.add(worker)
+                    return worker
+                worker.kill()
+            if self._start_error is not None:
+                raise self._start_error
+        try:
+            worker = _SortWorker(self._context)
+        except SortWorkerStartError as exc:
+            self._start_error = exc
+            raise
+        with self._lock:
+            self._busy.add(worker)
+        return worker
+
+    def release(self, worker: _SortWorker) -> None:
+        """Return worker which completed its sort back to the pool."""
+        with self._lock:
+            self._busy.discard(worker)
+            if not self._closed and worker.is_alive() and len(self._idle) < self._max_idle:
+                self._idle.append(worker)
+                return
+        worker.stop()
+
+    def discard(self, worker: _SortWorker) -> None:
+        """Kill worker left in unknown state by an abandoned or failed sort."""
+        with self._lock:
+            self._busy.discard(worker)
+        worker.kill()
+
+    def shutdown(self) -> None:
+        """Stop idle workers and kill busy ones. Called automatically at interpreter exit for the default pool."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            busy, self._busy = self._busy, set()
+        for worker in idle:
+            worker.stop()
+        for worker in busy:
+            worker.kill()
+
+
+_default_pool: SortWorkerPool | None = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> SortWorkerPool:
+    """Pool shared by all sorts which are not given an explicit one, created on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SortWorkerPool()
+            atexit.register(_default_pool.shutdown)
+        return _default_pool
+
+
+def _range_boundaries(sample: list[tp.Any], partitions: int) -> list[tp.Any]:
+    """Pick up to ``partitions - 1`` distinct increasing keys splitting sorted ``sample`` into equal parts."""
+    boundaries: list[tp.Any] = []
+    for i in range(1, partitions):
+        boundary = sample[i * len(sample) // partitions]
+        if not boundaries or boundaries[-1] < boundary:
+            boundaries.append(boundary)
+    return boundaries
+
+
+class _Reservoir:
+    """Uniform random sample of up to ``size`` items of a stream of unknown length (reservoir sampling)."""
+
+    def __init__(self, size: int, seed: int = 0) -> None:
+        self.size = size
+        self.items: list[tp.Any] = []
+        self._seen = 0
+        self._random = random.Random(seed)
+
+    def add(self, item: tp.Any) -> None:
+        self._seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        index = self._random.randrange(self._seen)
+        if index < self.size:
+            self.items[index] = item
 
 
 class ExternalSort(Operation):
     """
     In order to not account materialization during sorting in main process memory consumption, we delegate
     sorting to a separate process.
-    This class illustrates cross-process streaming.
+    The child process keeps at most ``memory_limit`` bytes of rows in memory and spills sorted runs to
+    temporary files beyond that, merging them back while streaming the result (see :func:`sort_rows`); runs are
+    compressed with ``codec`` (one of :data:`compgraph.spill.CODECS`). ``normalize_keys`` switches every step
+    of the sort to normalized keys (see :mod:`compgraph.keys`).
+    Rows cross the process boundary in adaptive batches of about ``batch_bytes`` pickled bytes, and up to
+    ``prefetch`` batches are received ahead in a background thread on both sides of the pipe.
+    Sorting processes are borrowed from ``pool`` (:func:`default_pool` by default) instead of being started
+    for every call.
+
+    Small inputs skip the worker altogether: the first rows are buffered in the calling process and, if the input
+    ends before either ``in_memory_rows`` rows or ``in_memory_bytes`` bytes are collected, they are sorted in place.
+    Otherwise the buffered rows and the rest of the input are streamed to a worker as described above.
+    Keys of arriving rows are compared with the previous ones until the first row out of order, so input that is
+    already sorted is never sent to a worker: past the buffer it is spilled to a local
+    :class:`compgraph.spill.SpillFile` and replayed after the buffered rows. Input found unsorted late is sent to a
+    worker together with the spill.
+
+    With ``parallelism`` above one (``None`` stands for all CPU cores) large inputs are sorted by a sample sort:
+    the input is first read to the end into a local spill while its keys are sampled to choose range boundaries
+    (so grouped or partly ordered input is split evenly too), every row is routed to the worker owning its key
+    range, the workers sort their ranges simultaneously and the sorted ranges are concatenated in order.
+    Equal keys always land in the same range, so the result is as stable as a single-worker sort. Each worker
+    gets an equal share of ``memory_limit``.
     """
 
-    def __init__(self, keys: tp.Sequence[str]):
+    def __init__(
+        self,
+        keys: tp.Sequence[str],
+        memory_limit: int = DEFAULT_MEMORY_LIMIT,
+        batch_bytes: int = DEFAULT_BATCH_BYTES,
+        prefetch: int = DEFAULT_PREFETCH,
+        pool: SortWorkerPool | None = None,
+        in_memory_rows: int = DEFAULT_IN_MEMORY_ROWS,
+        in_memory_bytes: int = DEFAULT_IN_MEMORY_BYTES,
+        parallelism: int | None = 1,
+        codec: str = 'none',
+        normalize_keys: bool = False,
+    ):
         self.keys = keys
+        self.memory_limit = memory_limit
+        self.batch_bytes = batch_bytes
+        self.prefetch = prefetch
+        self.pool = pool
+        self.in_memory_rows = in_memory_rows
+        self.in_memory_bytes = in_memory_bytes
+        self.parallelism = parallelism
+        self.codec = codec
+        self.normalize_keys = normalize_keys
+        self._key = key_getter(tuple(keys), normalize_keys)
 
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
-        local_endpoint, remote_endpoint = Pipe()
-        process = Process(target=do_sort, args=(remote_endpoint, self.keys))
-        process.start()
+        key = self._key
+        rows_iter = iter(rows)
+        head: list[TRow] = []
+        head_size = 0
+        in_order = True
+        last_key: tp.Any = None
+        for row in rows_iter:
+            if in_order:
+                row_key = key(row)
+                in_order = not head or not row_key < last_key
+                last_key = row_key
+            head.append(row)
+            head_size += approx_row_size(row)
+            if len(head) >= self.in_memory_rows or head_size >= self.in_memory_bytes:
+                break
+        else:
+            if not in_order:
+                head.sort(key=key)
+            yield from head
+            return
+
+        partitions = self.parallelism or os.cpu_count() or 1
+        sample = _Reservoir(partitions * _SAMPLES_PER_PARTITION) if partitions > 1 else None
+        if sample is not None:
+            for row in head:
+                sample.add(key(row))
+        with SpillFile(self.codec) as spilled:
+            if in_order:
+                for row in rows_iter:
+                    row_key = key(row)
+                    if row_key < last_key:
+                        rows_iter = itertools.chain((row,), rows_iter)
+                        break
+                    last_key = row_key
+                    spilled.write(row)
+                    if sample is not None:
+                        sample.add(row_key)
+                else:
+                    yield from head
+                    head = []
+                    yield from spilled
+                    return
+            boundaries: list[tp.Any] = []
+            if sample is not None:
+                for row in rows_iter:
+                    sample.add(key(row))
+                    spilled.write(row)
+                rows_iter = iter(())
+                boundaries = _range_boundaries(sorted(sample.items), partitions)
+            rows_iter = itertools.chain(head, spilled, rows_iter)
+            head = []  # the chain keeps buffered rows only until they are sent
+            yield from self._sort_out_of_process(rows_iter, boundaries)
+
+    def _sort_out_of_process(self, rows: TRowsIterable, boundaries: list[tp.Any]) -> TRowsGenerator:
+        pool = self.pool or default_pool()
+        workers: list[_SortWorker] = []
+        try:
+            for _ in range(len(boundaries) + 1):
+                workers.append(pool.acquire())
+        except SortWorkerStartError:
+            for worker in workers:
+                pool.release(worker)
+            # no worker can start in this program, sort in the calling process instead
+            yield from sort_rows(rows, self.keys, self.memory_limit, self.codec, self.normalize_keys)
+            return
+        completed = False
+        try:
+            yield from self._sort_in(workers, rows, boundaries)
+            completed = True
+        except (EOFError, OSError) as exc:
+            for worker in workers:
+                worker.process.join(0.1)
+            dead = [worker.process for worker in workers if not worker.is_alive()]
+            if not dead:
+                raise
+            raise SortWorkerError(
+                ', '.join(f'sort worker {process.pid} died with exit code {process.exitcode}' for process in dead)
+            ) from exc
+        finally:
+            for worker in workers:
+                if completed:
+                    pool.release(worker)
+                else:
+                    pool.discard(worker)
+
+    def _sort_in(self, workers: list[_SortWorker], rows: TRowsIterable, boundaries: list[tp.Any]) -> TRowsGenerator:
+        task = (tuple(self.keys), self.memory_limit // len(workers), self.batch_bytes, self.prefetch, self.codec,
+                self.normalize_keys)
+        senders = []
+        for worker in workers:
+            worker.connection.send(task)
+            senders.append(_BatchSender(worker.connection, self.batch_bytes))
+
         row_count_before = 0
-        for row in rows:
-            local_endpoint.send(row)
-            row_count_before += 1
-        local_endpoint.send(None)
+        if boundaries:
+            key = self._key
+            for row in rows:
+                senders[bisect.bisect_right(boundaries, key(row))].send(row)
+                row_count_before += 1
+        else:
+            (sender,) = senders
+            for row in rows:
+                sender.send(row)
+                row_count_before += 1
+        for sender in senders:
+            sender.close()
+
         row_count_after = 0
-        while True:
-            local_endpoint_row = local_endpoint.recv()
-            if local_endpoint_row is None:
-                break
-            yield local_endpoint_row
-            row_count_after += 1
+        for worker in workers:
+            for row in _recv_rows(worker.connection, self.prefetch):
+                yield row
+                row_count_after += 1
         assert row_count_before == row_count_after
-        process.join()
+
+
+class SortWithinGroups(Operation):
+    """Sort rows already sorted by ``prefix`` by ``keys`` (which start with ``prefix``).
+
+    Consecutive rows with equal ``prefix`` columns form a group; every group is sorted by the remaining keys on its
+    own with :func:`sort_rows` and streamed out before the next one is read, so memory is bounded by the largest
+    group up to ``memory_limit`` bytes (larger groups spill sorted runs as in a global sort), and no rows cross
+    the process boundary.
+    """
+
+    def __init__(
+        self,
+        prefix: tp.Sequence[str],
+        keys: tp.Sequence[str],
+        memory_limit: int = DEFAULT_MEMORY_LIMIT,
+        codec: str = 'none',
+        normalize_keys: bool = False,
+    ):
+        if tuple(keys[:len(prefix)]) != tuple(prefix):
+            raise ValueError(f'sort keys {keys!r} do not start with sorted prefix {prefix!r}')
+        self.prefix = prefix
+        self.keys = keys
+        self.memory_limit = memory_limit
+        self.codec = codec
+        self.normalize_keys = normalize_keys
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        rest = tuple(self.keys[len(self.prefix):])
+        for _, group in itertools.groupby(rows, key_getter(tuple(self.prefix))):
+            yield from sort_rows(group, rest, self.memory_limit, self.codec, self.normalize_keys)
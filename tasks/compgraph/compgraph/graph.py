@@ -1,78 +1,515 @@
 from __future__ import annotations
 
+import collections
+import itertools
 import typing as tp
 
 from . import operations as ops
-from .external_sort import ExternalSort
+from .annotate import Annotate
+from .bloom import BloomFilter, BloomPrefilter
+from .external_sort import DEFAULT_MEMORY_LIMIT, ExternalSort, SortWithinGroups
+from .hash_join import GraceHashJoin, HashJoin
+from .hash_reduce import DEFAULT_COMBINE_GROUPS, Combine, HashReduce, MergePartials
+from .keys import key_getter
+from .planner import AutoAggregate, AutoJoin
+from .spill import SpillFile, SpillTee
 
 Builder = tp.Callable[..., ops.TRowsIterable]
 
+_PREFILTER_IDS = itertools.count()
+# run argument carrying the :class:`_Run` of the graph being run
+_RUN = '__run__'
+
 
 class Graph:
-    """Computation graph built from a chain of operations."""
+    """Computation graph built from a chain of operations.
+
+    Every graph knows the columns its output is guaranteed to be sorted by (:attr:`order`): a sort sets it, maps
+    keep what their mapper declares (:meth:`operations.Mapper.preserved_order`), reduces keep the part made of
+    group keys (reducers are expected to copy group key columns into their output) and merge joins of inputs
+    both sorted by the join keys are sorted by the keys. A :meth:`sort` by a prefix of the known order is skipped.
+
+    Graphs form a DAG: every step knows the graphs it reads. A graph used by several steps (or as a scalar), and
+    a data source read in several places, is computed once per :meth:`run`, and its rows are fanned out to the
+    steps by a :class:`spill.SpillTee`.
+    """
 
-    def __init__(self, builder: Builder) -> None:
+    def __init__(self, builder: Builder, order: tp.Sequence[str] = (), inputs: tp.Sequence['Graph'] = ()) -> None:
         self._builder = builder
+        self._order = tuple(order)
+        self._inputs = tuple(inputs)
+        # data source read by the graph, the same for all graphs reading it
+        self._source: tuple[tp.Any, ...] | None = None
+        # input graph and options of the external sort producing this graph, for plan rewrites
+        self._sorted_from: tuple[Graph, dict[str, tp.Any]] | None = None
+        # aggregator and keys of the partial states the rows carry (see :meth:`combine`)
+        self._partials: tuple[ops.Aggregator, tuple[str, ...]] | None = None
+        # parameter name, column and single-row graph of the scalars bound for map steps (see :meth:`with_scalar`)
+        self._scalars: tuple[tuple[str, str, Graph], ...] = ()
+
+    @property
+    def order(self) -> tuple[str, ...]:
+        """Columns the output of the graph is known to be sorted by."""
+        return self._order
 
     @staticmethod
-    def graph_from_iter(name: str) -> 'Graph':
+    def graph_from_iter(name: str, sorted_by: tp.Sequence[str] = ()) -> 'Graph':
         """Create graph that reads rows from iterator factory provided to :meth:`run`.
 
         Parameters
         ----------
         name:
             Keyword argument name with callable returning iterator over rows.
+        sorted_by:
+            Columns the rows are known to be sorted by (initial :attr:`order` of the graph).
         """
 
         def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
             return ops.ReadIterFactory(name)(**kwargs)
 
-        return Graph(builder)
+        graph = Graph(builder, sorted_by)
+        graph._source = ('iter', name)
+        return graph
 
     @staticmethod
-    def graph_from_file(filename: str, parser: tp.Callable[[str], ops.TRow]) -> 'Graph':
-        """Create graph reading rows from file using provided parser."""
+    def graph_from_file(filename: str, parser: tp.Callable[[str], ops.TRow],
+                        sorted_by: tp.Sequence[str] = ()) -> 'Graph':
+        """Create graph reading rows from file using provided parser; ``sorted_by`` as in :meth:`graph_from_iter`."""
 
         def builder(**_kwargs: tp.Any) -> ops.TRowsIterable:
             return ops.Read(filename, parser)(**_kwargs)
 
-        return Graph(builder)
+        graph = Graph(builder, sorted_by)
+        graph._source = ('file', filename, parser)
+        return graph
+
+    def _then(self, builder: Builder, order: tp.Iterable[str] = (),
+              inputs: tp.Sequence['Graph'] | None = None) -> 'Graph':
+        graph = Graph(builder, tuple(order), (self,) if inputs is None else inputs)
+        graph._scalars = self._scalars
+        return graph
+
+    @property
+    def _node(self) -> tp.Hashable:
+        return self if self._source is None else self._source
+
+    def _rows(self, kwargs: dict[str, tp.Any]) -> ops.TRowsIterable:
+        """Rows of the graph in the run described by ``kwargs``, shared with other steps reading it."""
+        run: _Run = kwargs[_RUN]
+        return run.rows(self, kwargs)
+
+    def with_scalar(self, name: str, subgraph: 'Graph', column: str | None = None) -> 'Graph':
+        """Bind the value of a single-row ``subgraph`` as parameter ``name`` of the following map steps.
+
+        The value is taken from ``column`` (``name`` by default) of the only row of ``subgraph``, which is run
+        with the same data sources when the first row reaches a map step with a mapper using the parameter (see
+        :meth:`operations.Mapper.with_params`). This replaces a join with the subgraph on no keys.
+        """
+
+        def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
+            return self._rows(kwargs)
+
+        graph = self._then(builder, self._order)
+        graph._partials = self._partials
+        graph._scalars = tuple(scalar for scalar in self._scalars if scalar[0] != name) \
+            + ((name, name if column is None else column, subgraph),)
+        return graph
 
     def map(self, mapper: ops.Mapper) -> 'Graph':
-        """Extend graph with :class:`operations.Map` step."""
+        """Extend graph with :class:`operations.Map` step; the mapper gets the scalars bound by :meth:`with_scalar`."""
+
+        self._check_no_partials('map')
+        scalars = self._scalars
 
         def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
-            return ops.Map(mapper)(self._builder(**kwargs))
+            if scalars:
+                return _map_with_scalars(mapper, scalars, self._rows(kwargs), kwargs)
+            return ops.Map(mapper)(self._rows(kwargs))
 
-        return Graph(builder)
+        return self._then(builder, mapper.preserved_order(self._order))
 
     def reduce(self, reducer: ops.Reducer, keys: tp.Sequence[str]) -> 'Graph':
-        """Extend graph with :class:`operations.Reduce` step."""
+        """Extend graph with :class:`operations.Reduce` step.
+
+        After :meth:`combine` the reducer must be the combined aggregator; it then merges the partial states.
+        A :meth:`sort` by exactly ``keys`` followed by a reduce with a ``combinable`` aggregator gets a
+        :meth:`combine` inserted before the sort.
+        """
+
+        if self._partials is not None:
+            reducer = self._merge_partials(reducer, keys)
+        elif (isinstance(reducer, ops.Aggregator) and reducer.combinable and self._sorted_from is not None
+              and len(keys) == len(self._order) and set(keys) == set(self._order)):
+            unsorted, sort_options = self._sorted_from
+            return unsorted.combine(reducer, keys).sort(self._order, **sort_options).reduce(reducer, keys)
 
         def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
-            return ops.Reduce(reducer, keys)(self._builder(**kwargs))
+            return ops.Reduce(reducer, keys)(self._rows(kwargs))
+
+        return self._then(builder, itertools.takewhile(set(keys).__contains__, self._order))
 
-        return Graph(builder)
+    def annotate(self, aggregator: ops.Aggregator, keys: tp.Sequence[str],
+                 memory_limit: int = DEFAULT_MEMORY_LIMIT) -> 'Graph':
+        """Extend graph with :class:`annotate.Annotate` step attaching the aggregate of each group to its rows.
 
-    def sort(self, keys: tp.Sequence[str]) -> 'Graph':
-        """Extend graph with external sort step."""
+        Like :meth:`reduce`, groups are runs of rows with equal ``keys``, so the input should be sorted by them.
+        This replaces a reduce of the same stream followed by a join of the result back to it.
+        """
 
-        sort_op = ExternalSort(tuple(keys))
+        self._check_no_partials('annotate')
+        annotate_op = Annotate(aggregator, keys, memory_limit)
 
         def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
-            return sort_op(self._builder(**kwargs))
+            return annotate_op(self._rows(kwargs))
+
+        return self._then(builder, itertools.takewhile(set(keys).__contains__, self._order))
+
+    def combine(self, aggregator: ops.Aggregator, keys: tp.Sequence[str],
+                max_groups: int = DEFAULT_COMBINE_GROUPS) -> 'Graph':
+        """Extend graph with :class:`hash_reduce.Combine` step pre-aggregating rows by ``keys``.
 
-        return Graph(builder)
+        Rows collapse into partial states in a table of up to ``max_groups`` keys, so the following sort carries
+        one row per key and table flush instead of one per input row. The result must be sorted (or not) and then
+        reduced by ``keys`` with the same ``aggregator`` via :meth:`reduce` or :meth:`aggregate`.
+        """
 
-    def join(self, joiner: ops.Joiner, join_graph: 'Graph', keys: tp.Sequence[str]) -> 'Graph':
-        """Extend graph with join against another graph."""
+        self._check_no_partials('combine')
+        combine_op = Combine(aggregator, keys, max_groups)
 
         def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
-            return ops.Join(joiner, keys)(self._builder(**kwargs), join_graph._builder(**kwargs))
+            return combine_op(self._rows(kwargs))
+
+        graph = self._then(builder)
+        graph._partials = (aggregator, tuple(keys))
+        return graph
+
+    def _merge_partials(self, reducer: ops.Reducer, keys: tp.Sequence[str]) -> MergePartials:
+        assert self._partials is not None
+        aggregator, combined_keys = self._partials
+        # the same class with other columns would read the states as its own
+        if reducer != aggregator or set(keys) != set(combined_keys):
+            raise ValueError(f'rows carry partial states of {type(aggregator).__name__} by {list(combined_keys)}, '
+                             f'cannot reduce them with {type(reducer).__name__} by {list(keys)}')
+        return MergePartials(aggregator)
 
-        return Graph(builder)
+    def _check_no_partials(self, step: str) -> None:
+        """Reject a ``step`` that would read partial states of :meth:`combine` as rows."""
+        if self._partials is not None:
+            aggregator, combined_keys = self._partials
+            raise ValueError(f'rows carry partial states of {type(aggregator).__name__} by {list(combined_keys)}, '
+                             f'reduce or aggregate them before {step}')
+
+    def aggregate(self, reducer: ops.Reducer, keys: tp.Sequence[str],
+                  memory_limit: int = DEFAULT_MEMORY_LIMIT, strategy: str = 'auto') -> 'Graph':
+        """Extend graph with a :meth:`reduce` that needs no sort before it.
+
+        With ``strategy='hash'`` (:class:`hash_reduce.HashReduce`) groups are collected in a hash table of at most
+        about ``memory_limit`` bytes and spilled to hash partitions beyond that; the output comes in no particular
+        order. Only aggregators spill partial states: rows of a plain reducer that do not fit into the budget are
+        sorted and reduced as contiguous groups after all. ``strategy='auto'`` (:class:`planner.AutoAggregate`)
+        sorts the rows instead when a sample shows that they hardly collapse into groups of a plain reducer. Input
+        already sorted by ``keys`` is reduced as contiguous groups in any case.
+        """
+
+        if strategy not in ('auto', 'hash'):
+            raise ValueError(f"unknown aggregation strategy {strategy!r}, expected 'auto' or 'hash'")
+        if set(self._order[:len(keys)]) == set(keys):
+            return self.reduce(reducer, keys)
+        if self._partials is not None:
+            reducer = self._merge_partials(reducer, keys)
+
+        aggregate_op: ops.Operation
+        if strategy == 'auto':
+            aggregate_op = AutoAggregate(reducer, keys, memory_limit)
+        else:
+            aggregate_op = HashReduce(reducer, keys, memory_limit)
+
+        def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
+            return aggregate_op(self._rows(kwargs))
+
+        return self._then(builder)
+
+    def sort(self, keys: tp.Sequence[str], memory_limit: int = DEFAULT_MEMORY_LIMIT,
+             parallelism: int | None = 1, normalize_keys: bool = False) -> 'Graph':
+        """Extend graph with external sort step.
+
+        ``memory_limit`` bounds the approximate size in bytes of rows held in memory by the sort, larger inputs
+        are spilled to temporary files as sorted runs and merged back. ``parallelism`` sets how many worker
+        processes share a large sort by key ranges (``None`` uses all CPU cores). ``normalize_keys`` orders rows
+        by normalized keys, defining the order of ``None`` and mixed-type keys (see :mod:`compgraph.keys`).
+
+        The step is omitted when ``keys`` are a prefix of the known :attr:`order` of the graph. When the order
+        shares a shorter prefix with ``keys``, rows are only sorted within groups of that prefix
+        (:class:`external_sort.SortWithinGroups`).
+        """
+
+        keys = tuple(keys)
+        prefix = tuple(column for column, _ in itertools.takewhile(lambda pair: pair[0] == pair[1],
+                                                                   zip(keys, self._order)))
+        if prefix == keys:
+            return self
+        sort_options = {'memory_limit': memory_limit, 'parallelism': parallelism, 'normalize_keys': normalize_keys}
+
+        sort_op: ops.Operation
+        if prefix:
+            sort_op = SortWithinGroups(prefix, keys, memory_limit, normalize_keys=normalize_keys)
+        else:
+            sort_op = ExternalSort(keys, memory_limit, parallelism=parallelism, normalize_keys=normalize_keys)
+
+        def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
+            return sort_op(self._rows(kwargs))
+
+        graph = self._then(builder, keys)
+        graph._partials = self._partials
+        if isinstance(sort_op, ExternalSort):
+            graph._sorted_from = (self, sort_options)
+        return graph
+
+    def top(self, k: int, keys: tp.Sequence[str], descending: bool = False, normalize_keys: bool = False) -> 'Graph':
+        """Extend graph with :class:`operations.Top` step: the ``k`` first rows of the sort by ``keys``.
+
+        Gives the same rows as ``sort(keys)`` followed by ``limit(k)`` (with ``descending`` as a stable sort in
+        reverse order), but in a single pass holding ``k`` rows and without an external sort.
+        """
+
+        self._check_no_partials('top')
+        top_op = ops.Top(k, keys, descending, normalize_keys)
+
+        def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
+            return top_op(self._rows(kwargs))
+
+        return self._then(builder, () if descending else keys)
+
+    def limit(self, n: int) -> 'Graph':
+        """Extend graph with :class:`operations.Limit` step.
+
+        A global sort right before it is replaced by :meth:`top`.
+        """
+
+        self._check_no_partials('limit')
+        if self._sorted_from is not None:
+            unsorted, sort_options = self._sorted_from
+            return unsorted.top(n, self._order, normalize_keys=sort_options['normalize_keys'])
+
+        def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
+            return ops.Limit(n)(self._rows(kwargs))
+
+        return self._then(builder, self._order)
+
+    def join(self, joiner: ops.Joiner, join_graph: 'Graph', keys: tp.Sequence[str], strategy: str = 'merge',
+             build_side: str = 'b', memory_limit: int = DEFAULT_MEMORY_LIMIT,
+             prefilter: BloomPrefilter | None = None) -> 'Graph':
+        """Extend graph with join against another graph.
+
+        With ``strategy='merge'`` both graphs must be sorted by ``keys``. ``strategy='hash'`` joins unsorted graphs
+        with :class:`hash_join.HashJoin`, holding the ``build_side`` graph (``'a'`` for this one, ``'b'`` for
+        ``join_graph``) in memory; the result keeps the part of the order of the other graph made of ``keys``
+        unless unmatched rows of the build side are kept. ``strategy='grace'`` (:class:`hash_join.GraceHashJoin`)
+        holds at most about ``memory_limit`` bytes of the build side and partitions both graphs on disk beyond
+        that; its output comes in no particular order.
+
+        ``strategy='auto'`` merges graphs both sorted by ``keys`` and otherwise picks a strategy for every run
+        from samples of the inputs (:class:`planner.AutoJoin`): a hash join building the side that fits into half
+        of ``memory_limit``, or a grace hash join if none does; its output order is not known. Joiners that only
+        merge (without ``keeps_unmatched``) get their unsorted inputs sorted by ``keys`` and merged.
+
+        With a :class:`bloom.BloomPrefilter` the ``prefilter.side`` graph is run first into a temporary file while
+        a Bloom filter of its keys is built, and rows of the other graph not passing the filter are dropped right
+        before the external sort producing that graph (or at its end when there is none). The joiner must drop
+        unmatched rows of the filtered graph.
+        """
+
+        self._check_no_partials('join')
+        join_graph._check_no_partials('join')
+        keys = tuple(keys)
+        order: tp.Iterable[str]
+        join_op: tp.Callable[[ops.TRowsIterable, ops.TRowsIterable], ops.TRowsIterable]
+        sorted_inputs = self._order[:len(keys)] == keys == join_graph._order[:len(keys)]
+        if strategy == 'auto' and joiner.keeps_unmatched is None and not sorted_inputs:
+            return self.sort(keys, memory_limit).join(joiner, join_graph.sort(keys, memory_limit), keys, 'merge',
+                                                      memory_limit=memory_limit, prefilter=prefilter)
+        if strategy == 'auto' and sorted_inputs:
+            strategy = 'merge'
+        if strategy == 'merge':
+            join_op = ops.Join(joiner, keys)
+            order = keys if joiner.keeps_key_order and sorted_inputs else ()
+        elif strategy == 'hash':
+            join_op = HashJoin(joiner, keys, build_side)
+            keep_a, keep_b = join_op.keeps_unmatched
+            probe_order, keep_build = (self._order, keep_b) if build_side == 'b' else (join_graph._order, keep_a)
+            order = () if keep_build else itertools.takewhile(set(keys).__contains__, probe_order)
+        elif strategy == 'grace':
+            join_op = GraceHashJoin(joiner, keys, build_side, memory_limit)
+            order = ()
+        elif strategy == 'auto':
+            join_op = AutoJoin(joiner, keys, memory_limit)
+            order = ()
+        else:
+            raise ValueError(f"unknown join strategy {strategy!r}, expected 'merge', 'hash', 'grace' or 'auto'")
+        if isinstance(joiner, ops.FilterJoiner) and strategy in ('merge', 'hash'):
+            # rows of this graph come out unchanged and in their order
+            order = self._order
+
+        inputs: tp.Sequence[Graph]
+        if prefilter is None:
+            def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
+                return join_op(self._rows(kwargs), join_graph._rows(kwargs))
+
+            inputs = (self, join_graph)
+        else:
+            builder, inputs = self._prefiltered_join(join_op, joiner, join_graph, keys, prefilter)
+
+        graph = self._then(builder, order, inputs)
+        names = {scalar[0] for scalar in self._scalars}
+        graph._scalars += tuple(scalar for scalar in join_graph._scalars if scalar[0] not in names)
+        return graph
+
+    @staticmethod
+    def join_many(graphs: tp.Sequence['Graph'], keys: tp.Sequence[str], how: str = 'inner',
+                  suffixes: tp.Sequence[str] | None = None) -> 'Graph':
+        """Join any number of graphs by ``keys`` in one pass with :class:`operations.MultiJoin`.
+
+        Graphs not yet sorted by ``keys`` are sorted first. Unlike a chain of :meth:`join` calls, every output row
+        is merged once from a row of each graph; the result is sorted by ``keys``.
+        """
+
+        keys = tuple(keys)
+        if not graphs:
+            raise ValueError('join_many needs at least one graph')
+        for graph in graphs:
+            graph._check_no_partials('join_many')
+        sorted_graphs = [graph.sort(keys) for graph in graphs]
+        join_op = ops.MultiJoin(keys, how, suffixes)
+
+        def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
+            return join_op(*(graph._rows(kwargs) for graph in sorted_graphs))
+
+        graph = sorted_graphs[0]._then(builder, keys, sorted_graphs)
+        for other in sorted_graphs[1:]:
+            names = {scalar[0] for scalar in graph._scalars}
+            graph._scalars += tuple(scalar for scalar in other._scalars if scalar[0] not in names)
+        return graph
+
+    def _prefiltered_join(self, join_op: tp.Callable[[ops.TRowsIterable, ops.TRowsIterable], ops.TRowsIterable],
+                          joiner: ops.Joiner, join_graph: 'Graph', keys: tuple[str, ...],
+                          prefilter: BloomPrefilter) -> tuple[Builder, tuple['Graph', 'Graph']]:
+        filtered_index = 0 if prefilter.side == 'b' else 1
+        if joiner.keeps_unmatched is None or joiner.keeps_unmatched[filtered_index]:
+            raise ValueError(f'{type(joiner).__name__} may keep rows of the graph filtered by the prefilter')
+        source, filtered = (join_graph, self) if prefilter.side == 'b' else (self, join_graph)
+        # the Bloom filter of a run reaches the filtering step through the run arguments
+        param = f'__bloom_{next(_PREFILTER_IDS)}__'
+        key = key_getter(keys)
+
+        def with_filter(graph: Graph) -> Graph:
+            def builder(**kwargs: tp.Any) -> ops.TRowsIterable:
+                return prefilter.filter(graph._rows(kwargs), kwargs[param], key)
+
+            filtered_graph = graph._then(builder, graph._order)
+            filtered_graph._partials = graph._partials
+            return filtered_graph
+
+        if filtered._sorted_from is not None:
+            unsorted, sort_options = filtered._sorted_from
+            filtered = with_filter(unsorted).sort(filtered._order, **sort_options)
+        else:
+            filtered = with_filter(filtered)
+
+        def builder(**kwargs: tp.Any) -> ops.TRowsGenerator:
+            with SpillFile() as source_rows:
+                source_rows.write_all(source._rows(kwargs))
+                bloom = BloomFilter(len(source_rows), prefilter.false_positive_rate)
+                for row in source_rows:
+                    bloom.add(key(row))
+                filtered_rows = filtered._rows({**kwargs, param: bloom})
+                if prefilter.side == 'b':
+                    yield from join_op(filtered_rows, source_rows)
+                else:
+                    yield from join_op(source_rows, filtered_rows)
+
+        return builder, (filtered, source)
 
     def run(self, **kwargs: tp.Any) -> ops.TRowsIterable:
         """Start graph execution with provided data sources."""
 
-        return self._builder(**kwargs)
+        return self._rows({**kwargs, _RUN: _Run(self)})
+
+
+class _Run:
+    """Shared state of one :meth:`Graph.run`: graphs read several times go through tees, scalars are read once."""
+
+    def __init__(self, graph: Graph) -> None:
+        self._consumers = _count_consumers(graph)
+        self._tees: dict[tp.Hashable, SpillTee] = {}
+        self._scalar_rows: dict[tp.Hashable, list[ops.TRow]] = {}
+
+    def rows(self, graph: Graph, kwargs: dict[str, tp.Any]) -> ops.TRowsIterable:
+        node = graph._node
+        consumers = self._consumers[node]
+        if consumers < 2:
+            return graph._builder(**kwargs)
+        tee = self._tees.get(node)
+        if tee is None:
+            tee = self._tees[node] = SpillTee(lambda: graph._builder(**kwargs), consumers)
+        return tee.reader()
+
+    def scalar_rows(self, graph: Graph, kwargs: dict[str, tp.Any]) -> list[ops.TRow]:
+        """Up to two first rows of a scalar graph, enough to check that it gives a single row."""
+        node = graph._node
+        if node not in self._scalar_rows:
+            self._scalar_rows[node] = list(itertools.islice(graph._rows(kwargs), 2))
+        return self._scalar_rows[node]
+
+
+def _count_consumers(graph: Graph) -> collections.Counter[tp.Hashable]:
+    """Number of reads of every graph (or data source) that ``graph`` depends on, scalars being read once."""
+    consumers: collections.Counter[tp.Hashable] = collections.Counter()
+    seen = {graph._node}
+    scalars_seen: set[tp.Hashable] = set()
+    stack = [graph]
+    while stack:
+        current = stack.pop()
+        inputs = list(current._inputs)
+        for _, _, subgraph in current._scalars:
+            if subgraph._node not in scalars_seen:
+                scalars_seen.add(subgraph._node)
+                inputs.append(subgraph)
+        for node in inputs:
+            consumers[node._node] += 1
+            if node._node not in seen:
+                seen.add(node._node)
+                stack.append(node)
+    return consumers
+
+
+class _ScalarParams(tp.Mapping[str, tp.Any]):
+    """Values of bound scalars for one run of a map step, each taken on first access from the rows of the run."""
+
+    def __init__(self, scalars: tp.Sequence[tuple[str, str, Graph]], kwargs: dict[str, tp.Any]) -> None:
+        self._scalars = {name: (column, subgraph) for name, column, subgraph in scalars}
+        self._kwargs = kwargs
+        self._values: dict[str, tp.Any] = {}
+
+    def __getitem__(self, name: str) -> tp.Any:
+        if name not in self._values:
+            column, subgraph = self._scalars[name]
+            run: _Run = self._kwargs[_RUN]
+            rows = run.scalar_rows(subgraph, self._kwargs)
+            if len(rows) != 1:
+                raise ValueError(f'scalar {name!r} must be computed by a graph giving exactly one row')
+            self._values[name] = rows[0][column]
+        return self._values[name]
+
+    def __iter__(self) -> tp.Iterator[str]:
+        return iter(self._scalars)
+
+    def __len__(self) -> int:
+        return len(self._scalars)
+
+
+def _map_with_scalars(mapper: ops.Mapper, scalars: tp.Sequence[tuple[str, str, Graph]], rows: ops.TRowsIterable,
+                      kwargs: dict[str, tp.Any]) -> ops.TRowsGenerator:
+    rows_iter = iter(rows)
+    for first in rows_iter:
+        bound = mapper.with_params(_ScalarParams(scalars, kwargs))
+        yield from ops.Map(bound)(itertools.chain([first], rows_iter))
@@ -0,0 +1,189 @@
+"""Hash joins: joining unsorted streams through hash tables, partitioned on disk when they do not fit in memory."""
+from __future__ import annotations
+
+import itertools
+import typing as tp
+
+from .external_sort import DEFAULT_MEMORY_LIMIT, approx_row_size, sort_rows
+from .hash_reduce import DEFAULT_PARTITIONS
+from .keys import key_getter
+from .operations import FilterJoiner, Joiner, Operation, TRow, TRowsGenerator, TRowsIterable, _merge_rows
+from .spill import SpillFile
+
+BUILD_SIDES = ('a', 'b')
+
+# rows of the build side by key, or only the set of its keys for a filter joiner
+_Table = dict[tp.Any, list[TRow]] | set[tp.Any]
+
+_MAX_DEPTH = 2
+
+
+class HashJoin(Operation):
+    """Join ``rows_a`` with ``rows_b`` by ``keys`` like ``joiner``, neither stream needs to be sorted.
+
+    The ``build_side`` stream (``'a'`` or ``'b'``) is read into a dict of row lists by key, the other one is streamed
+    through it, so only the build side is held in memory and it should be the smaller one. Joined rows follow the
+    streamed rows; unmatched rows of the streamed side are yielded as they come and unmatched rows of the build
+    side at the end. The joiner must declare :attr:`operations.Joiner.keeps_unmatched`; its suffixes are used for
+    clashing columns. For an :class:`operations.FilterJoiner` (build side ``'b'`` only) the table is a set of the
+    keys of ``b`` and rows of ``a`` are filtered by their keys.
+    """
+
+    def __init__(self, joiner: Joiner, keys: tp.Sequence[str], build_side: str = 'b') -> None:
+        if joiner.keeps_unmatched is None:
+            raise ValueError(f'{type(joiner).__name__} does not support hash joins')
+        if build_side not in BUILD_SIDES:
+            raise ValueError(f'build side must be one of {BUILD_SIDES}, got {build_side!r}')
+        self._filter = isinstance(joiner, FilterJoiner)
+        if self._filter and build_side != 'b':
+            raise ValueError(f'{type(joiner).__name__} needs the keys of b in the hash table, build side must be b')
+        self._joiner = joiner
+        self.keeps_unmatched: tuple[bool, bool] = joiner.keeps_unmatched
+        self._keys = tuple(keys)
+        self._key = key_getter(self._keys)
+        self.build_side = build_side
+
+    def __call__(self, rows_a: TRowsIterable, rows_b: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
+        build_rows, probe_rows = (rows_b, rows_a) if self.build_side == 'b' else (rows_a, rows_b)
+        table = self._new_table()
+        for row in build_rows:
+            self._add(table, row)
+        yield from self._probe(table, probe_rows)
+
+    def _new_table(self) -> _Table:
+        return set() if self._filter else {}
+
+    def _add(self, table: _Table, row: TRow) -> bool:
+        """Put ``row`` (only its key for filter joiners) into ``table``, the result tells whether it takes space."""
+        row_key = self._key(row)
+        if isinstance(table, set):
+            if row_key in table:
+                return False
+            table.add(row_key)
+            return True
+        group = table.get(row_key)
+        if group is None:
+            table[row_key] = [row]
+        else:
+            group.append(row)
+        return True
+
+    def _key_row(self, row_key: tp.Any) -> TRow:
+        """Row holding only the key columns with values ``row_key`` (as returned by the key getter)."""
+        return dict(zip(self._keys, (row_key,) if len(self._keys) == 1 else row_key))
+
+    def _probe(self, table: _Table, probe_rows: TRowsIterable) -> TRowsGenerator:
+        if isinstance(table, set):
+            key = self._key
+            keep_matched = tp.cast(FilterJoiner, self._joiner).keep_matched
+            for row in probe_rows:
+                if (key(row) in table) == keep_matched:
+                    yield row
+            return
+
+        keep_a, keep_b = self.keeps_unmatched
+        keys = self._keys
+        suffix_a, suffix_b = self._joiner._a_suffix, self._joiner._b_suffix
+        if self.build_side == 'b':
+            keep_build, keep_probe = keep_b, keep_a
+
+            def merge(probe: TRow, build: TRow) -> TRow:
+                return _merge_rows(keys, probe, build, suffix_a, suffix_b)
+        else:
+            keep_build, keep_probe = keep_a, keep_b
+
+            def merge(probe: TRow, build: TRow) -> TRow:
+                return _merge_rows(keys, build, probe, suffix_a, suffix_b)
+
+        key = self._key
+        matched: set[tp.Any] = set()
+        for row in probe_rows:
+            row_key = key(row)
+            group = table.get(row_key)
+            if group is None:
+                if keep_probe:
+                    yield dict(row)
+                continue
+            if keep_build:
+                matched.add(row_key)
+            for build in group:
+                yield merge(row, build)
+
+        if keep_build:
+            for row_key, group in table.items():
+                if row_key not in matched:
+                    for row in group:
+                        yield dict(row)
+
+
+class GraceHashJoin(HashJoin):
+    """:class:`HashJoin` of streams that may both be larger than memory (a grace hash join).
+
+    The build side is read into the hash table until about ``memory_limit`` bytes are held. If it ends there, the
+    join goes on in memory. Otherwise both streams are hash-partitioned by key into ``partitions`` pairs of temporary
+    files (compressed with ``codec``) and every pair is joined on its own, partitioning it again with another hash
+    if its build side is still too large. Pairs that stay too large after that (a few huge keys) are sorted with
+    :func:`external_sort.sort_rows` and merged by the joiner itself. Rows come out in no particular order.
+    """
+
+    def __init__(self, joiner: Joiner, keys: tp.Sequence[str], build_side: str = 'b',
+                 memory_limit: int = DEFAULT_MEMORY_LIMIT, partitions: int = DEFAULT_PARTITIONS,
+                 codec: str = 'none') -> None:
+        super().__init__(joiner, keys, build_side)
+        self.memory_limit = memory_limit
+        self.partitions = partitions
+        self.codec = codec
+
+    def __call__(self, rows_a: TRowsIterable, rows_b: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
+        yield from self._join(iter(rows_a), iter(rows_b), 0)
+
+    def _join(self, rows_a: tp.Iterator[TRow], rows_b: tp.Iterator[TRow], depth: int) -> TRowsGenerator:
+        build_rows, probe_rows = (rows_b, rows_a) if self.build_side == 'b' else (rows_a, rows_b)
+        if self._filter and depth == 0:
+            # only the keys of b matter: they are charged and spilled as rows of the key columns alone
+            key = self._key
+            build_rows = (self._key_row(key(row)) for row in build_rows)
+        table = self._new_table()
+        held_size = 0
+        for row in build_rows:
+            if not self._add(table, row):
+                continue
+            held_size += approx_row_size(row)
+            if held_size >= self.memory_limit:
+                break
+        else:
+            yield from self._probe(table, probe_rows)
+            return
+
+        held: tp.Iterable[TRow]
+        if isinstance(table, set):
+            held = map(self._key_row, table)
+        else:
+            held = itertools.chain.from_iterable(table.values())
+        build_rows = itertools.chain(held, build_rows)
+        if self.build_side == 'b':
+            rows_b = build_rows
+        else:
+            rows_a = build_rows
+
+        if depth >= _MAX_DEPTH:
+            # hashing does not split the rows any further, a merge join does not depend on the number of keys
+            normalize_keys = self._joiner._normalize_keys
+            sorted_a = sort_rows(rows_a, self._keys, self.memory_limit, self.codec, normalize_keys)
+            sorted_b = sort_rows(rows_b, self._keys, self.memory_limit, self.codec, normalize_keys)
+            yield from self._joiner(self._keys, sorted_a, sorted_b)
+            return
+
+        spills_a = [SpillFile(self.codec) for _ in range(self.partitions)]
+        spills_b = [SpillFile(self.codec) for _ in range(self.partitions)]
+        try:
+            key = self._key
+            for rows, spills in ((rows_a, spills_a), (rows_b, spills_b)):
+                for row in rows:
+                    spills[hash((depth, key(row))) % self.partitions].write(row)
+            table.clear()
+            for spilled_a, spilled_b in zip(spills_a, spills_b):
+                yield from self._join(iter(spilled_a), iter(spilled_b), depth + 1)
+        finally:
+            for spilled in itertools.chain(spills_a, spills_b):
+                spilled.close()
@@ -0,0 +1,234 @@
+"""Hash aggregation: grouping of unsorted rows by a dict of key values instead of a preceding sort."""
+from __future__ import annotations
+
+import itertools
+import typing as tp
+
+from .external_sort import DEFAULT_MEMORY_LIMIT, approx_row_size, sort_rows
+from .keys import key_getter
+from .operations import Aggregator, Operation, Reduce, Reducer, TRow, TRowsGenerator, TRowsIterable
+from .spill import SpillFile
+
+DEFAULT_PARTITIONS = 16
+DEFAULT_COMBINE_GROUPS = 16384
+DEFAULT_COMBINE_RATIO = 0.5
+# column of partial aggregator states emitted by :class:`Combine`
+PARTIAL_COLUMN = '__partial__'
+
+_MAX_DEPTH = 2
+# columns of spilled partial states of an aggregator
+_KEY = '__key__'
+_STATE = '__state__'
+_MISSING = object()
+
+
+class HashReduce(Operation):
+    """Group rows by ``keys`` in a hash table and apply ``reducer`` to every group; input need not be sorted.
+
+    Rows of a group are handed to the reducer in input order, groups come out in no particular order.
+
+    An :class:`operations.Aggregator` keeps a state per key instead of the rows, and the budget of about
+    ``memory_limit`` bytes is charged for the first row of every group. When the table is full, the states are
+    written to ``partitions`` temporary files (compressed with ``codec``) by the hash of their keys as partial
+    states and the table starts over; in the end the partial states of every partition are merged in the order
+    they were written and finalized.
+
+    A plain reducer needs all rows of its groups, so rows are buffered per key only while they fit into
+    ``memory_limit`` bytes. Beyond that the input is not a hash aggregation's job any more: the buffered and
+    remaining rows are sorted with :func:`external_sort.sort_rows` and reduced as contiguous groups.
+    """
+
+    def __init__(
+        self,
+        reducer: Reducer,
+        keys: tp.Sequence[str],
+        memory_limit: int = DEFAULT_MEMORY_LIMIT,
+        partitions: int = DEFAULT_PARTITIONS,
+        codec: str = 'none',
+    ) -> None:
+        self._reducer = reducer
+        self._keys = tuple(keys)
+        self._key = key_getter(self._keys)
+        self.memory_limit = memory_limit
+        self.partitions = partitions
+        self.codec = codec
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
+        if isinstance(self._reducer, Aggregator):
+            yield from self._fold(self._reducer, iter(rows))
+        else:
+            yield from self._aggregate(iter(rows))
+
+    def _aggregate(self, rows: tp.Iterator[TRow]) -> TRowsGenerator:
+        key = self._key
+        groups: dict[tp.Any, list[TRow]] = {}
+        buffered_size = 0
+        for row in rows:
+            row_key = key(row)
+            group = groups.get(row_key)
+            if group is None:
+                group = groups[row_key] = []
+            group.append(row)
+            buffered_size += approx_row_size(row)
+            if buffered_size >= self.memory_limit:
+                break
+        else:
+            for group in groups.values():
+                yield from self._reducer(self._keys, iter(group))
+            return
+
+        # spilling rows to hash partitions would not shrink groups held as rows, a sort handles any number of them
+        buffered = itertools.chain.from_iterable(groups.values())
+        sorted_rows = sort_rows(itertools.chain(buffered, rows), self._keys, self.memory_limit, self.codec)
+        yield from Reduce(self._reducer, self._keys)(sorted_rows)
+
+    def _fold(self, aggregator: Aggregator, rows: tp.Iterator[TRow]) -> TRowsGenerator:
+        key = self._key
+        init = aggregator.init
+        update = aggregator.update
+        states: dict[tp.Any, tp.Any] = {}
+        held_size = 0
+        spills: list[SpillFile] = []
+        try:
+            for row in rows:
+                row_key = key(row)
+                state = states.get(row_key, _MISSING)
+                if state is _MISSING:
+                    states[row_key] = init(self._keys, row)
+                    held_size += approx_row_size(row)
+                    if held_size >= self.memory_limit:
+                        self._spill_states(states, spills)
+                        held_size = 0
+                else:
+                    states[row_key] = update(state, row)
+
+            if not spills:
+                for state in states.values():
+                    yield from aggregator.finalize(self._keys, state)
+                return
+            self._spill_states(states, spills)
+            for spilled in spills:
+                yield from self._merge(aggregator, iter(spilled), 1)
+        finally:
+            for spilled in spills:
+                spilled.close()
+
+    def _spill_states(self, states: dict[tp.Any, tp.Any], spills: list[SpillFile]) -> None:
+        if not spills:
+            spills.extend(SpillFile(self.codec) for _ in range(self.partitions))
+        for state_key, state in states.items():
+            spills[hash((0, state_key)) % self.partitions].write({_KEY: state_key, _STATE: state})
+        states.clear()
+
+    def _merge(self, aggregator: Aggregator, records: tp.Iterator[TRow], depth: int) -> TRowsGenerator:
+        merge = aggregator.merge
+        states: dict[tp.Any, tp.Any] = {}
+        held_size = 0
+        for record in records:
+            state_key = record[_KEY]
+            state = states.get(state_key, _MISSING)
+            if state is _MISSING:
+                states[state_key] = record[_STATE]
+                held_size += approx_row_size(record)
+                if held_size >= self.memory_limit:
+                    break
+            else:
+                states[state_key] = merge(state, record[_STATE])
+        else:
+            for state in states.values():
+                yield from aggregator.finalize(self._keys, state)
+            return
+
+        held = ({_KEY: state_key, _STATE: state} for state_key, state in states.items())
+        if depth >= _MAX_DEPTH:
+            sorted_records = sort_rows(itertools.chain(held, records), (_KEY,), self.memory_limit, self.codec)
+            for _, group in itertools.groupby(sorted_records, key=lambda record: record[_KEY]):
+                group_states = (record[_STATE] for record in group)
+                state = next(group_states)
+                for other in group_states:
+                    state = merge(state, other)
+                yield from aggregator.finalize(self._keys, state)
+            return
+
+        spills = [SpillFile(self.codec) for _ in range(self.partitions)]
+        try:
+            for record in itertools.chain(held, records):
+                spills[hash((depth, record[_KEY])) % self.partitions].write(record)
+            states.clear()
+            for spilled in spills:
+                yield from self._merge(aggregator, iter(spilled), depth + 1)
+        finally:
+            for spilled in spills:
+                spilled.close()
+
+
+class MergePartials(Aggregator):
+    """Aggregator over the output of :class:`Combine`: folds partial states and raw rows of ``aggregator``."""
+
+    def __init__(self, aggregator: Aggregator) -> None:
+        self._aggregator = aggregator
+
+    def init(self, group_key: tuple[str, ...], row: TRow) -> tp.Any:
+        if PARTIAL_COLUMN in row:
+            return row[PARTIAL_COLUMN]
+        return self._aggregator.init(group_key, row)
+
+    def update(self, state: tp.Any, row: TRow) -> tp.Any:
+        if PARTIAL_COLUMN in row:
+            return self._aggregator.merge(state, row[PARTIAL_COLUMN])
+        return self._aggregator.update(state, row)
+
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        return self._aggregator.merge(state, other)
+
+    def finalize(self, group_key: tuple[str, ...], state: tp.Any) -> TRowsGenerator:
+        return self._aggregator.finalize(group_key, state)
+
+
+class Combine(Operation):
+    """Pre-aggregate rows by ``keys`` in a bounded hash table before a sort and reduce (a map-side combiner).
+
+    Up to ``max_groups`` per-key states of ``aggregator`` are kept; when the table is full every state is emitted
+    as a partial row (the key columns plus the state in :data:`PARTIAL_COLUMN`) and the table starts over, so the
+    partial rows of a key follow the order of its rows. If a table flush shows that rows hardly collapse (more
+    than ``max_ratio`` states per row), the rest of the input is passed through unchanged. The output is meant to
+    be grouped by ``keys`` and reduced with :class:`MergePartials` of the same aggregator.
+    """
+
+    def __init__(self, aggregator: Aggregator, keys: tp.Sequence[str], max_groups: int = DEFAULT_COMBINE_GROUPS,
+                 max_ratio: float = DEFAULT_COMBINE_RATIO) -> None:
+        self._aggregator = aggregator
+        self._keys = tuple(keys)
+        self._key = key_getter(self._keys)
+        self.max_groups = max_groups
+        self.max_ratio = max_ratio
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
+        key = self._key
+        init = self._aggregator.init
+        update = self._aggregator.update
+        states: dict[tp.Any, list[tp.Any]] = {}
+        consumed = 0
+        rows_iter = iter(rows)
+        for row in rows_iter:
+            consumed += 1
+            row_key = key(row)
+            entry = states.get(row_key)
+            if entry is None:
+                states[row_key] = [{column: row[column] for column in self._keys}, init(self._keys, row)]
+                if len(states) >= self.max_groups:
+                    yield from self._flush(states)
+                    if self.max_groups > consumed * self.max_ratio:
+                        break
+                    consumed = 0
+            else:
+                entry[1] = update(entry[1], row)
+        yield from self._flush(states)
+        yield from rows_iter
+
+    @staticmethod
+    def _flush(states: dict[tp.Any, list[tp.Any]]) -> TRowsGenerator:
+        for columns, state in states.values():
+            columns[PARTIAL_COLUMN] = state
+            yield columns
+        states.clear()
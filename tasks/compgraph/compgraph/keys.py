@@ -0,0 +1,122 @@
+"""Key extraction shared by sorting, grouping and joining operations.
+
+:func:`key_getter` compiles a getter once per operation instead of building a tuple with a generator expression
+for every row: no keys give a constant empty tuple, a single key gives the bare value, several keys give a
+tuple (all via :func:`operator.itemgetter`). Keys produced by one getter are only meant to be compared with keys
+of the same getter.
+
+:func:`normalized_key_getter` encodes key values into order-preserving byte strings instead, so that ordering
+compares are plain ``memcmp`` and the order is defined for any mix of supported types:
+``None`` < numbers (``bool``, ``int`` and ``float`` compared by value) < ``str`` < ``bytes`` < ``tuple``/``list``
+(compared element-wise). Within a type the order is Python's own, so input sorted by raw values of one type is
+sorted by normalized keys as well. Values of other types raise :class:`TypeError`.
+
+Encoding a key costs more Python work than comparing raw values saves, so normalized keys are opt-in
+(``normalize_keys`` of sorts and joiners) for data with ``None`` or mixed-type keys. A stream sorted with
+normalized keys must be joined with ``normalize_keys=True`` too.
+"""
+from __future__ import annotations
+
+import struct
+import typing as tp
+from operator import itemgetter
+
+TRow = dict[str, tp.Any]
+KeyFunc = tp.Callable[[TRow], tp.Any]
+
+_NONE, _NUMBER, _STR, _BYTES, _SEQUENCE = b'\x01', b'\x02', b'\x03', b'\x04', b'\x05'
+_END_OF_BYTES = b'\x00\x00'
+_END_OF_SEQUENCE = b'\x00'
+_DOUBLE = struct.Struct('>d')
+_UINT64 = struct.Struct('>Q')
+_SIGN_BIT = 1 << 63
+_ALL_BITS = (1 << 64) - 1
+_EXACT_FLOAT_INT = 1 << 53
+_ZERO_REMAINDER = b'\x80'
+
+
+def key_getter(keys: tp.Sequence[str], normalize: bool = False) -> KeyFunc:
+    """Compile getter of raw key values: ``()`` for no keys, bare value for one key, tuple otherwise.
+
+    With ``normalize`` the getter of normalized keys (:func:`normalized_key_getter`) is returned instead.
+    """
+    if normalize:
+        return normalized_key_getter(keys)
+    if not keys:
+        return lambda row: ()
+    return itemgetter(*keys)
+
+
+def _encode_remainder(remainder: int) -> bytes:
+    # signed integer encoding where longer magnitudes sort further away from zero
+    if remainder == 0:
+        return _ZERO_REMAINDER
+    size = (abs(remainder).bit_length() + 7) // 8
+    if remainder > 0:
+        return bytes([0x80 + size]) + remainder.to_bytes(size, 'big')
+    return bytes([0x80 - size]) + ((1 << 8 * size) - 1 + remainder).to_bytes(size, 'big')
+
+
+def _encode_number(value: tp.Any) -> bytes:
+    as_float = float(value) + 0.0  # folds -0.0 into 0.0, as they are equal
+    bits = _UINT64.unpack(_DOUBLE.pack(as_float))[0]
+    bits = bits ^ _ALL_BITS if bits & _SIGN_BIT else bits | _SIGN_BIT
+    if type(value) is float or -_EXACT_FLOAT_INT <= value <= _EXACT_FLOAT_INT:
+        remainder = _ZERO_REMAINDER
+    else:  # big ints share a float with their neighbours, the exact difference breaks the tie
+        remainder = _encode_remainder(value - int(as_float))
+    return _NUMBER + _UINT64.pack(bits) + remainder
+
+
+def _encode_str(value: str) -> bytes:
+    return _STR + value.encode('utf-8', 'surrogatepass').replace(b'\x00', b'\x00\xff') + _END_OF_BYTES
+
+
+def _encode_bytes(value: bytes) -> bytes:
+    return _BYTES + bytes(value).replace(b'\x00', b'\x00\xff') + _END_OF_BYTES
+
+
+def _encode_sequence(value: tp.Sequence[tp.Any]) -> bytes:
+    return _SEQUENCE + b''.join(map(normalize_value, value)) + _END_OF_SEQUENCE
+
+
+_ENCODERS: dict[type, tp.Callable[[tp.Any], bytes]] = {
+    type(None): lambda value: _NONE,
+    bool: _encode_number,
+    int: _encode_number,
+    float: _encode_number,
+    str: _encode_str,
+    bytes: _encode_bytes,
+    bytearray: _encode_bytes,
+    tuple: _encode_sequence,
+    list: _encode_sequence,
+}
+
+
+def normalize_value(value: tp.Any) -> bytes:
+    """Encode single value into order-preserving bytes (see module docstring for the order)."""
+    encoder = _ENCODERS.get(type(value))
+    if encoder is None:
+        for base, base_encoder in _ENCODERS.items():
+            if base is not type(None) and isinstance(value, base):
+                encoder = base_encoder
+                break
+        else:
+            raise TypeError(f'cannot build normalized key from {type(value).__name__} value {value!r}')
+    return encoder(value)
+
+
+def normalize(values: tp.Iterable[tp.Any]) -> bytes:
+    """Encode composite key; encodings of values are self-delimiting, so concatenation preserves the order."""
+    return b''.join(map(normalize_value, values))
+
+
+def normalized_key_getter(keys: tp.Sequence[str]) -> tp.Callable[[TRow], bytes]:
+    """Compile getter of normalized keys with fast paths for zero and one key columns."""
+    if not keys:
+        return lambda row: b''
+    if len(keys) == 1:
+        (column,) = keys
+        return lambda row: normalize_value(row[column])
+    getter = itemgetter(*keys)
+    return lambda row: normalize(getter(row))
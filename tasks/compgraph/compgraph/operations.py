@@ -2,8 +2,13 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 import heapq
+import itertools
 import string
 import typing as tp
+from operator import itemgetter
+
+from .keys import key_getter
+from .spill import DEFAULT_BUFFER_LIMIT, SpillBuffer
 
 TRow = dict[str, tp.Any]
 TRowsIterable = tp.Iterable[TRow]
@@ -43,6 +48,11 @@ class ReadIterFactory(Operation):
             yield row
 
 
+def order_prefix(order: tp.Sequence[str], changed: tp.Collection[str]) -> tuple[str, ...]:
+    """Longest prefix of sort ``order`` that does not touch any of ``changed`` columns."""
+    return tuple(itertools.takewhile(lambda column: column not in changed, order))
+
+
 class Mapper(ABC):
     """Base class for mappers."""
 
@@ -51,6 +61,20 @@ class Mapper(ABC):
         """Process single row and yield zero or more rows."""
         raise NotImplementedError  # pragma: no cover - abstract fallback
 
+    def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+        """Columns the output is sorted by when the input is sorted by ``order``.
+
+        Nothing is assumed about mappers that do not override it.
+        """
+        return ()
+
+    def with_params(self, params: tp.Mapping[str, tp.Any]) -> 'Mapper':
+        """Mapper to apply given the values of scalar parameters bound by :meth:`Graph.with_scalar`.
+
+        Mappers that take no parameters return themselves.
+        """
+        return self
+
 
 class Map(Operation):
     """Apply mapper to each row from upstream iterator."""
@@ -73,12 +97,65 @@ class Reducer(ABC):
         raise NotImplementedError  # pragma: no cover - abstract fallback
 
 
+class Aggregator(Reducer):
+    """Reducer computed through a mergeable per-group state.
+
+    ``init`` makes the state of a group from its first row, ``update`` folds the next row into a state and
+    ``merge`` combines the states of two consecutive parts of a group (``other`` holding the later rows), so a
+    group may be aggregated in pieces (batches, partitions, processes) and combined without its rows. ``finalize``
+    turns a state into output rows. States are plain picklable values; ``update`` and ``merge`` may change the
+    state passed in and must return the resulting one.
+
+    Called as a reducer, an aggregator folds the whole group and finalizes it. Aggregators with ``combinable``
+    have small states worth pre-aggregating before a sort (see :meth:`Graph.combine`).
+    """
+
+    combinable: bool = False
+
+    @abstractmethod
+    def init(self, group_key: tuple[str, ...], row: TRow) -> tp.Any:
+        """State of a group consisting of ``row`` only."""
+        raise NotImplementedError  # pragma: no cover - abstract fallback
+
+    @abstractmethod
+    def update(self, state: tp.Any, row: TRow) -> tp.Any:
+        """Fold ``row`` into ``state``."""
+        raise NotImplementedError  # pragma: no cover - abstract fallback
+
+    @abstractmethod
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        """Combine ``state`` with the state of the rows following it."""
+        raise NotImplementedError  # pragma: no cover - abstract fallback
+
+    @abstractmethod
+    def finalize(self, group_key: tuple[str, ...], state: tp.Any) -> TRowsGenerator:
+        """Yield output rows of a group with ``state``."""
+        raise NotImplementedError  # pragma: no cover - abstract fallback
+
+    def __eq__(self, other: object) -> bool:
+        """Aggregators of the same class and configuration fold rows into the same states."""
+        return type(self) is type(other) and vars(self) == vars(other)
+
+    def __hash__(self) -> int:
+        return hash(type(self))
+
+    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
+        rows_iter = iter(rows)
+        for first in rows_iter:
+            update = self.update
+            state = self.init(group_key, first)
+            for row in rows_iter:
+                state = update(state, row)
+            yield from self.finalize(group_key, state)
+
+
 class Reduce(Operation):
     """Group rows by keys and apply reducer for every group."""
 
     def __init__(self, reducer: Reducer, keys: tp.Sequence[str]) -> None:
         self._reducer = reducer
         self._keys = tuple(keys)
+        self._key = key_getter(self._keys)
 
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
         rows_iter = iter(rows)
@@ -87,9 +164,7 @@ class Reduce(Operation):
         except StopIteration:
             return
 
-        def make_key(row: TRow) -> tuple[tp.Any, ...]:
-            return tuple(row[k] for k in self._keys)
-
+        make_key = self._key
         current_key = make_key(first)
         buffered = first
         finished = False
@@ -107,7 +182,6 @@ class Reduce(Operation):
                     except StopIteration:
                         finished = True
                         buffered = None
-                        current_key = ()
                         return
                     k = make_key(row)
                     if k != key_val:
@@ -126,11 +200,30 @@ class Reduce(Operation):
 
 
 class Joiner(ABC):
-    """Base class for joiners."""
+    """Base class for joiners.
+
+    Merge joiners compare keys of both sorted streams; ``normalize_keys`` must match the way the streams were
+    sorted (see :mod:`compgraph.keys`). Joiners with ``keeps_key_order`` emit rows sorted by the join keys.
+    ``keeps_unmatched`` tells for streams ``a`` and ``b`` whether their rows without a match are kept, which lets
+    :class:`hash_join.HashJoin` reproduce the joiner; it is ``None`` for joiners that only merge.
 
-    def __init__(self, suffix_a: str = '_1', suffix_b: str = '_2') -> None:
+    The rows of the current key that merge joiners hold for the cross product are kept in a
+    :class:`spill.SpillBuffer`: past about ``memory_limit`` bytes they go to a temporary file and are replayed
+    from it, so a hot key does not grow memory.
+    """
+
+    keeps_key_order: tp.ClassVar[bool] = False
+    keeps_unmatched: tp.ClassVar[tuple[bool, bool] | None] = None
+
+    def __init__(self, suffix_a: str = '_1', suffix_b: str = '_2', normalize_keys: bool = False,
+                 memory_limit: int = DEFAULT_BUFFER_LIMIT) -> None:
         self._a_suffix = suffix_a
         self._b_suffix = suffix_b
+        self._normalize_keys = normalize_keys
+        self.memory_limit = memory_limit
+
+    def _group_buffer(self) -> SpillBuffer:
+        return SpillBuffer(self.memory_limit)
 
     @abstractmethod
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
@@ -150,16 +243,137 @@ class Join(Operation):
             yield row
 
 
+class MultiJoin(Operation):
+    """Merge join of any number of streams sorted by ``keys`` in one pass.
+
+    The streams are merged with a heap and for every key the rows of each stream are buffered (in
+    :class:`spill.SpillBuffer`, past about ``memory_limit`` bytes on disk); every combination of one row per
+    stream is then merged into a single row. With ``how='inner'`` a key must occur in all streams, with
+    ``'left'`` in the first one, with ``'outer'`` in any (absent streams are left out of the combinations).
+    Columns other than ``keys`` found in several rows of a combination get the suffix of their stream (``_1``,
+    ``_2``, ... by default), as with :class:`Joiner`. Rows come out sorted by ``keys``.
+    """
+
+    HOWS = ('inner', 'left', 'outer')
+
+    def __init__(self, keys: tp.Sequence[str], how: str = 'inner', suffixes: tp.Sequence[str] | None = None,
+                 normalize_keys: bool = False, memory_limit: int = DEFAULT_BUFFER_LIMIT) -> None:
+        if how not in self.HOWS:
+            raise ValueError(f'unknown join type {how!r}, expected one of {self.HOWS}')
+        self._keys = tuple(keys)
+        self._key = key_getter(self._keys, normalize_keys)
+        self.how = how
+        self._suffixes = None if suffixes is None else tuple(suffixes)
+        self.memory_limit = memory_limit
+
+    def __call__(self, *streams: TRowsIterable, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
+        suffixes = self._suffixes or tuple(f'_{index + 1}' for index in range(len(streams)))
+        if len(suffixes) != len(streams):
+            raise ValueError(f'{len(streams)} streams need as many suffixes, got {len(suffixes)}')
+        key = self._key
+        tagged = [_tag_rows(stream, index, key) for index, stream in enumerate(streams)]
+        merged = heapq.merge(*tagged, key=itemgetter(0))
+        for _, group in itertools.groupby(merged, key=itemgetter(0)):
+            buffers = [SpillBuffer(self.memory_limit) for _ in streams]
+            try:
+                for _, index, row in group:
+                    buffers[index].append(row)
+                present = [(suffixes[index], buffer) for index, buffer in enumerate(buffers) if len(buffer)]
+                if self.how == 'inner' and len(present) < len(streams):
+                    continue
+                if self.how == 'left' and not len(buffers[0]):
+                    continue
+                yield from _combinations(self._keys, present, [])
+            finally:
+                for buffer in buffers:
+                    buffer.close()
+
+
+def _tag_rows(rows: TRowsIterable, index: int,
+              key: tp.Callable[[TRow], tp.Any]) -> tp.Iterator[tuple[tp.Any, int, TRow]]:
+    for row in rows:
+        yield key(row), index, row
+
+
+def _combinations(keys: tuple[str, ...], groups: list[tuple[str, SpillBuffer]],
+                  chosen: list[tuple[str, TRow]]) -> TRowsGenerator:
+    if len(chosen) == len(groups):
+        yield _merge_many(keys, chosen)
+        return
+    suffix, buffer = groups[len(chosen)]
+    for row in buffer:
+        chosen.append((suffix, row))
+        yield from _combinations(keys, groups, chosen)
+        chosen.pop()
+
+
+def _merge_many(keys: tuple[str, ...], rows: list[tuple[str, TRow]]) -> TRow:
+    counts: dict[str, int] = {}
+    for _, row in rows:
+        for column in row:
+            counts[column] = counts.get(column, 0) + 1
+    res: TRow = {}
+    for suffix, row in rows:
+        for column, value in row.items():
+            if column in keys:
+                res.setdefault(column, value)
+            elif counts[column] > 1:
+                res[column + suffix] = value
+            else:
+                res[column] = value
+    return res
+
+
+class Top(Operation):
+    """Yield the first ``k`` rows of the stable sort by ``keys`` (descending with ``descending``) in one pass.
+
+    Only ``k`` rows are held in memory (see :func:`top_rows`).
+    """
+
+    def __init__(self, k: int, keys: tp.Sequence[str], descending: bool = False, normalize_keys: bool = False) -> None:
+        self._k = k
+        self._key = key_getter(tuple(keys), normalize_keys)
+        self._descending = descending
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
+        yield from top_rows(rows, self._k, self._key, self._descending)
+
+
+class Limit(Operation):
+    """Yield at most ``n`` first rows and stop reading upstream."""
+
+    def __init__(self, n: int) -> None:
+        self._n = n
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
+        yield from itertools.islice(rows, self._n)
+
+
 class DummyMapper(Mapper):
     """Yield exactly the row passed."""
 
     def __call__(self, row: TRow) -> TRowsGenerator:
         yield dict(row)
 
+    def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+        return order
+
 
-class FirstReducer(Reducer):
+class FirstReducer(Aggregator):
     """Yield only first row from passed ones."""
 
+    def init(self, group_key: tuple[str, ...], row: TRow) -> TRow:
+        return row
+
+    def update(self, state: TRow, row: TRow) -> TRow:
+        return state
+
+    def merge(self, state: TRow, other: TRow) -> TRow:
+        return state
+
+    def finalize(self, group_key: tuple[str, ...], state: TRow) -> TRowsGenerator:
+        yield dict(state)
+
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
         for row in rows:
             yield dict(row)
@@ -179,6 +393,9 @@ class FilterPunctuation(Mapper):
         new_row[self._column] = filter_value
         yield new_row
 
+    def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+        return order_prefix(order, {self._column})
+
 
 class LowerCase(Mapper):
     """Replace column value with value in lower case."""
@@ -193,6 +410,9 @@ class LowerCase(Mapper):
         new_row[self._column] = lower_value
         yield new_row
 
+    def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+        return order_prefix(order, {self._column})
+
 
 class Split(Mapper):
     """Split row on multiple rows by separator."""
@@ -220,6 +440,9 @@ class Split(Mapper):
             new[self._column] = p
             yield new
 
+    def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+        return order_prefix(order, {self._column})
+
 
 class Product(Mapper):
     """Calculates product of multiple columns."""
@@ -236,6 +459,9 @@ class Product(Mapper):
         new_row[self._result_column] = result_value
         yield new_row
 
+    def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+        return order_prefix(order, {self._result_column})
+
 
 class Filter(Mapper):
     """Remove records that don't satisfy some condition."""
@@ -248,6 +474,9 @@ class Filter(Mapper):
             new_row = dict(row)
             yield new_row
 
+    def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+        return order
+
 
 class Project(Mapper):
     """Leave only mentioned columns."""
@@ -261,57 +490,93 @@ class Project(Mapper):
             new_row[column] = row[column]
         yield new_row
 
+    def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+        return order_prefix(order, set(order) - set(self._columns))
+
 
-class TopN(Reducer):
-    """Calculate top N by value in ``column``."""
+def top_rows(rows: TRowsIterable, n: int, key: tp.Callable[[TRow], tp.Any], descending: bool = False) -> list[TRow]:
+    """First ``n`` rows of the stable sort of ``rows`` by ``key`` (reversed with ``descending``).
+
+    Rows are streamed through a bounded heap, so at most ``n`` rows are held in memory.
+    """
+    if descending:
+        return heapq.nlargest(n, rows, key=key)
+    return heapq.nsmallest(n, rows, key=key)
+
+
+class TopN(Aggregator):
+    """Calculate top N by value in ``column``.
+
+    The state is ``[heap, rows_seen]`` with a min-heap of ``(value, -position, row)`` of the best rows so far, so
+    of rows with equal values the earliest ones are kept and yielded first.
+    """
 
     def __init__(self, column: str, n: int) -> None:
         self._column_max = column
         self._n = n
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
-        heap: list[tuple[tp.Any, int, TRow]] = []
+    def init(self, group_key: tuple[str, ...], row: TRow) -> list[tp.Any]:
+        return self.update([[], 0], row)
+
+    def update(self, state: list[tp.Any], row: TRow) -> list[tp.Any]:
+        heap, position = state
+        self._push(heap, (row[self._column_max], -position, row))
+        state[1] = position + 1
+        return state
+
+    def merge(self, state: list[tp.Any], other: list[tp.Any]) -> list[tp.Any]:
+        heap, position = state
+        other_heap, other_count = other
+        for value, other_position, row in other_heap:
+            self._push(heap, (value, other_position - position, row))
+        state[1] = position + other_count
+        return state
+
+    def finalize(self, group_key: tuple[str, ...], state: list[tp.Any]) -> TRowsGenerator:
+        for _, _, row in sorted(state[0], reverse=True):
+            yield dict(row)
 
-        for i, row in enumerate(rows):
-            value = row[self._column_max]
-            item = dict(row)
-            if len(heap) < self._n:
-                heapq.heappush(heap, (value, i, item))
-            else:
-                if value > heap[0][0]:
-                    heapq.heapreplace(heap, (value, i, item))
+    def _push(self, heap: list[tuple[tp.Any, int, TRow]], item: tuple[tp.Any, int, TRow]) -> None:
+        if len(heap) < self._n:
+            heapq.heappush(heap, item)
+        elif heap and item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
 
-        for _, _, row in sorted(heap, key=lambda x: x[0], reverse=True):
-            yield row
+    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
+        for row in top_rows(rows, self._n, itemgetter(self._column_max), descending=True):
+            yield dict(row)
 
 
-class TermFrequency(Reducer):
-    """Calculate frequency of values in column for each group."""
+class TermFrequency(Aggregator):
+    """Calculate frequency of values in column for each group.
+
+    The state is ``[first_row_columns, counts_by_word, total]``.
+    """
 
     def __init__(self, words_column: str, result_column: str = 'tf') -> None:
         self._words_column = words_column
         self._result_column = result_column
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
-        total = 0
-        counts: dict[tp.Any, int] = {}
-        first_row: TRow | None = None
-
-        for row in rows:
-            if first_row is None:
-                first_row = row
-            word = row[self._words_column]
-            counts[word] = counts.get(word, 0) + 1
-            total += 1
-
-        if first_row is None or total == 0:
-            return
-
-        base: TRow = {}
-        for k, v in first_row.items():
-            if k not in (self._words_column, 'count'):
-                base[k] = v
-
+    def init(self, group_key: tuple[str, ...], row: TRow) -> list[tp.Any]:
+        base = {k: v for k, v in row.items() if k not in (self._words_column, 'count')}
+        return [base, {row[self._words_column]: 1}, 1]
+
+    def update(self, state: list[tp.Any], row: TRow) -> list[tp.Any]:
+        counts = state[1]
+        word = row[self._words_column]
+        counts[word] = counts.get(word, 0) + 1
+        state[2] += 1
+        return state
+
+    def merge(self, state: list[tp.Any], other: list[tp.Any]) -> list[tp.Any]:
+        counts = state[1]
+        for word, count in other[1].items():
+            counts[word] = counts.get(word, 0) + count
+        state[2] += other[2]
+        return state
+
+    def finalize(self, group_key: tuple[str, ...], state: list[tp.Any]) -> TRowsGenerator:
+        base, counts, total = state
         for word, c in counts.items():
             new_row = dict(base)
             new_row[self._words_column] = word
@@ -319,53 +584,82 @@ class TermFrequency(Reducer):
             yield new_row
 
 
-class Count(Reducer):
-    """Count records by key."""
+def _group_columns(row: TRow, group_key: tuple[str, ...]) -> TRow:
+    return {key: row[key] for key in row if key in group_key}
 
-    def __init__(self, column: str) -> None:
-        self._column = column
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
-        cnt = 0
-        saved_row: TRow | None = None
-        for row in rows:
-            cnt += 1
-            saved_row = row
+class ScalarAggregator(Aggregator):
+    """Aggregator yielding one row per group: the group key columns and the :meth:`value` of the state.
 
-        if saved_row is None:
-            return
+    States are lists starting with the group key columns of the first row; the value goes to ``_result_column``.
+    """
 
-        new_row: TRow = {key: saved_row[key] for key in saved_row if key in group_key}
-        new_row[self._column] = cnt
+    _result_column: str
+
+    @property
+    def result_column(self) -> str:
+        """Column :meth:`finalize` writes the value to."""
+        return self._result_column
+
+    @abstractmethod
+    def value(self, state: list[tp.Any]) -> tp.Any:
+        """Aggregate value of a group with ``state``."""
+        raise NotImplementedError  # pragma: no cover - abstract fallback
+
+    def finalize(self, group_key: tuple[str, ...], state: list[tp.Any]) -> TRowsGenerator:
+        new_row = dict(state[0])
+        new_row[self._result_column] = self.value(state)
         yield new_row
 
 
-class Sum(Reducer):
-    """Sum values aggregated by key."""
+class Count(ScalarAggregator):
+    """Count records by key; the state is ``[group_columns, count]``."""
+
+    combinable = True
+
+    def __init__(self, column: str = 'count') -> None:
+        self._result_column = column
+
+    def init(self, group_key: tuple[str, ...], row: TRow) -> list[tp.Any]:
+        return [_group_columns(row, group_key), 1]
+
+    def update(self, state: list[tp.Any], row: TRow) -> list[tp.Any]:
+        state[1] += 1
+        return state
+
+    def merge(self, state: list[tp.Any], other: list[tp.Any]) -> list[tp.Any]:
+        state[1] += other[1]
+        return state
+
+    def value(self, state: list[tp.Any]) -> int:
+        return state[1]
+
+
+class Sum(ScalarAggregator):
+    """Sum values aggregated by key; the state is ``[group_columns, total]``."""
+
+    combinable = True
 
     def __init__(self, column: str) -> None:
         self._column = column
+        self._result_column = column
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
-        total = 0
-        saved_row: TRow | None = None
-        for row in rows:
-            total += row[self._column]
-            saved_row = row
+    def init(self, group_key: tuple[str, ...], row: TRow) -> list[tp.Any]:
+        return [_group_columns(row, group_key), 0 + row[self._column]]
 
-        if saved_row is None:
-            return
-
-        new_row: TRow = {key: saved_row[key] for key in saved_row if key in group_key}
-        new_row[self._column] = total
-        yield new_row
+    def update(self, state: list[tp.Any], row: TRow) -> list[tp.Any]:
+        state[1] += row[self._column]
+        return state
 
+    def merge(self, state: list[tp.Any], other: list[tp.Any]) -> list[tp.Any]:
+        state[1] += other[1]
+        return state
 
-def _row_key(row: TRow, keys: tp.Sequence[str]) -> tuple:
-    return tuple(row[k] for k in keys)
+    def value(self, state: list[tp.Any]) -> tp.Any:
+        return state[1]
 
 
-def _key_by(row: TRow, keys: tp.Sequence[str]) -> tuple[tp.Any, ...]:
+def _row_key(row: TRow, keys: tp.Sequence[str]) -> tuple:
     return tuple(row[k] for k in keys)
 
 
@@ -401,7 +695,11 @@ def _merge_rows(
 class InnerJoiner(Joiner):
     """Join with inner strategy."""
 
+    keeps_key_order = True
+    keeps_unmatched = (False, False)
+
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
+        key = key_getter(keys, self._normalize_keys)
         it_a = iter(rows_a)
         it_b = iter(rows_b)
 
@@ -415,106 +713,114 @@ class InnerJoiner(Joiner):
         except StopIteration:
             return
 
-        ka = _key_by(a, keys)
-        kb = _key_by(b, keys)
+        ka = key(a)
+        kb = key(b)
 
         while True:
             if ka < kb:
                 try:
                     a = next(it_a)
-                    ka = _key_by(a, keys)
+                    ka = key(a)
                 except StopIteration:
                     return
             elif ka > kb:
                 try:
                     b = next(it_b)
-                    kb = _key_by(b, keys)
+                    kb = key(b)
                 except StopIteration:
                     return
             else:
                 current_key = ka
 
-                group_a = [a]
-                while True:
-                    try:
-                        na = next(it_a)
-                    except StopIteration:
-                        na = None
-                        break
-                    if _key_by(na, keys) == current_key:
-                        group_a.append(na)
-                    else:
-                        break
-
-                while True:
-                    for aa in group_a:
-                        yield _merge_rows(keys, aa, b, self._a_suffix, self._b_suffix)
-
-                    try:
-                        nb = next(it_b)
-                    except StopIteration:
-                        nb = None
-                        break
-
-                    if _key_by(nb, keys) == current_key:
-                        b = nb
-                        continue
-                    else:
-                        b = nb
-                        kb = _key_by(b, keys)
-                        break
+                with self._group_buffer() as group_a:
+                    group_a.append(a)
+                    while True:
+                        try:
+                            na = next(it_a)
+                        except StopIteration:
+                            na = None
+                            break
+                        if key(na) == current_key:
+                            group_a.append(na)
+                        else:
+                            break
+
+                    while True:
+                        for aa in group_a:
+                            yield _merge_rows(keys, aa, b, self._a_suffix, self._b_suffix)
+
+                        try:
+                            nb = next(it_b)
+                        except StopIteration:
+                            nb = None
+                            break
+
+                        if key(nb) == current_key:
+                            b = nb
+                            continue
+                        else:
+                            b = nb
+                            kb = key(b)
+                            break
 
                 if na is None or b is None:
                     return
 
                 a = na
-                ka = _key_by(a, keys)
+                ka = key(a)
 
 
 class OuterJoiner(Joiner):
     """Join with outer strategy."""
 
-    def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
-        dict_a: dict[tuple[tp.Any, ...], list[TRow]] = {}
-        dict_b: dict[tuple[tp.Any, ...], list[TRow]] = {}
-
-        for a in rows_a:
-            key_a = _row_key(a, keys)
-            if key_a not in dict_a:
-                dict_a[key_a] = []
-            dict_a[key_a].append(a)
-
-        for b in rows_b:
-            key_b = _row_key(b, keys)
-            if key_b not in dict_b:
-                dict_b[key_b] = []
-            dict_b[key_b].append(b)
-
-        all_keys = set(dict_a.keys()) | set(dict_b.keys())
+    keeps_key_order = True
+    keeps_unmatched = (True, True)
 
-        for key in all_keys:
-            list_a = dict_a.get(key, [])
-            list_b = dict_b.get(key, [])
+    def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
+        key = key_getter(keys, self._normalize_keys)
+        it_a = iter(rows_a)
+        it_b = iter(rows_b)
+        a = next(it_a, None)
+        b = next(it_b, None)
 
-            if not list_a:
-                for b in list_b:
-                    yield dict(b)
-                continue
+        while a is not None and b is not None:
+            ka = key(a)
+            kb = key(b)
+            if ka < kb:
+                yield dict(a)
+                a = next(it_a, None)
+            elif kb < ka:
+                yield dict(b)
+                b = next(it_b, None)
+            else:
+                with self._group_buffer() as group_b:
+                    while b is not None and key(b) == ka:
+                        group_b.append(b)
+                        b = next(it_b, None)
 
-            if not list_b:
-                for a in list_a:
-                    yield dict(a)
-                continue
+                    while a is not None and key(a) == ka:
+                        for bb in group_b:
+                            yield _merge_rows(keys, a, bb, self._a_suffix, self._b_suffix)
+                        a = next(it_a, None)
 
-            for a in list_a:
-                for b in list_b:
-                    yield {**a, **b}
+        if a is not None:
+            yield dict(a)
+            for a in it_a:
+                yield dict(a)
+        if b is not None:
+            yield dict(b)
+            for b in it_b:
+                yield dict(b)
 
 
 class LeftJoiner(Joiner):
     """Join with left strategy."""
 
+    keeps_key_order = True
+    keeps_unmatched = (True, False)
+
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
+        key = key_getter(keys, self._normalize_keys)
         it_a = iter(rows_a)
         it_b = iter(rows_b)
 
@@ -531,8 +837,8 @@ class LeftJoiner(Joiner):
                 yield dict(a)
             return
 
-        ka = _key_by(a, keys)
-        kb = _key_by(b, keys)
+        ka = key(a)
+        kb = key(b)
 
         while True:
             if ka < kb:
@@ -543,11 +849,11 @@ class LeftJoiner(Joiner):
                         na = next(it_a)
                     except StopIteration:
                         return
-                    if _key_by(na, keys) == current_key:
+                    if key(na) == current_key:
                         yield dict(na)
                     else:
                         a = na
-                        ka = _key_by(a, keys)
+                        ka = key(a)
                         break
 
             elif ka > kb:
@@ -560,43 +866,44 @@ class LeftJoiner(Joiner):
                         for a in it_a:
                             yield dict(a)
                         return
-                    if _key_by(nb, keys) == current_key:
+                    if key(nb) == current_key:
                         continue
                     else:
                         b = nb
-                        kb = _key_by(b, keys)
+                        kb = key(b)
                         break
 
             else:
                 current_key = ka
 
-                group_b = [b]
-                while True:
-                    try:
-                        nb = next(it_b)
-                    except StopIteration:
-                        nb = None
-                        break
-                    if _key_by(nb, keys) == current_key:
-                        group_b.append(nb)
-                    else:
-                        break
-
-                while True:
-                    for bb in group_b:
-                        yield _merge_rows(keys, a, bb, self._a_suffix, self._b_suffix)
-
-                    try:
-                        na = next(it_a)
-                    except StopIteration:
-                        na = None
-                        break
-
-                    if _key_by(na, keys) == current_key:
-                        a = na
-                        continue
-                    else:
-                        break
+                with self._group_buffer() as group_b:
+                    group_b.append(b)
+                    while True:
+                        try:
+                            nb = next(it_b)
+                        except StopIteration:
+                            nb = None
+                            break
+                        if key(nb) == current_key:
+                            group_b.append(nb)
+                        else:
+                            break
+
+                    while True:
+                        for bb in group_b:
+                            yield _merge_rows(keys, a, bb, self._a_suffix, self._b_suffix)
+
+                        try:
+                            na = next(it_a)
+                        except StopIteration:
+                            na = None
+                            break
+
+                        if key(na) == current_key:
+                            a = na
+                            continue
+                        else:
+                            break
 
                 if na is None:
                     return
@@ -608,15 +915,19 @@ class LeftJoiner(Joiner):
                     return
 
                 a = na
-                ka = _key_by(a, keys)
+                ka = key(a)
                 b = nb
-                kb = _key_by(b, keys)
+                kb = key(b)
 
 
 class RightJoiner(Joiner):
     """Join with right strategy."""
 
+    keeps_key_order = True
+    keeps_unmatched = (False, True)
+
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
+        key = key_getter(keys, self._normalize_keys)
         it_a = iter(rows_a)
         it_b = iter(rows_b)
 
@@ -632,8 +943,8 @@ class RightJoiner(Joiner):
         except StopIteration:
             return
 
-        ka = _key_by(a, keys)
-        kb = _key_by(b, keys)
+        ka = key(a)
+        kb = key(b)
 
         while True:
             if ka < kb:
@@ -646,11 +957,11 @@ class RightJoiner(Joiner):
                         for b in it_b:
                             yield dict(b)
                         return
-                    if _key_by(na, keys) == key_a:
+                    if key(na) == key_a:
                         continue
                     else:
                         a = na
-                        ka = _key_by(a, keys)
+                        ka = key(a)
                         break
 
             elif ka > kb:
@@ -661,75 +972,134 @@ class RightJoiner(Joiner):
                         nb = next(it_b)
                     except StopIteration:
                         return
-                    if _key_by(nb, keys) == key_b:
+                    if key(nb) == key_b:
                         yield dict(nb)
                     else:
                         b = nb
-                        kb = _key_by(b, keys)
+                        kb = key(b)
                         break
 
             else:
                 current_key = ka
 
-                group_b = [b]
-                while True:
-                    try:
-                        nb = next(it_b)
-                    except StopIteration:
-                        nb = None
-                        break
-                    if _key_by(nb, keys) == current_key:
-                        group_b.append(nb)
-                    else:
-                        break
-
-                while True:
-                    for bb in group_b:
-                        yield _merge_rows(keys, a, bb, self._a_suffix, self._b_suffix)
-
-                    try:
-                        na = next(it_a)
-                    except StopIteration:
-                        na = None
-                        break
-
-                    if _key_by(na, keys) == current_key:
-                        a = na
-                        continue
-                    else:
-                        a = na
-                        ka = _key_by(a, keys)
-                        break
+                with self._group_buffer() as group_b:
+                    group_b.append(b)
+                    while True:
+                        try:
+                            nb = next(it_b)
+                        except StopIteration:
+                            nb = None
+                            break
+                        if key(nb) == current_key:
+                            group_b.append(nb)
+                        else:
+                            break
+
+                    while True:
+                        for bb in group_b:
+                            yield _merge_rows(keys, a, bb, self._a_suffix, self._b_suffix)
+
+                        try:
+                            na = next(it_a)
+                        except StopIteration:
+                            na = None
+                            break
+
+                        if key(na) == current_key:
+                            a = na
+                            continue
+                        else:
+                            a = na
+                            ka = key(a)
+                            break
 
                 if nb is None:
                     return
 
                 b = nb
-                kb = _key_by(b, keys)
+                kb = key(b)
+
+
+class FilterJoiner(Joiner):
+    """Base of joiners keeping rows of ``a`` by whether their key occurs in ``b`` (``keep_matched``).
+
+    Rows of ``a`` come out as they are, neither merged with rows of ``b`` nor repeated for repeated keys of ``b``.
+    The merge walks both sorted streams holding a single row of each; :class:`hash_join.HashJoin` keeps a set of
+    the keys of ``b`` instead.
+    """
+
+    keeps_key_order = True
+    keep_matched: tp.ClassVar[bool]
+
+    def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:  # type: ignore[override]
+        key = key_getter(keys, self._normalize_keys)
+        keep_matched = self.keep_matched
+        it_b = iter(rows_b)
+        b = next(it_b, None)
+        kb = None if b is None else key(b)
+        for a in rows_a:
+            ka = key(a)
+            while b is not None and kb < ka:
+                b = next(it_b, None)
+                kb = None if b is None else key(b)
+            if (b is not None and kb == ka) == keep_matched:
+                yield a
+
+
+class SemiJoiner(FilterJoiner):
+    """Keep rows of ``a`` with a matching key in ``b``."""
+
+    keep_matched = True
+    keeps_unmatched = (False, False)
+
+
+class AntiJoiner(FilterJoiner):
+    """Keep rows of ``a`` without a matching key in ``b``."""
+
+    keep_matched = False
+    keeps_unmatched = (True, False)
+
 
 class ComputeColumn(Mapper):
     """
     Mapper which adds a new column by computing a function on the row.
     """
 
-    def __init__(self, new_column: str, func: tp.Callable[[TRow], tp.Any]):
+    def __init__(self, new_column: str, func: tp.Callable[..., tp.Any], params: tp.Sequence[str] = ()):
         """
         :param new_column: name of the new column to add
-        :param func: function that takes row and returns value
+        :param func: function that takes row (and ``params`` as keyword arguments) and returns value
+        :param params: names of scalar parameters (see :meth:`Graph.with_scalar`) passed to ``func``
         """
         self._new_column = new_column
         self._func = func
+        self._params = tuple(params)
+        self._values: dict[str, tp.Any] = {}
 
     def __call__(self, row: TRow) -> TRowsGenerator:
         new_row = dict(row)
-        new_row[self._new_column] = self._func(row)
+        new_row[self._new_column] = self._func(row, **self._values) if self._params else self._func(row)
         yield new_row
 
-class Average(Reducer):
+    def with_params(self, params: tp.Mapping[str, tp.Any]) -> 'ComputeColumn':
+        if not self._params:
+            return self
+        bound = ComputeColumn(self._new_column, self._func, self._params)
+        bound._values = {name: params[name] for name in self._params}
+        return bound
+
+    def preserved_order(self, order: tuple[str, ...]) -> tuple[str, ...]:
+        return order_prefix(order, {self._new_column})
+
+class Average(ScalarAggregator):
     """
     Computes average of a column grouped by key(s).
+
+    Missing and non-numeric values are skipped; the state is ``[group_columns, total, count]``.
     """
 
+    combinable = True
+
     def __init__(self, column: str, result_column: tp.Optional[str] = None):
         """
         :param column: column to average
@@ -738,31 +1108,74 @@ class Average(Reducer):
         self._column = column
         self._result_column = result_column or column
 
-    def __call__(
-        self, group_key: tuple[str, ...], rows: TRowsIterable
-    ) -> TRowsGenerator:
-        total: float = 0.0
-        count: int = 0
-        sample_row: tp.Optional[TRow] = None
-
-        for r in rows:
-            sample_row = sample_row or r
-            value = r.get(self._column)
-            if value is None:
-                continue
-            try:
-                total += float(value)
-                count += 1
-            except Exception:
-                continue
-
-        if count == 0 or sample_row is None:
-            return
-        avg = total / count
+    def init(self, group_key: tuple[str, ...], row: TRow) -> list[tp.Any]:
         out: TRow = {}
         for k in group_key:
-            if k in sample_row:
-                out[k] = sample_row[k]
+            if k in row:
+                out[k] = row[k]
+        return self.update([out, 0.0, 0], row)
+
+    def update(self, state: list[tp.Any], row: TRow) -> list[tp.Any]:
+        value = row.get(self._column)
+        if value is None:
+            return state
+        try:
+            state[1] += float(value)
+            state[2] += 1
+        except Exception:
+            pass
+        return state
+
+    def merge(self, state: list[tp.Any], other: list[tp.Any]) -> list[tp.Any]:
+        state[1] += other[1]
+        state[2] += other[2]
+        return state
 
-        out[self._result_column] = avg
-        yield out
+    def value(self, state: list[tp.Any]) -> float | None:
+        """Average of the numeric values, ``None`` if there were none."""
+        _, total, count = state
+        return total / count if count else None
+
+    def finalize(self, group_key: tuple[str, ...], state: list[tp.Any]) -> TRowsGenerator:
+        if state[2]:
+            yield from super().finalize(group_key, state)
+
+
+class Aggregate(Aggregator):
+    """Compute several scalar aggregates of every group in one pass: one row with a column per aggregate.
+
+    ``aggregates`` maps output columns to :class:`ScalarAggregator` instances (whose own result columns are
+    ignored), e.g. ``Aggregate({'n': Count(), 'total': Sum('x'), 'avg': Average('x')})``. The state is
+    ``[group_columns, states_of_aggregates]``; an average of a group without numeric values is ``None``.
+    """
+
+    def __init__(self, aggregates: tp.Mapping[str, ScalarAggregator]) -> None:
+        for column, aggregate in aggregates.items():
+            if not isinstance(aggregate, ScalarAggregator):
+                raise TypeError(f'aggregate of column {column!r} must be a ScalarAggregator, '
+                                f'got {type(aggregate).__name__}')
+        self._columns = tuple(aggregates)
+        self._aggregates = tuple(aggregates.values())
+        self.combinable = all(aggregate.combinable for aggregate in self._aggregates)
+
+    def init(self, group_key: tuple[str, ...], row: TRow) -> list[tp.Any]:
+        # parts do not need their own copies of the group key columns
+        return [_group_columns(row, group_key), [aggregate.init((), row) for aggregate in self._aggregates]]
+
+    def update(self, state: list[tp.Any], row: TRow) -> list[tp.Any]:
+        states = state[1]
+        for i, aggregate in enumerate(self._aggregates):
+            states[i] = aggregate.update(states[i], row)
+        return state
+
+    def merge(self, state: list[tp.Any], other: list[tp.Any]) -> list[tp.Any]:
+        states = state[1]
+        for i, (aggregate, other_state) in enumerate(zip(self._aggregates, other[1])):
+            states[i] = aggregate.merge(states[i], other_state)
+        return state
+
+    def finalize(self, group_key: tuple[str, ...], state: list[tp.Any]) -> TRowsGenerator:
+        new_row = dict(state[0])
+        for column, aggregate, part in zip(self._columns, self._aggregates, state[1]):
+            new_row[column] = aggregate.value(part)
+        yield new_row
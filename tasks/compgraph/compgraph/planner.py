@@ -0,0 +1,91 @@
+"""Run-time choice of physical join and aggregation strategies from samples of the inputs."""
+from __future__ import annotations
+
+import collections
+import itertools
+import typing as tp
+
+from .external_sort import DEFAULT_MEMORY_LIMIT, _take_budget, sort_rows
+from .hash_join import GraceHashJoin, HashJoin
+from .hash_reduce import HashReduce
+from .keys import key_getter
+from .operations import Aggregator, FilterJoiner, Joiner, Operation, Reduce, Reducer, TRowsGenerator, TRowsIterable
+
+DEFAULT_SAMPLE_ROWS = 10_000
+DEFAULT_SORT_RATIO = 0.9
+
+
+class AutoJoin(Operation):
+    """Join of unsorted streams picking the cheapest strategy for every run from the sizes of its inputs.
+
+    The first rows of ``b`` are buffered up to half of ``memory_limit`` bytes: if ``b`` ends within that, it is
+    joined as the build side of a :class:`hash_join.HashJoin`. Otherwise ``a`` is sampled the same way and becomes
+    the build side if it is small (joiners that allow it). When both are large, a :class:`hash_join.GraceHashJoin`
+    partitions them on disk. The buffered rows are replayed, so inputs are read once. ``choices`` counts the
+    strategies picked over runs (``'hash_b'``, ``'hash_a'`` and ``'grace'``).
+    """
+
+    def __init__(self, joiner: Joiner, keys: tp.Sequence[str], memory_limit: int = DEFAULT_MEMORY_LIMIT) -> None:
+        self._joiner = joiner
+        self._keys = tuple(keys)
+        self.memory_limit = memory_limit
+        self.choices: collections.Counter[str] = collections.Counter()
+        # fail at planning time for joiners without hash semantics
+        HashJoin(joiner, keys)
+
+    def __call__(self, rows_a: TRowsIterable, rows_b: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
+        sample_limit = self.memory_limit // 2
+        it_b = iter(rows_b)
+        head_b, small_b = _take_budget(it_b, sample_limit)
+        rows_b = itertools.chain(head_b, it_b)
+        if small_b:
+            choice, join_op = 'hash_b', HashJoin(self._joiner, self._keys, 'b')
+        else:
+            it_a = iter(rows_a)
+            head_a: list[tp.Any] = []
+            if not isinstance(self._joiner, FilterJoiner):
+                head_a, small_a = _take_budget(it_a, sample_limit)
+            else:
+                small_a = False
+            rows_a = itertools.chain(head_a, it_a)
+            if small_a:
+                choice, join_op = 'hash_a', HashJoin(self._joiner, self._keys, 'a')
+            else:
+                choice, join_op = 'grace', GraceHashJoin(self._joiner, self._keys, 'b', self.memory_limit)
+        self.choices[choice] += 1
+        yield from join_op(rows_a, rows_b)
+
+
+class AutoAggregate(Operation):
+    """Aggregation of unsorted rows picking between hashing and sorting from the key cardinality of a sample.
+
+    Aggregators always go to :class:`hash_reduce.HashReduce`, whose per-key states stay small. A plain reducer
+    needs the rows of its groups, so when more than ``sort_ratio`` of the first ``sample_rows`` rows have distinct
+    keys (rows hardly collapse) the hash table would hold the whole input in tiny groups; the rows are then sorted
+    with :func:`external_sort.sort_rows` and reduced as contiguous groups instead. ``choices`` counts the
+    strategies picked over runs (``'hash'`` and ``'sort'``).
+    """
+
+    def __init__(self, reducer: Reducer, keys: tp.Sequence[str], memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                 sample_rows: int = DEFAULT_SAMPLE_ROWS, sort_ratio: float = DEFAULT_SORT_RATIO) -> None:
+        self._reducer = reducer
+        self._keys = tuple(keys)
+        self.memory_limit = memory_limit
+        self.sample_rows = sample_rows
+        self.sort_ratio = sort_ratio
+        self.choices: collections.Counter[str] = collections.Counter()
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:  # type: ignore[override]
+        rows_iter = iter(rows)
+        choice = 'hash'
+        if not isinstance(self._reducer, Aggregator):
+            head = list(itertools.islice(rows_iter, self.sample_rows))
+            rows_iter = itertools.chain(head, rows_iter)
+            distinct = len(set(map(key_getter(self._keys), head)))
+            if len(head) == self.sample_rows and distinct > self.sort_ratio * len(head):
+                choice = 'sort'
+        self.choices[choice] += 1
+        if choice == 'sort':
+            yield from Reduce(self._reducer, self._keys)(sort_rows(rows_iter, self._keys, self.memory_limit))
+        else:
+            yield from HashReduce(self._reducer, self._keys, self.memory_limit)(rows_iter)
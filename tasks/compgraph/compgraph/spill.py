@@ -0,0 +1,378 @@
+"""Compact on-disk format for intermediate rows (sorted runs, spilled groups and partitions).
+
+A row file is a sequence of independent blocks. Every block starts with a small header (codec, value encoding,
+row count and payload size) followed by the payload. Inside a payload the column names of the block's rows are
+stored once per distinct schema, and every row is reduced to a schema index plus a flat run of values, so the
+repeated column names of pickled dicts are not paid for each row. Values are packed with :mod:`marshal` when
+they are all plain builtins, blocks with anything else fall back to :mod:`pickle` (note that marshal turns a
+``bytearray`` nested in a list or dict into ``bytes``). Payloads may be compressed with zlib or lzma.
+
+Readers map the file into memory and decode one block at a time, building row dicts lazily as they are
+consumed; pages of blocks already read are handed back to the OS.
+"""
+from __future__ import annotations
+
+import itertools
+import lzma
+import marshal
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import typing as tp
+import weakref
+import zlib
+
+TRow = dict[str, tp.Any]
+TRowsGenerator = tp.Generator[TRow, None, None]
+
+DEFAULT_BLOCK_ROWS = 1024
+DEFAULT_BUFFER_LIMIT = 16 * 1024 * 1024
+CODECS = ('none', 'zlib', 'lzma')
+
+_BLOCK_HEADER = struct.Struct('<BBII')
+_MARSHAL, _PICKLE = 0, 1
+_MARSHAL_TYPES = frozenset({type(None), bool, int, float, str, bytes, tuple, list, dict})
+_RELEASE_BYTES = 4 * 1024 * 1024
+
+_compress: dict[int, tp.Callable[[bytes], bytes]] = {
+    0: lambda data: data,
+    1: lambda data: zlib.compress(data, 1),
+    2: lzma.compress,
+}
+_decompress: dict[int, tp.Callable[[bytes], bytes]] = {
+    0: lambda data: data,
+    1: zlib.decompress,
+    2: lzma.decompress,
+}
+
+
+def approx_row_size(row: TRow) -> int:
+    """Cheap estimate of memory held by ``row`` (the dict itself plus its values)."""
+    return sys.getsizeof(row) + sum(map(sys.getsizeof, row.values()))
+
+
+def _codec_id(codec: str) -> int:
+    try:
+        return CODECS.index(codec)
+    except ValueError:
+        raise ValueError(f'unknown codec {codec!r}, expected one of {CODECS}') from None
+
+
+def encode_block(rows: tp.Sequence[TRow], codec: str = 'none') -> bytes:
+    """Serialize ``rows`` into a single framed block."""
+    schema_ids: dict[tuple[str, ...], int] = {}
+    row_schemas: list[int] = []
+    values: list[tp.Any] = []
+    marshal_safe = True
+    for row in rows:
+        schema = tuple(row)
+        schema_id = schema_ids.get(schema)
+        if schema_id is None:
+            schema_id = schema_ids[schema] = len(schema_ids)
+        row_schemas.append(schema_id)
+        row_values = row.values()
+        if marshal_safe and not _MARSHAL_TYPES.issuperset(map(type, row_values)):
+            marshal_safe = False
+        values.extend(row_values)
+
+    payload_obj = (tuple(schema_ids), row_schemas, values)
+    encoding = _MARSHAL
+    try:
+        if not marshal_safe:
+            raise ValueError
+        payload = marshal.dumps(payload_obj)
+    except ValueError:  # nested unsupported values
+        encoding = _PICKLE
+        payload = pickle.dumps(payload_obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    codec_id = _codec_id(codec)
+    payload = _compress[codec_id](payload)
+    return _BLOCK_HEADER.pack(codec_id, encoding, len(row_schemas), len(payload)) + payload
+
+
+def _decode_payload(codec_id: int, encoding: int, payload: bytes) -> TRowsGenerator:
+    data = _decompress[codec_id](payload)
+    schemas, row_schemas, values = marshal.loads(data) if encoding == _MARSHAL else pickle.loads(data)
+    position = 0
+    for schema_id in row_schemas:
+        schema = schemas[schema_id]
+        end = position + len(schema)
+        yield dict(zip(schema, values[position:end]))
+        position = end
+
+
+def decode_block(block: bytes) -> TRowsGenerator:
+    """Lazily decode rows of a block produced by :func:`encode_block`."""
+    codec_id, encoding, _, size = _BLOCK_HEADER.unpack_from(block)
+    return _decode_payload(codec_id, encoding, block[_BLOCK_HEADER.size:_BLOCK_HEADER.size + size])
+
+
+class RowWriter:
+    """Append rows to a binary file object as blocks of ``block_rows`` rows."""
+
+    def __init__(self, file: tp.BinaryIO, codec: str = 'none', block_rows: int = DEFAULT_BLOCK_ROWS) -> None:
+        _codec_id(codec)
+        self._file = file
+        self._codec = codec
+        self._block_rows = block_rows
+        self._rows: list[TRow] = []
+
+    def write(self, row: TRow) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= self._block_rows:
+            self.flush()
+
+    def write_all(self, rows: tp.Iterable[TRow]) -> None:
+        for row in rows:
+            self.write(row)
+
+    def flush(self) -> None:
+        """Write buffered rows as a (possibly short) block."""
+        if self._rows:
+            self._file.write(encode_block(self._rows, self._codec))
+            self._rows = []
+        self._file.flush()
+
+
+def write_rows(path: str, rows: tp.Iterable[TRow], codec: str = 'none', block_rows: int = DEFAULT_BLOCK_ROWS) -> None:
+    """Write ``rows`` into a new row file at ``path``."""
+    with open(path, 'wb') as f:
+        writer = RowWriter(f, codec, block_rows)
+        writer.write_all(rows)
+        writer.flush()
+
+
+def read_rows(path: str, start: int = 0, end: int | None = None) -> TRowsGenerator:
+    """Stream rows of a row file, mapping it into memory and decoding blocks as they are reached.
+
+    Only the blocks between byte offsets ``start`` and ``end`` (the end of the file by default) are read.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= start:
+            return
+        # the mapping stays valid without the file object, which would hold a second descriptor
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with mapped:
+        if end is None:
+            end = len(mapped)
+        offset = start
+        released = start // mmap.PAGESIZE * mmap.PAGESIZE
+        while offset < end:
+            codec_id, encoding, _, size = _BLOCK_HEADER.unpack_from(mapped, offset)
+            start = offset + _BLOCK_HEADER.size
+            offset = start + size
+            yield from _decode_payload(codec_id, encoding, mapped[start:offset])
+            if hasattr(mmap, 'MADV_DONTNEED') and offset - released >= _RELEASE_BYTES:
+                # drop already decoded pages from the resident set
+                length = (offset - released) // mmap.PAGESIZE * mmap.PAGESIZE
+                mapped.madvise(mmap.MADV_DONTNEED, released, length)
+                released += length
+
+
+class SpillFile:
+    """Temporary row file: rows are appended once and can then be replayed any number of times.
+
+    The file is removed by :meth:`close` (or when used as a context manager).
+    """
+
+    def __init__(self, codec: str = 'none', block_rows: int = DEFAULT_BLOCK_ROWS,
+                 directory: str | None = None) -> None:
+        fd, self.path = tempfile.mkstemp(prefix='compgraph-spill-', suffix='.rows', dir=directory)
+        self._file = os.fdopen(fd, 'wb')
+        self._writer = RowWriter(self._file, codec, block_rows)
+        self._count = 0
+
+    def write(self, row: TRow) -> None:
+        self._writer.write(row)
+        self._count += 1
+
+    def write_all(self, rows: tp.Iterable[TRow]) -> None:
+        for row in rows:
+            self.write(row)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> TRowsGenerator:
+        return self.read()
+
+    def tell(self) -> int:
+        """Write out buffered rows and return the size of the file, the offset of the rows written next."""
+        self._writer.flush()
+        return self._file.tell()
+
+    def read(self, start: int = 0, end: int | None = None) -> TRowsGenerator:
+        """Replay rows written between offsets ``start`` and ``end`` returned by :meth:`tell` (all rows by default)."""
+        self._writer.flush()
+        return read_rows(self.path, start, end)
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+            os.unlink(self.path)
+
+    def __enter__(self) -> SpillFile:
+        return self
+
+    def __exit__(self, *exc_info: tp.Any) -> None:
+        self.close()
+
+
+class SpillBuffer:
+    """Replayable buffer of rows held in memory up to about ``memory_limit`` bytes and in a :class:`SpillFile` beyond.
+
+    Rows are replayed in the order they were appended, any number of times; replayed rows that come from the file
+    are fresh dicts. The file, if any, is removed by :meth:`close` (or when used as a context manager).
+    """
+
+    def __init__(self, memory_limit: int = DEFAULT_BUFFER_LIMIT, codec: str = 'none') -> None:
+        self.memory_limit = memory_limit
+        self.codec = codec
+        self._rows: list[TRow] = []
+        self._size = 0
+        self._spilled: SpillFile | None = None
+
+    def append(self, row: TRow) -> None:
+        if self._spilled is not None:
+            self._spilled.write(row)
+            return
+        self._rows.append(row)
+        self._size += approx_row_size(row)
+        if self._size >= self.memory_limit:
+            self._spilled = SpillFile(self.codec)
+
+    @property
+    def spilled(self) -> bool:
+        """Whether rows went past the memory budget into a temporary file."""
+        return self._spilled is not None
+
+    def __len__(self) -> int:
+        return len(self._rows) + (0 if self._spilled is None else len(self._spilled))
+
+    def __iter__(self) -> tp.Iterator[TRow]:
+        if self._spilled is None or not len(self._spilled):
+            return iter(self._rows)
+        return itertools.chain(self._rows, self._spilled)
+
+    def close(self) -> None:
+        if self._spilled is not None:
+            self._spilled.close()
+            self._spilled = None
+        self._rows = []
+        self._size = 0
+
+    def __enter__(self) -> SpillBuffer:
+        return self
+
+    def __exit__(self, *exc_info: tp.Any) -> None:
+        self.close()
+
+
+class SpillTee:
+    """Fan the rows of one stream out to ``consumers`` readers going at their own pace, reading the stream once.
+
+    The stream made by ``rows`` is started by the first read and pulled in chunks of ``chunk_rows`` rows. A chunk
+    is kept until every reader has passed it: in memory while the kept chunks take up to about ``memory_limit``
+    bytes, appended to a single :class:`SpillFile` compressed with ``codec`` beyond that (so a tee holds at most one
+    open file however many chunks it spills). Every reader gets rows of its own (copies of the rows kept in memory,
+    fresh dicts from the file), so a reader changing them in place does not affect the others. The file is removed
+    once every reader is done (finished or closed), by :meth:`close` or when the tee is garbage collected; it does
+    not shrink as spilled chunks are passed.
+    """
+
+    def __init__(self, rows: tp.Callable[[], tp.Iterable[TRow]], consumers: int,
+                 memory_limit: int = DEFAULT_BUFFER_LIMIT, codec: str = 'none',
+                 chunk_rows: int = DEFAULT_BLOCK_ROWS) -> None:
+        self.memory_limit = memory_limit
+        self.codec = codec
+        self._chunk_rows = chunk_rows
+        self._source = rows
+        self._rows: tp.Iterator[TRow] | None = None
+        # chunks pulled so far (rows in memory or offsets of rows in the spill file), ``None`` once every reader has
+        # passed them, and bytes of those held in memory
+        self._chunks: list[list[TRow] | tuple[int, int] | None] = []
+        self._sizes: list[int] = []
+        self._memory_size = 0
+        self._released = 0
+        self._spill: SpillFile | None = None
+        # index of the chunk every reader is at; readers not yet created are at the start
+        self._positions = [0] * consumers
+        self._readers = 0
+
+    def reader(self) -> TRowsGenerator:
+        """Create the next of the ``consumers`` readers, each replaying all rows of the stream."""
+        if self._readers == len(self._positions):
+            raise ValueError(f'all {len(self._positions)} readers of the tee are already created')
+        self._readers += 1
+        return self._read(self._readers - 1)
+
+    @property
+    def spilled(self) -> bool:
+        """Whether some chunks went past the memory budget into the temporary file."""
+        return self._spill is not None
+
+    def _read(self, reader: int) -> TRowsGenerator:
+        position = 0
+        try:
+            while position < len(self._chunks) or self._pull():
+                chunk = self._chunks[position]
+                assert chunk is not None
+                if isinstance(chunk, list):
+                    yield from map(dict, chunk)
+                else:
+                    assert self._spill is not None
+                    yield from self._spill.read(*chunk)
+                position += 1
+                self._advance(reader, position)
+        finally:
+            self._advance(reader, sys.maxsize)
+
+    def _pull(self) -> bool:
+        if self._rows is None:
+            self._rows = iter(self._source())
+        rows = list(itertools.islice(self._rows, self._chunk_rows))
+        if not rows:
+            return False
+        size = sum(map(approx_row_size, rows))
+        if self._memory_size + size > self.memory_limit:
+            if self._spill is None:
+                self._spill = SpillFile(self.codec)
+                weakref.finalize(self, self._spill.close)
+            start = self._spill.tell()
+            self._spill.write_all(rows)
+            self._chunks.append((start, self._spill.tell()))
+            self._sizes.append(0)
+        else:
+            self._chunks.append(rows)
+            self._sizes.append(size)
+            self._memory_size += size
+        return True
+
+    def _advance(self, reader: int, position: int) -> None:
+        self._positions[reader] = position
+        passed = min(self._positions)
+        if passed == sys.maxsize:
+            self.close()
+            return
+        for index in range(self._released, min(passed, len(self._chunks))):
+            self._release(index)
+        self._released = max(self._released, passed)
+
+    def _release(self, index: int) -> None:
+        self._chunks[index] = None
+        self._memory_size -= self._sizes[index]
+        self._sizes[index] = 0
+
+    def close(self) -> None:
+        """Drop all kept rows and stop the stream."""
+        for index in range(self._released, len(self._chunks)):
+            self._release(index)
+        self._released = len(self._chunks)
+        if self._spill is not None:
+            self._spill.close()
+        close_rows = getattr(self._rows, 'close', None)
+        if close_rows is not None:
+            close_rows()
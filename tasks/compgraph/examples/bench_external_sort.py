@@ -0,0 +1,54 @@
+"""Measure ExternalSort throughput with per-row and batched cross-process transport."""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+import typing as tp
+
+from compgraph.external_sort import DEFAULT_BATCH_BYTES, DEFAULT_PREFETCH, ExternalSort
+
+
+def generate_rows(count: int, seed: int = 0) -> tp.Iterator[dict]:
+    """Yield word-count-like rows: a short random token and a document id."""
+
+    rnd = random.Random(seed)
+    for i in range(count):
+        yield {"doc_id": i // 100, "text": "".join(rnd.choices("abcdefgh", k=6))}
+
+
+def measure(sort: ExternalSort, rows: int) -> float:
+    """Return rows per second for sorting ``rows`` generated rows with ``sort``."""
+
+    started = time.perf_counter()
+    consumed = sum(1 for _ in sort(generate_rows(rows)))
+    elapsed = time.perf_counter() - started
+    assert consumed == rows
+    return rows / elapsed
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="How many rows to push through the sort")
+    parser.add_argument(
+        "--batch-bytes",
+        type=int,
+        default=DEFAULT_BATCH_BYTES,
+        help="Target pickled size of a batch for the batched transport",
+    )
+    args = parser.parse_args(argv)
+
+    # in_memory_rows=0 forces every run through the worker process, so the transport is always measured
+    transports = [
+        ("per-row", ExternalSort(("text",), batch_bytes=0, prefetch=0, in_memory_rows=0)),
+        ("batched", ExternalSort(("text",), batch_bytes=args.batch_bytes, prefetch=DEFAULT_PREFETCH,
+                                 in_memory_rows=0)),
+    ]
+    results = {name: measure(sort, args.rows) for name, sort in transports}
+    for name, rate in results.items():
+        print(f"{name:>8}: {rate:,.0f} rows/s")
+    print(f" speedup: {results['batched'] / results['per-row']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import typing as tp
+
+import pytest
+
+
+@pytest.fixture
+def limit_open_files() -> tp.Iterator[tp.Callable[[int], None]]:
+    """Lower the soft limit of open files to the descriptors open now plus ``extra``; restored after the test."""
+    resource = pytest.importorskip("resource")
+    if not os.path.isdir("/proc/self/fd"):
+        pytest.skip("open descriptors are not listed in /proc")
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+    def limit(extra: int) -> None:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (len(os.listdir("/proc/self/fd")) + extra, hard))
+
+    yield limit
+    resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+
+@pytest.fixture
+def canonical() -> tp.Callable[[tp.Iterable[dict[str, tp.Any]]], list[tuple[tuple[str, tp.Any], ...]]]:
+    """Rows as a sorted list of sorted item tuples, to compare outputs that come in no particular order."""
+
+    def canonize(rows: tp.Iterable[dict[str, tp.Any]]) -> list[tuple[tuple[str, tp.Any], ...]]:
+        return sorted(tuple(sorted(row.items())) for row in rows)
+
+    return canonize
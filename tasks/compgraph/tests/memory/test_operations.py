@@ -81,7 +81,8 @@ def test_heavy_reduce(func_reducer: ops.Reducer, additional_memory: int, baselin
 @pytest.mark.parametrize('func_joiner, additional_memory', [
     (ops.InnerJoiner(), 100 * MiB),
     (ops.LeftJoiner(), 100 * MiB),
-    (ops.RightJoiner(), 100 * MiB)
+    (ops.RightJoiner(), 100 * MiB),
+    (ops.OuterJoiner(), 100 * MiB)
 ])
 def test_heavy_join(func_joiner: ops.Joiner, additional_memory: int, baseline_memory: int) -> None:
     op = ops.Join(func_joiner, ('key', ))(get_reduce_data(), get_reduce_data())
@@ -96,7 +97,8 @@ def get_complexity_join_data() -> tp.Generator[dict[str, tp.Any], None, None]:
 @pytest.mark.parametrize('func_joiner', [
     ops.InnerJoiner(),
     ops.LeftJoiner(),
-    ops.RightJoiner()
+    ops.RightJoiner(),
+    ops.OuterJoiner()
 ])
 def test_complexity_join(func_joiner: ops.Joiner) -> None:
     list(ops.Join(func_joiner, ('key', ))(get_complexity_join_data(), get_complexity_join_data()))
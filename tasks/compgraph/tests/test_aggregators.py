@@ -0,0 +1,95 @@
+import random
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, operations
+
+KEYS = ("g",)
+
+
+def _rows(count: int, seed: int = 0) -> tp.List[dict]:
+    rnd = random.Random(seed)
+    return [
+        {"g": 1, "word": rnd.choice("abcd"), "v": rnd.randrange(5), "count": 1, "seq": i}
+        for i in range(count)
+    ]
+
+
+AGGREGATORS = [
+    operations.Count("n"),
+    operations.Sum("v"),
+    operations.Average("v", "avg"),
+    operations.TopN("v", 4),
+    operations.TermFrequency("word"),
+    operations.FirstReducer(),
+    operations.Aggregate({"n": operations.Count(), "total": operations.Sum("v"), "avg": operations.Average("v")}),
+]
+
+
+def _fold(aggregator: operations.Aggregator, rows: tp.List[dict]) -> tp.Any:
+    state = aggregator.init(KEYS, rows[0])
+    for row in rows[1:]:
+        state = aggregator.update(state, row)
+    return state
+
+
+@pytest.mark.parametrize("aggregator", AGGREGATORS, ids=lambda aggregator: type(aggregator).__name__)
+@pytest.mark.parametrize("parts", [2, 5])
+def test_merged_partial_states_match_whole_group(aggregator: operations.Aggregator, parts: int):
+    rows = _rows(100, seed=parts)
+    expected = list(aggregator(KEYS, iter(rows)))
+    bounds = sorted(random.Random(parts).sample(range(1, len(rows)), parts - 1))
+    chunks = [rows[start:end] for start, end in zip([0] + bounds, bounds + [len(rows)])]
+    state = _fold(aggregator, chunks[0])
+    for chunk in chunks[1:]:
+        state = aggregator.merge(state, _fold(aggregator, chunk))
+    assert list(aggregator.finalize(KEYS, state)) == expected
+
+
+@pytest.mark.parametrize("aggregator", AGGREGATORS, ids=lambda aggregator: type(aggregator).__name__)
+def test_adapter_matches_reduce_output(aggregator: operations.Aggregator):
+    rows = sorted(_rows(60, seed=7) + [dict(row, g=2) for row in _rows(30, seed=8)], key=itemgetter("g"))
+    result = list(operations.Reduce(aggregator, ["g"])(iter(rows)))
+    by_group = [list(aggregator.finalize(KEYS, _fold(aggregator, [r for r in rows if r["g"] == g]))) for g in (1, 2)]
+    assert result == by_group[0] + by_group[1]
+
+
+def test_topn_keeps_earliest_rows_on_ties():
+    rows = [{"g": 1, "v": 1, "i": i} for i in range(6)]
+    aggregator = operations.TopN("v", 3)
+    state = aggregator.merge(_fold(aggregator, rows[:2]), _fold(aggregator, rows[2:]))
+    assert [row["i"] for row in aggregator.finalize(KEYS, state)] == [0, 1, 2]
+    assert [row["i"] for row in aggregator(KEYS, iter(rows))] == [0, 1, 2]
+
+
+def test_average_without_numeric_values_yields_nothing():
+    aggregator = operations.Average("v")
+    state = _fold(aggregator, [{"g": 1, "v": None}, {"g": 1, "v": "x"}])
+    assert list(aggregator.finalize(KEYS, state)) == []
+
+
+def test_aggregate_computes_all_columns_in_one_row():
+    rows = [{"g": 1, "v": 2, "x": None}, {"g": 1, "v": 4, "x": None}]
+    aggregator = operations.Aggregate({
+        "n": operations.Count(), "total": operations.Sum("v"), "avg": operations.Average("v"),
+        "avg_x": operations.Average("x"),
+    })
+    assert list(aggregator(KEYS, iter(rows))) == [{"g": 1, "n": 2, "total": 6, "avg": 3.0, "avg_x": None}]
+    assert aggregator.combinable
+
+
+def test_aggregate_rejects_non_scalar_parts():
+    with pytest.raises(TypeError):
+        operations.Aggregate({"top": operations.TopN("v", 3)})  # type: ignore[dict-item]
+
+
+def test_aggregate_in_graph_aggregate_and_combined_reduce():
+    rows = [{"g": i % 3, "v": i} for i in range(30)]
+    aggregator = operations.Aggregate({"n": operations.Count(), "total": operations.Sum("v")})
+    expected = [{"g": g, "n": 10, "total": sum(range(g, 30, 3))} for g in range(3)]
+    hashed = Graph.graph_from_iter("rows").aggregate(aggregator, ["g"], memory_limit=64)
+    assert sorted(hashed.run(rows=lambda: iter(rows)), key=itemgetter("g")) == expected
+    combined = Graph.graph_from_iter("rows").sort(["g"]).reduce(aggregator, ["g"])
+    assert list(combined.run(rows=lambda: iter(rows))) == expected
@@ -0,0 +1,53 @@
+import pytest
+
+from compgraph import Graph, operations
+from compgraph.annotate import Annotate
+
+
+ROWS = [
+    {"doc": 1, "word": "a", "n": 2},
+    {"doc": 1, "word": "b", "n": 3},
+    {"doc": 2, "word": "a", "n": 5},
+    {"doc": 3, "word": "c", "n": 1},
+    {"doc": 3, "word": "d", "n": 1},
+]
+
+
+def test_scalar_aggregate_is_attached_to_every_row():
+    result = list(Annotate(operations.Sum("n"), ["doc"])(iter(ROWS)))
+    assert [row["n"] for row in result] == [5, 5, 5, 2, 2]
+    assert [row["word"] for row in result] == ["a", "b", "a", "c", "d"]
+
+
+def test_composite_aggregate_adds_columns_without_keys():
+    aggregator = operations.Aggregate({"total": operations.Sum("n"), "words": operations.Count()})
+    result = list(Annotate(aggregator, ["doc"])(iter(ROWS)))
+    assert result[0] == {"doc": 1, "word": "a", "n": 2, "total": 5, "words": 2}
+    assert result[2] == {"doc": 2, "word": "a", "n": 5, "total": 5, "words": 1}
+
+
+def test_average_without_values_is_none():
+    rows = [{"doc": 1, "x": None}, {"doc": 1, "x": "?"}]
+    result = list(Annotate(operations.Average("x", "avg"), ["doc"])(iter(rows)))
+    assert [row["avg"] for row in result] == [None, None]
+
+
+def test_multi_row_aggregators_are_rejected():
+    with pytest.raises(ValueError):
+        list(Annotate(operations.TopN("n", 2), ["doc"])(iter(ROWS)))
+
+
+def test_large_group_spills_and_keeps_order():
+    rows = [{"doc": 1, "i": i, "text": "x" * 20} for i in range(500)] + [{"doc": 2, "i": 500, "text": ""}]
+    result = list(Annotate(operations.Count("size"), ["doc"], memory_limit=1024)(iter(rows)))
+    assert [row["i"] for row in result] == list(range(501))
+    assert {row["size"] for row in result[:500]} == {500}
+    assert result[-1]["size"] == 1
+
+
+def test_graph_annotate_keeps_key_order():
+    graph = Graph.graph_from_iter("rows").sort(["doc", "word"]) \
+        .annotate(operations.Aggregate({"total": operations.Sum("n")}), ["doc"])
+    assert graph.order == ("doc",)
+    result = list(graph.run(rows=lambda: iter(reversed(ROWS))))
+    assert result == [dict(row, total=total) for row, total in zip(ROWS, [5, 5, 5, 2, 2])]
@@ -0,0 +1,91 @@
+import random
+import typing as tp
+
+import pytest
+
+from compgraph import Graph, graph as graph_module, operations
+from compgraph.bloom import BloomFilter, BloomPrefilter
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(("w", i))
+    assert all(("w", i) in bloom for i in range(1000))
+    false_positives = sum(("w", i) in bloom for i in range(1000, 21000))
+    assert false_positives < 20000 * 0.03
+    with pytest.raises(ValueError):
+        BloomFilter(10, 1.5)
+
+
+DOCS = [{"word": f"w{i % 500}", "doc": i} for i in range(2000)]
+VOCAB = [{"word": f"w{i}", "weight": i} for i in range(0, 500, 25)]
+
+
+def _graphs() -> tp.Tuple[Graph, Graph]:
+    docs = Graph.graph_from_iter("docs").sort(["word"])
+    vocab = Graph.graph_from_iter("vocab").sort(["word"])
+    return docs, vocab
+
+
+def _run(graph: Graph) -> tp.List[operations.TRow]:
+    return sorted(graph.run(docs=lambda: iter(DOCS), vocab=lambda: iter(VOCAB)), key=lambda row: row["doc"])
+
+
+@pytest.mark.parametrize("joiner_cls, side", [
+    (operations.InnerJoiner, "b"),
+    (operations.LeftJoiner, "a"),
+    (operations.RightJoiner, "b"),
+])
+def test_prefiltered_join_gives_same_result_and_counts_pruned_rows(joiner_cls: tp.Type[operations.Joiner],
+                                                                   side: str):
+    docs, vocab = _graphs()
+    a, b = (docs, vocab) if side == "b" else (vocab, docs)
+    prefilter = BloomPrefilter(side, false_positive_rate=0.001)
+    expected = _run(a.join(joiner_cls(), b, ["word"]))
+    assert _run(a.join(joiner_cls(), b, ["word"], prefilter=prefilter)) == expected
+    assert prefilter.checked == 2000
+    assert prefilter.pruned >= 1900 - 10
+    assert prefilter.pruned_fraction == prefilter.pruned / 2000
+
+
+def test_prefilter_runs_before_the_sort(monkeypatch: pytest.MonkeyPatch):
+    sorted_rows: tp.List[int] = []
+
+    class CountingSort(graph_module.ExternalSort):
+        def __call__(self, rows: operations.TRowsIterable, *args: tp.Any,
+                     **kwargs: tp.Any) -> operations.TRowsGenerator:
+            rows = list(rows)
+            sorted_rows.append(len(rows))
+            yield from super().__call__(iter(rows), *args, **kwargs)
+
+    monkeypatch.setattr(graph_module, "ExternalSort", CountingSort)
+    docs, vocab = _graphs()
+    prefilter = BloomPrefilter(false_positive_rate=0.001)
+    graph = docs.join(operations.InnerJoiner(), vocab, ["word"], prefilter=prefilter)
+    assert graph.order == ("word",)
+    assert len(_run(graph)) == 80
+    assert sorted(sorted_rows) == [20, prefilter.passed]
+    assert prefilter.passed < 100
+
+
+def test_prefilter_rejects_joins_keeping_unmatched_filtered_rows():
+    docs, vocab = _graphs()
+    with pytest.raises(ValueError):
+        docs.join(operations.LeftJoiner(), vocab, ["word"], prefilter=BloomPrefilter("b"))
+    with pytest.raises(ValueError):
+        docs.join(operations.OuterJoiner(), vocab, ["word"], prefilter=BloomPrefilter("a"))
+    with pytest.raises(ValueError):
+        BloomPrefilter("c")
+
+
+def test_prefilter_with_hash_join_of_unsorted_graphs():
+    rows_a = [{"k": random.Random(0).randrange(100), "i": i} for i in range(300)]
+    rows_b = [{"k": k, "v": k * 2} for k in range(0, 100, 10)]
+    a, b = Graph.graph_from_iter("a"), Graph.graph_from_iter("b")
+    prefilter = BloomPrefilter()
+    graph = a.join(operations.InnerJoiner(), b, ["k"], strategy="hash", prefilter=prefilter)
+    expected = a.join(operations.InnerJoiner(), b, ["k"], strategy="hash")
+    sources = {"a": lambda: iter(rows_a), "b": lambda: iter(rows_b)}
+    assert list(graph.run(**sources)) == list(expected.run(**sources))
+    assert prefilter.checked == 300
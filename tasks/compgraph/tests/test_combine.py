@@ -0,0 +1,112 @@
+import random
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, algorithms, graph as graph_module, operations
+from compgraph.hash_reduce import PARTIAL_COLUMN, Combine, MergePartials
+
+
+def _words(count: int, vocabulary: int, seed: int = 0) -> tp.List[dict]:
+    rnd = random.Random(seed)
+    return [{"text": f"w{rnd.randrange(vocabulary)}", "v": i % 7} for i in range(count)]
+
+
+def test_combine_collapses_rows_into_partial_states():
+    rows = _words(1000, vocabulary=10)
+    partials = list(Combine(operations.Count("n"), ["text"])(iter(rows)))
+    assert len(partials) == 10
+    assert all(set(row) == {"text", PARTIAL_COLUMN} for row in partials)
+    assert sum(row[PARTIAL_COLUMN][1] for row in partials) == 1000
+
+
+def test_combine_flushes_bounded_table_and_passes_through_unique_rows():
+    rows = [{"text": f"w{i}"} for i in range(100)]
+    combined = list(Combine(operations.Count("n"), ["text"], max_groups=10)(iter(rows)))
+    assert sum(PARTIAL_COLUMN in row for row in combined) == 10
+    assert combined[10:] == rows[10:]
+
+
+@pytest.mark.parametrize("aggregator", [operations.Count("n"), operations.Sum("v"), operations.Average("v", "avg"),
+                                        operations.TopN("v", 2), operations.FirstReducer()],
+                         ids=lambda aggregator: type(aggregator).__name__)
+@pytest.mark.parametrize("max_groups", [3, 50])
+def test_merge_partials_matches_plain_reduce(aggregator: operations.Aggregator, max_groups: int):
+    rows = _words(400, vocabulary=20, seed=max_groups)
+    expected = list(operations.Reduce(aggregator, ["text"])(sorted(rows, key=itemgetter("text"))))
+    combined = Combine(aggregator, ["text"], max_groups=max_groups)(iter(rows))
+    merged = operations.Reduce(MergePartials(aggregator), ["text"])(sorted(combined, key=itemgetter("text")))
+    assert list(merged) == expected
+
+
+def test_graph_combine_then_reduce_and_aggregate():
+    rows = _words(300, vocabulary=15, seed=1)
+    expected = list(Graph.graph_from_iter("rows").sort(["text"]).reduce(operations.Sum("v"), ["text"])
+                    .run(rows=lambda: iter(rows)))
+    combined = Graph.graph_from_iter("rows").combine(operations.Sum("v"), ["text"], max_groups=4)
+    reduced = combined.sort(["text"]).reduce(operations.Sum("v"), ["text"])
+    assert list(reduced.run(rows=lambda: iter(rows))) == expected
+    aggregated = combined.aggregate(operations.Sum("v"), ["text"])
+    assert sorted(aggregated.run(rows=lambda: iter(rows)), key=itemgetter("text")) == expected
+
+
+def test_reducing_partials_with_other_aggregator_or_keys_is_rejected():
+    combined = Graph.graph_from_iter("rows").combine(operations.Count("n"), ["text"]).sort(["text"])
+    with pytest.raises(ValueError):
+        combined.reduce(operations.Sum("n"), ["text"])
+    with pytest.raises(ValueError):
+        combined.reduce(operations.Count("n"), ["v"])
+
+
+def test_reducing_partials_with_aggregator_of_other_columns_is_rejected():
+    combined = Graph.graph_from_iter("rows").combine(operations.Sum("v"), ["text"]).sort(["text"])
+    with pytest.raises(ValueError):
+        combined.reduce(operations.Sum("w"), ["text"])
+    with pytest.raises(ValueError):
+        combined.aggregate(operations.Sum("w"), ["text"])
+    assert operations.Sum("v") == operations.Sum("v") != operations.Count("v")
+    assert operations.Aggregate({"s": operations.Sum("v")}) == operations.Aggregate({"s": operations.Sum("v")})
+
+
+def test_steps_reading_partials_as_rows_are_rejected():
+    combined = Graph.graph_from_iter("rows").combine(operations.Count("n"), ["text"])
+    other = Graph.graph_from_iter("other").sort(["text"])
+    with pytest.raises(ValueError):
+        combined.map(operations.DummyMapper())
+    with pytest.raises(ValueError):
+        combined.sort(["text"]).limit(3)
+    with pytest.raises(ValueError):
+        combined.sort(["text"]).join(operations.InnerJoiner(), other, ["text"])
+    with pytest.raises(ValueError):
+        other.join(operations.InnerJoiner(), combined.sort(["text"]), ["text"])
+    with pytest.raises(ValueError):
+        combined.annotate(operations.Count("m"), ["text"])
+
+
+def test_sort_then_reduce_by_same_keys_gets_combiner(monkeypatch: pytest.MonkeyPatch):
+    sorted_rows: tp.List[int] = []
+
+    class CountingSort(graph_module.ExternalSort):
+        def __call__(self, rows: operations.TRowsIterable, *args: tp.Any,
+                     **kwargs: tp.Any) -> operations.TRowsGenerator:
+            rows = list(rows)
+            sorted_rows.append(len(rows))
+            yield from super().__call__(rows, *args, **kwargs)
+
+    monkeypatch.setattr(graph_module, "ExternalSort", CountingSort)
+    docs = [{"doc_id": i, "text": "the cat and the dog and the bird"} for i in range(50)]
+    result = list(algorithms.word_count_graph("docs").run(docs=lambda: iter(docs)))
+    assert result[-1] == {"text": "the", "count": 150}
+    # tokens collapse into one partial row per word before the first sort
+    assert sorted_rows[0] == 5
+
+
+def test_non_combinable_reducer_is_not_rewritten(monkeypatch: pytest.MonkeyPatch):
+    def forbidden(*args: tp.Any, **kwargs: tp.Any) -> None:
+        raise AssertionError("combiner inserted")
+
+    monkeypatch.setattr(graph_module, "Combine", forbidden)
+    graph = Graph.graph_from_iter("rows").sort(["text"])
+    graph.reduce(operations.TopN("v", 1), ["text"])
+    graph.reduce(operations.Count("n"), ["text", "v"])
@@ -8,7 +8,7 @@ from pathlib import Path
 
 import pytest
 
-from examples import run_inverted_index, run_pmi, run_word_count, run_yandex_maps
+from examples import bench_external_sort, run_inverted_index, run_pmi, run_word_count, run_yandex_maps
 from psutil import Process
 
 
@@ -121,3 +121,12 @@ def test_pmi_example_cli(tmp_path: Path) -> None:
         {"doc_id": 2, "text": "mango", "pmi": pytest.approx(expected_pmi)},
         {"doc_id": 2, "text": "apple", "pmi": pytest.approx(math.log(0.64))},
     ]
+
+
+def test_external_sort_benchmark_reports_both_transports(capsys: pytest.CaptureFixture[str]) -> None:
+    bench_external_sort.main(["--rows", "2000"])
+
+    output = capsys.readouterr().out
+    assert "per-row:" in output
+    assert "batched:" in output
+    assert "speedup:" in output
@@ -0,0 +1,308 @@
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import typing as tp
+from multiprocessing import Pipe
+from operator import itemgetter
+from pathlib import Path
+
+import pytest
+
+from compgraph import Graph
+from compgraph.external_sort import (
+    ExternalSort,
+    SortWorkerError,
+    SortWithinGroups,
+    SortWorkerPool,
+    _BatchSender,
+    _range_boundaries,
+    _recv_batch,
+    _recv_rows,
+    _send_batch,
+    approx_row_size,
+    sort_rows,
+)
+
+
+def _rows(count: int, seed: int = 0) -> list[dict]:
+    rnd = random.Random(seed)
+    return [{"key": rnd.randrange(50), "seq": i} for i in range(count)]
+
+
+def test_sort_rows_in_memory_is_stable():
+    rows = _rows(200)
+    assert list(sort_rows(iter(rows), ("key",))) == sorted(rows, key=itemgetter("key"))
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib"])
+def test_sort_rows_spills_runs_and_merges_stably(codec: str):
+    rows = _rows(1000, seed=1)
+    # budget of a few rows forces dozens of sorted runs on disk
+    limit = approx_row_size(rows[0]) * 16
+    result = list(sort_rows(iter(rows), ("key",), memory_limit=limit, codec=codec))
+    assert result == sorted(rows, key=itemgetter("key"))
+
+
+def test_sort_rows_merges_many_runs_with_few_open_files(limit_open_files: tp.Callable[[int], None]):
+    rows = _rows(3000, seed=14)
+    limit = approx_row_size(rows[0]) * 10
+    limit_open_files(24)
+    result = list(sort_rows(iter(rows), ("key",), memory_limit=limit, fan_in=8))
+    assert result == sorted(rows, key=itemgetter("key"))
+
+
+def test_sort_rows_handles_empty_input():
+    assert list(sort_rows(iter([]), ("key",), memory_limit=1)) == []
+
+
+def test_external_sort_with_small_memory_limit():
+    rows = _rows(500, seed=2)
+    result = list(ExternalSort(("key", "seq"), memory_limit=1024, in_memory_rows=0)(iter(rows)))
+    assert result == sorted(rows, key=itemgetter("key", "seq"))
+
+
+def test_graph_sort_passes_memory_limit():
+    rows = _rows(300, seed=3)
+    graph = Graph.graph_from_iter("rows").sort(["key"], memory_limit=2048)
+    assert list(graph.run(rows=lambda: iter(rows))) == sorted(rows, key=itemgetter("key"))
+
+
+def test_batches_roundtrip_with_out_of_band_buffers():
+    local, remote = Pipe()
+    rows = [{"blob": pickle.PickleBuffer(bytearray(b"payload")), "n": 1}, {"n": 2}]
+    _send_batch(local, rows)
+    received = _recv_batch(remote)
+    assert received == [{"blob": bytearray(b"payload"), "n": 1}, {"n": 2}]
+
+
+def test_batch_sender_adapts_batch_size():
+    local, remote = Pipe()
+    sender = _BatchSender(local, batch_bytes=4096)
+    for i in range(16):
+        sender.send({"i": i})
+    # the first batch is sent as soon as the initial row count is reached
+    assert len(_recv_batch(remote)) == 16
+    assert sender._batch_rows > 16
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_recv_rows_streams_until_end_marker(prefetch: int):
+    local, remote = Pipe()
+    rows = [{"i": i} for i in range(100)]
+    sender = _BatchSender(local, batch_bytes=64)
+    for row in rows:
+        sender.send(row)
+    sender.close()
+    assert list(_recv_rows(remote, prefetch)) == rows
+
+
+def test_recv_rows_reraises_transport_errors():
+    local, remote = Pipe()
+    local.close()
+    with pytest.raises(EOFError):
+        list(_recv_rows(remote, prefetch=1))
+
+
+def test_external_sort_per_row_transport():
+    rows = _rows(100, seed=4)
+    result = list(ExternalSort(("key",), batch_bytes=0, prefetch=0, in_memory_rows=0)(iter(rows)))
+    assert result == sorted(rows, key=itemgetter("key"))
+
+
+@pytest.fixture
+def pool() -> tp.Generator[SortWorkerPool, None, None]:
+    sort_pool = SortWorkerPool(max_idle=2)
+    yield sort_pool
+    sort_pool.shutdown()
+
+
+def test_pool_reuses_worker_between_sorts(pool: SortWorkerPool):
+    sort = ExternalSort(("key",), pool=pool, in_memory_rows=0)
+    rows = _rows(50, seed=5)
+    assert list(sort(iter(rows))) == sorted(rows, key=itemgetter("key"))
+    (worker,) = pool._idle
+    assert list(sort(iter(rows))) == sorted(rows, key=itemgetter("key"))
+    assert pool._idle == [worker]
+
+
+def test_pool_serves_concurrent_sorts_with_separate_workers(pool: SortWorkerPool):
+    rows = _rows(100, seed=6)
+    random.Random(6).shuffle(rows)
+    by_seq = ExternalSort(("seq",), pool=pool, in_memory_rows=0)(iter(rows))
+    result = ExternalSort(("key",), pool=pool, in_memory_rows=0)(by_seq)
+    assert list(result) == sorted(sorted(rows, key=itemgetter("seq")), key=itemgetter("key"))
+    assert len(pool._idle) == 2
+
+
+def test_pool_replaces_worker_died_while_idle(pool: SortWorkerPool):
+    sort = ExternalSort(("key",), pool=pool, in_memory_rows=0)
+    list(sort(iter(_rows(10))))
+    (worker,) = pool._idle
+    worker.process.kill()
+    worker.process.join()
+    rows = _rows(10, seed=7)
+    assert list(sort(iter(rows))) == sorted(rows, key=itemgetter("key"))
+    assert pool._idle[0] is not worker
+
+
+def test_worker_crash_during_sort_raises_and_is_discarded(pool: SortWorkerPool):
+    sort = ExternalSort(("key",), pool=pool, in_memory_rows=0)
+
+    def rows() -> tp.Iterator[dict]:
+        yield {"key": 2}
+        yield {"key": 1}
+        for worker in list(pool._busy):
+            worker.process.kill()
+            worker.process.join()
+        for i in range(10000):
+            yield {"key": i}
+
+    with pytest.raises(SortWorkerError):
+        list(sort(rows()))
+    assert not pool._busy
+    assert not pool._idle
+
+
+def test_abandoned_sort_kills_its_worker(pool: SortWorkerPool):
+    result = ExternalSort(("key",), pool=pool, in_memory_rows=0)(iter(_rows(100)))
+    next(result)
+    (worker,) = pool._busy
+    result.close()
+    assert not worker.is_alive()
+    assert not pool._busy and not pool._idle
+
+
+def test_shutdown_stops_workers_and_rejects_new_sorts(pool: SortWorkerPool):
+    list(ExternalSort(("key",), pool=pool, in_memory_rows=0)(iter(_rows(10))))
+    (worker,) = pool._idle
+    pool.shutdown()
+    assert not worker.is_alive()
+    with pytest.raises(RuntimeError):
+        list(ExternalSort(("key",), pool=pool, in_memory_rows=0)(iter(_rows(10))))
+
+
+def test_small_input_is_sorted_without_worker(pool: SortWorkerPool):
+    rows = _rows(100, seed=8)
+    result = list(ExternalSort(("key",), pool=pool)(iter(rows)))
+    assert result == sorted(rows, key=itemgetter("key"))
+    assert not pool._idle and not pool._busy
+
+
+@pytest.mark.parametrize("limits", [{"in_memory_rows": 20}, {"in_memory_bytes": 1024}])
+def test_input_over_threshold_escalates_to_worker(pool: SortWorkerPool, limits: dict[str, int]):
+    rows = _rows(100, seed=9)
+    result = list(ExternalSort(("key",), pool=pool, **limits)(iter(rows)))
+    assert result == sorted(rows, key=itemgetter("key"))
+    assert len(pool._idle) == 1
+
+
+def test_range_boundaries_are_distinct_and_increasing():
+    assert _range_boundaries(list(range(100)), 4) == [25, 50, 75]
+    assert _range_boundaries([1, 1, 1, 1, 2, 2, 3, 3], 4) == [1, 2, 3]
+    assert _range_boundaries([7], 3) == [7]
+
+
+def test_parallel_sample_sort_is_stable_across_ranges():
+    sort_pool = SortWorkerPool(max_idle=4)
+    try:
+        rows = _rows(2000, seed=10)
+        sort = ExternalSort(("key",), pool=sort_pool, in_memory_rows=200, parallelism=3)
+        assert list(sort(iter(rows))) == sorted(rows, key=itemgetter("key"))
+        assert len(sort_pool._idle) == 3
+    finally:
+        sort_pool.shutdown()
+
+
+def test_parallel_sort_samples_boundaries_past_the_buffered_head(monkeypatch: pytest.MonkeyPatch):
+    routed: tp.List[tp.List[tp.Any]] = []
+
+    def record(self: ExternalSort, workers: tp.Any, rows: tp.Iterable[tp.Dict[str, tp.Any]],
+               boundaries: tp.List[tp.Any]) -> tp.Iterator[tp.Dict[str, tp.Any]]:
+        routed.append(boundaries)
+        yield from sorted(rows, key=itemgetter("key"))
+
+    monkeypatch.setattr(ExternalSort, "_sort_in", record)
+    sort_pool = SortWorkerPool(max_idle=4)
+    try:
+        # the buffered head only holds the smallest keys
+        rows = [{"key": i // 10, "value": i % 10} for i in range(1000)][::-1]
+        rows = rows[-100:] + rows[:-100]
+        sort = ExternalSort(("key",), pool=sort_pool, in_memory_rows=100, parallelism=4)
+        assert list(sort(iter(rows))) == sorted(rows, key=itemgetter("key"))
+    finally:
+        sort_pool.shutdown()
+    (boundaries,) = routed
+    assert len(boundaries) == 3 and boundaries[-1] > 50
+
+
+def test_script_sorting_at_module_level_falls_back_to_in_process_sort(tmp_path: Path):
+    script = tmp_path / "script.py"
+    script.write_text(
+        "from compgraph.external_sort import ExternalSort\n"
+        "rows = [{'key': i % 7, 'seq': i} for i in range(100)]\n"
+        "result = list(ExternalSort(('key',), in_memory_rows=10)(iter(rows)))\n"
+        "print(result == sorted(rows, key=lambda row: row['key']))\n"
+    )
+    package_dir = Path(__file__).resolve().parents[1]
+    completed = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=120,
+                               env={**os.environ, "PYTHONPATH": str(package_dir)})
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout == "True\n"
+
+
+def test_parallel_sort_uses_single_worker_for_one_core(pool: SortWorkerPool, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 1)
+    rows = _rows(100, seed=11)
+    sort = ExternalSort(("key",), pool=pool, in_memory_rows=10, parallelism=None)
+    assert list(sort(iter(rows))) == sorted(rows, key=itemgetter("key"))
+    assert len(pool._idle) == 1
+
+
+def test_graph_sort_accepts_parallelism():
+    rows = _rows(300, seed=12)
+    graph = Graph.graph_from_iter("rows").sort(["key"], parallelism=2)
+    assert list(graph.run(rows=lambda: iter(rows))) == sorted(rows, key=itemgetter("key"))
+
+
+@pytest.mark.parametrize("in_memory_rows", [0, 20, 1000])
+def test_sorted_input_passes_through_without_worker(pool: SortWorkerPool, in_memory_rows: int):
+    rows = sorted(_rows(300, seed=13), key=itemgetter("key"))
+    result = list(ExternalSort(("key",), pool=pool, in_memory_rows=in_memory_rows)(iter(rows)))
+    assert result == rows
+    assert not pool._idle and not pool._busy
+
+
+def test_input_unsorted_after_buffer_escalates_with_spilled_rows(pool: SortWorkerPool):
+    rows = sorted(_rows(300, seed=14), key=itemgetter("key"))
+    rows.append({"key": -1, "seq": 300})
+    rows.extend(_rows(50, seed=15))
+    result = list(ExternalSort(("key",), pool=pool, in_memory_rows=20)(iter(rows)))
+    assert result == sorted(rows, key=itemgetter("key"))
+    assert len(pool._idle) == 1
+
+
+def test_sort_within_groups_sorts_each_prefix_group():
+    rows = sorted(_rows(500, seed=16), key=itemgetter("key"))
+    random.Random(16).shuffle(rows)
+    rows.sort(key=lambda row: row["key"] // 10)
+    for row in rows:
+        row["bucket"] = row["key"] // 10
+    result = list(SortWithinGroups(("bucket",), ("bucket", "key"), memory_limit=2048)(iter(rows)))
+    assert result == sorted(rows, key=itemgetter("bucket", "key"))
+
+
+def test_sort_within_groups_rejects_keys_without_prefix():
+    with pytest.raises(ValueError):
+        SortWithinGroups(("a",), ("b", "a"))
+
+
+def test_sort_rows_without_spill_creates_no_directory(monkeypatch: pytest.MonkeyPatch):
+    def forbidden(*args: tp.Any, **kwargs: tp.Any) -> None:
+        raise AssertionError("temporary directory created")
+
+    monkeypatch.setattr(tempfile, "TemporaryDirectory", forbidden)
+    rows = _rows(50, seed=17)
+    assert list(sort_rows(iter(rows), ("key",))) == sorted(rows, key=itemgetter("key"))
@@ -0,0 +1,88 @@
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, algorithms, graph as graph_module, operations
+
+
+ROWS = [{"k": "b", "x": 1}, {"k": "a", "x": 3}, {"k": "b", "x": 4}]
+
+
+class CountingMapper(operations.Mapper):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, row: operations.TRow) -> operations.TRowsGenerator:
+        self.calls += 1
+        yield {**row, "y": row["x"] * 10}
+
+
+def test_shared_subgraph_runs_once_for_all_consumers():
+    mapper = CountingMapper()
+    shared = Graph.graph_from_iter("rows").map(mapper)
+    totals = shared.sort(["k"]).reduce(operations.Sum("y"), ["k"])
+    graph = shared.sort(["k"]).join(operations.InnerJoiner(suffix_a="", suffix_b="_total"), totals, ["k"])
+    result = list(graph.run(rows=lambda: iter(ROWS)))
+    assert sorted(result, key=itemgetter("x")) == [
+        {"k": "b", "x": 1, "y": 10, "y_total": 50},
+        {"k": "a", "x": 3, "y": 30, "y_total": 30},
+        {"k": "b", "x": 4, "y": 40, "y_total": 50},
+    ]
+    assert mapper.calls == len(ROWS)
+
+    mapper.calls = 0
+    assert list(graph.run(rows=lambda: iter(ROWS))) == result
+    assert mapper.calls == len(ROWS)
+
+
+def test_mapper_changing_rows_in_place_does_not_affect_other_consumers():
+    class Increment(operations.Mapper):
+        def __call__(self, row: operations.TRow) -> operations.TRowsGenerator:
+            row["x"] += 1
+            yield row
+
+    source = Graph.graph_from_iter("rows")
+    incremented = source.map(Increment()).sort(["k"])
+    projected = source.map(operations.Project(["k", "x"])).sort(["k"])
+    graph = incremented.join(operations.InnerJoiner(), projected, ["k"])
+    rows = [{"k": k, "x": 0} for k in range(3)]
+    result = list(graph.run(rows=lambda: iter([dict(row) for row in rows])))
+    assert result == [{"k": k, "x_1": 1, "x_2": 0} for k in range(3)]
+
+
+def test_self_join_reads_graph_once():
+    mapper = CountingMapper()
+    shared = Graph.graph_from_iter("rows").map(mapper).sort(["k"])
+    graph = shared.join(operations.InnerJoiner(), shared, ["k"])
+    assert len(list(graph.run(rows=lambda: iter(ROWS)))) == 5
+    assert mapper.calls == len(ROWS)
+
+
+def test_data_source_is_read_once_per_run():
+    reads: tp.List[str] = []
+
+    def rows() -> tp.Iterator[operations.TRow]:
+        reads.append("rows")
+        return iter(ROWS)
+
+    left = Graph.graph_from_iter("rows").sort(["k"])
+    right = Graph.graph_from_iter("rows").sort(["k"]).reduce(operations.Count("n"), ["k"])
+    graph = left.join(operations.InnerJoiner(), right, ["k"])
+    assert [row["n"] for row in graph.run(rows=rows)] == [1, 2, 2]
+    assert reads == ["rows"]
+
+
+def test_pmi_sorts_shared_word_counts_once(monkeypatch: pytest.MonkeyPatch):
+    executed: tp.List[tp.Tuple[str, ...]] = []
+
+    class RecordingSort(graph_module.ExternalSort):
+        def __call__(self, rows: operations.TRowsIterable, *args: tp.Any,
+                     **kwargs: tp.Any) -> operations.TRowsGenerator:
+            executed.append(tuple(self.keys))
+            yield from super().__call__(rows, *args, **kwargs)
+
+    monkeypatch.setattr(graph_module, "ExternalSort", RecordingSort)
+    docs = [{"doc_id": 1, "text": "hello hello world"}, {"doc_id": 2, "text": "hello there"}]
+    list(algorithms.pmi_graph("docs").run(docs=lambda: iter(docs)))
+    assert executed.count(("doc_id", "text")) == 1
@@ -0,0 +1,140 @@
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, algorithms, graph as graph_module, operations
+
+
+ROWS = [
+    {"doc_id": 2, "text": "b", "count": 1},
+    {"doc_id": 1, "text": "a", "count": 3},
+    {"doc_id": 1, "text": "b", "count": 2},
+    {"doc_id": 2, "text": "a", "count": 4},
+]
+
+
+def test_sort_records_order_and_skips_sort_by_prefix():
+    graph = Graph.graph_from_iter("rows").sort(["doc_id", "text"])
+    assert graph.order == ("doc_id", "text")
+    assert graph.sort(["doc_id"]) is graph
+    assert graph.sort(["doc_id", "text"]) is graph
+    assert graph.sort(["text"]) is not graph
+    assert graph.sort(["doc_id", "text", "count"]).order == ("doc_id", "text", "count")
+
+
+def test_sources_have_no_known_order():
+    graph = Graph.graph_from_iter("rows")
+    assert graph.order == ()
+    assert graph.sort(["doc_id"]) is not graph
+
+
+def test_mappers_keep_order_prefix_of_untouched_columns():
+    graph = Graph.graph_from_iter("rows").sort(["doc_id", "text", "count"])
+    assert graph.map(operations.Filter(lambda row: True)).order == ("doc_id", "text", "count")
+    assert graph.map(operations.DummyMapper()).order == ("doc_id", "text", "count")
+    assert graph.map(operations.LowerCase("text")).order == ("doc_id",)
+    assert graph.map(operations.Split("text")).order == ("doc_id",)
+    assert graph.map(operations.FilterPunctuation("doc_id")).order == ()
+    assert graph.map(operations.Product(["count"], "count")).order == ("doc_id", "text")
+    assert graph.map(operations.ComputeColumn("extra", len)).order == ("doc_id", "text", "count")
+    assert graph.map(operations.Project(["doc_id", "count"])).order == ("doc_id",)
+
+
+def test_custom_mapper_does_not_keep_order_by_default():
+    class Shuffle(operations.Mapper):
+        def __call__(self, row: operations.TRow) -> operations.TRowsGenerator:
+            yield row
+
+    assert Graph.graph_from_iter("rows").sort(["doc_id"]).map(Shuffle()).order == ()
+
+
+def test_reduce_keeps_order_prefix_made_of_group_keys():
+    graph = Graph.graph_from_iter("rows").sort(["doc_id", "text"])
+    assert graph.reduce(operations.Count("n"), ["doc_id", "text"]).order == ("doc_id", "text")
+    assert graph.reduce(operations.Count("n"), ["text", "doc_id"]).order == ("doc_id", "text")
+    assert graph.reduce(operations.Count("n"), ["doc_id"]).order == ("doc_id",)
+    assert graph.reduce(operations.Count("n"), ["text"]).order == ()
+
+
+def test_merge_join_of_sorted_inputs_is_sorted_by_keys():
+    left = Graph.graph_from_iter("left").sort(["doc_id", "text"])
+    right = Graph.graph_from_iter("right").sort(["doc_id"])
+    assert left.join(operations.InnerJoiner(), right, ["doc_id"]).order == ("doc_id",)
+    assert left.join(operations.LeftJoiner(), right, ["doc_id"]).order == ("doc_id",)
+    assert left.join(operations.RightJoiner(), right, ["doc_id"]).order == ("doc_id",)
+    assert left.join(operations.OuterJoiner(), right, ["doc_id"]).order == ("doc_id",)
+    assert left.join(operations.InnerJoiner(), Graph.graph_from_iter("right"), ["doc_id"]).order == ()
+
+
+def test_skipped_sort_gives_same_result():
+    graph = Graph.graph_from_iter("rows") \
+        .sort(["doc_id", "text"]) \
+        .reduce(operations.Sum("count"), ["doc_id", "text"]) \
+        .sort(["doc_id"])
+    result = list(graph.run(rows=lambda: iter(ROWS)))
+    assert result == sorted(
+        [{"doc_id": r["doc_id"], "text": r["text"], "count": r["count"]} for r in ROWS],
+        key=itemgetter("doc_id", "text"),
+    )
+
+
+def test_algorithms_skip_redundant_sorts(monkeypatch: pytest.MonkeyPatch):
+    executed: tp.List[tp.Tuple[str, ...]] = []
+
+    class RecordingSort(graph_module.ExternalSort):
+        def __call__(self, rows: operations.TRowsIterable, *args: tp.Any,
+                     **kwargs: tp.Any) -> operations.TRowsGenerator:
+            executed.append(tuple(self.keys))
+            yield from super().__call__(rows, *args, **kwargs)
+
+    monkeypatch.setattr(graph_module, "ExternalSort", RecordingSort)
+    docs = [{"doc_id": 1, "text": "hello world"}, {"doc_id": 2, "text": "hello there"}]
+    list(algorithms.inverted_index_graph("docs").run(docs=lambda: iter(docs)))
+    # idf keeps the order of its reduce by text with the document count bound as a scalar, and the final sort
+    # by text follows a merge join of inputs both sorted by text
+    assert sorted(executed) == [("doc_id",), ("doc_id", "text"), ("text",), ("text",)]
+
+    executed.clear()
+    list(algorithms.pmi_graph("docs").run(docs=lambda: iter(docs)))
+    # doc lengths are summed over counts already sorted by (doc_id, text)
+    assert executed.count(("doc_id",)) == 1
+
+
+def test_sort_by_extension_of_known_order_sorts_within_groups():
+    graph = Graph.graph_from_iter("rows", sorted_by=["doc_id"])
+    assert graph.order == ("doc_id",)
+    assert graph.sort(["doc_id"]) is graph
+    within = graph.sort(["doc_id", "text"])
+    assert within.order == ("doc_id", "text")
+    rows = sorted(ROWS, key=itemgetter("doc_id"))
+    assert list(within.run(rows=lambda: iter(rows))) == sorted(ROWS, key=itemgetter("doc_id", "text"))
+
+
+def test_sort_within_groups_is_planned_for_declared_order(monkeypatch: pytest.MonkeyPatch):
+    planned: tp.List[tp.Tuple[str, ...]] = []
+
+    class RecordingSort(graph_module.SortWithinGroups):
+        def __init__(self, prefix: tp.Sequence[str], *args: tp.Any, **kwargs: tp.Any) -> None:
+            planned.append(tuple(prefix))
+            super().__init__(prefix, *args, **kwargs)
+
+    monkeypatch.setattr(graph_module, "SortWithinGroups", RecordingSort)
+    Graph.graph_from_file("rows.txt", parser=dict, sorted_by=["doc_id", "count"]).sort(["doc_id", "text"])
+    algorithms.inverted_index_graph("docs", docs_sorted=True)
+    algorithms.pmi_graph("docs", docs_sorted=True)
+    assert planned == [("doc_id",), ("doc_id",), ("doc_id",)]
+
+
+@pytest.mark.parametrize("graph_factory", [algorithms.inverted_index_graph, algorithms.pmi_graph])
+def test_algorithms_with_sorted_docs_give_same_result(graph_factory: tp.Callable[..., Graph]):
+    docs = [
+        {"doc_id": doc_id, "text": " ".join(words)}
+        for doc_id, words in enumerate([
+            ["hello", "little", "world", "little", "hello"],
+            ["little", "hello", "there", "little", "there"],
+            ["world", "world", "little", "again", "hello"],
+        ])
+    ]
+    expected = list(graph_factory("docs").run(docs=lambda: iter(docs)))
+    assert list(graph_factory("docs", docs_sorted=True).run(docs=lambda: iter(docs))) == expected
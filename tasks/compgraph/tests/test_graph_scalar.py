@@ -0,0 +1,71 @@
+import typing as tp
+
+import pytest
+
+from compgraph import Graph, operations
+
+
+ROWS = [{"k": "a", "x": 1}, {"k": "b", "x": 3}, {"k": "a", "x": 4}]
+
+
+def _total() -> Graph:
+    return Graph.graph_from_iter("rows").reduce(operations.Sum("x"), [])
+
+
+def test_compute_column_receives_bound_scalar():
+    graph = Graph.graph_from_iter("rows") \
+        .with_scalar("total", _total(), "x") \
+        .map(operations.ComputeColumn("share", lambda row, total: row["x"] / total, params=["total"]))
+    result = list(graph.run(rows=lambda: iter(ROWS)))
+    assert [row["share"] for row in result] == [0.125, 0.375, 0.5]
+    assert result[0] == {"k": "a", "x": 1, "share": 0.125}
+
+
+def test_scalar_is_computed_once_per_step_and_lazily():
+    runs: tp.List[int] = []
+
+    def rows() -> tp.Iterator[operations.TRow]:
+        runs.append(1)
+        return iter(ROWS)
+
+    graph = Graph.graph_from_iter("rows") \
+        .with_scalar("x", _total()) \
+        .map(operations.ComputeColumn("total", lambda row, x: x, params=["x"]))
+    assert [row["total"] for row in graph.run(rows=rows)] == [8, 8, 8]
+    # the source is shared by the main graph and the scalar
+    assert len(runs) == 1
+
+    runs.clear()
+    empty = Graph.graph_from_iter("empty").with_scalar("x", _total()) \
+        .map(operations.ComputeColumn("total", lambda row, x: x, params=["x"]))
+    assert list(empty.run(empty=lambda: iter([]), rows=rows)) == []
+    assert runs == []
+
+
+def test_scalar_passes_through_other_steps_and_custom_mappers():
+    class Scale(operations.Mapper):
+        def __init__(self, factor: float = 1) -> None:
+            self._factor = factor
+
+        def __call__(self, row: operations.TRow) -> operations.TRowsGenerator:
+            yield {**row, "x": row["x"] * self._factor}
+
+        def with_params(self, params: tp.Mapping[str, tp.Any]) -> "Scale":
+            return Scale(params["factor"])
+
+    factor = Graph.graph_from_iter("factor")
+    graph = Graph.graph_from_iter("rows") \
+        .with_scalar("factor", factor) \
+        .sort(["k"]) \
+        .map(operations.Filter(lambda row: row["x"] > 1)) \
+        .map(Scale())
+    result = list(graph.run(rows=lambda: iter(ROWS), factor=lambda: iter([{"factor": 10}])))
+    assert result == [{"k": "a", "x": 40}, {"k": "b", "x": 30}]
+
+
+def test_scalar_graph_must_give_one_row():
+    graph = Graph.graph_from_iter("rows") \
+        .with_scalar("x", Graph.graph_from_iter("rows")) \
+        .map(operations.ComputeColumn("y", lambda row, x: x, params=["x"]))
+    with pytest.raises(ValueError):
+        list(graph.run(rows=lambda: iter(ROWS)))
@@ -0,0 +1,68 @@
+import random
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, algorithms, graph as graph_module, operations
+
+
+def _rows(count: int, seed: int = 0) -> tp.List[dict]:
+    rnd = random.Random(seed)
+    return [{"count": rnd.randrange(20), "text": rnd.choice("abcde"), "seq": i} for i in range(count)]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("k", [0, 1, 7, 1000])
+def test_top_matches_stable_sort_prefix(k: int, descending: bool):
+    rows = _rows(300, seed=k)
+    graph = Graph.graph_from_iter("rows").top(k, ["count", "text"], descending=descending)
+    expected = sorted(rows, key=itemgetter("count", "text"), reverse=descending)[:k]
+    assert list(graph.run(rows=lambda: iter(rows))) == expected
+
+
+def test_top_order_is_known_only_when_ascending():
+    graph = Graph.graph_from_iter("rows")
+    assert graph.top(3, ["count"]).order == ("count",)
+    assert graph.top(3, ["count"], descending=True).order == ()
+
+
+def test_top_rows_keeps_first_rows_on_ties():
+    rows = [{"v": 1, "i": 0}, {"v": 2, "i": 1}, {"v": 2, "i": 2}, {"v": 1, "i": 3}]
+    assert [r["i"] for r in operations.top_rows(rows, 2, itemgetter("v"), descending=True)] == [1, 2]
+    assert [r["i"] for r in operations.top_rows(rows, 3, itemgetter("v"))] == [0, 3, 1]
+
+
+def test_limit_stops_reading_upstream():
+    def rows() -> tp.Iterator[dict]:
+        yield {"a": 1}
+        yield {"a": 2}
+        raise AssertionError("read past the limit")
+
+    graph = Graph.graph_from_iter("rows").limit(2)
+    assert list(graph.run(rows=rows)) == [{"a": 1}, {"a": 2}]
+
+
+def test_sort_followed_by_limit_becomes_top(monkeypatch: pytest.MonkeyPatch):
+    def forbidden(*args: tp.Any, **kwargs: tp.Any) -> None:
+        raise AssertionError("external sort executed")
+
+    rows = _rows(200, seed=3)
+    graph = Graph.graph_from_iter("rows").sort(["count", "text"], normalize_keys=True).limit(5)
+    monkeypatch.setattr(graph_module.ExternalSort, "__call__", forbidden)
+    assert graph.order == ("count", "text")
+    assert list(graph.run(rows=lambda: iter(rows))) == sorted(rows, key=itemgetter("count", "text"))[:5]
+
+
+def test_limit_after_other_steps_keeps_order():
+    graph = Graph.graph_from_iter("rows", sorted_by=["seq"]).sort(["seq", "text"]).limit(3)
+    rows = sorted(_rows(20, seed=4), key=itemgetter("seq"))
+    assert graph.order == ("seq", "text")
+    assert list(graph.run(rows=lambda: iter(rows))) == rows[:3]
+
+
+def test_word_count_limit_keeps_least_frequent_words():
+    docs = [{"doc_id": 1, "text": "a b b c c c"}, {"doc_id": 2, "text": "d c b"}]
+    full = list(algorithms.word_count_graph("docs").run(docs=lambda: iter(docs)))
+    limited = algorithms.word_count_graph("docs").limit(2)
+    assert list(limited.run(docs=lambda: iter(docs))) == full[:2]
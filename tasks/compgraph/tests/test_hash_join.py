@@ -0,0 +1,120 @@
+import random
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, algorithms, operations
+from compgraph.hash_join import GraceHashJoin, HashJoin
+
+
+LEFT = [
+    {"id": 3, "name": "c", "score": 1},
+    {"id": 1, "name": "a", "score": 2},
+    {"id": 2, "name": "b", "score": 3},
+    {"id": 1, "name": "d", "score": 4},
+]
+RIGHT = [
+    {"id": 1, "score": 10},
+    {"id": 4, "score": 40},
+    {"id": 1, "score": 11},
+    {"id": 2, "score": 20},
+]
+JOINERS = [operations.InnerJoiner, operations.LeftJoiner, operations.RightJoiner, operations.OuterJoiner]
+
+
+@pytest.mark.parametrize("joiner_cls", JOINERS[:3])
+@pytest.mark.parametrize("build_side", ["a", "b"])
+def test_hash_join_matches_merge_join(joiner_cls: type[operations.Joiner], build_side: str,
+                                      canonical: tp.Callable[..., list[tuple]]):
+    joiner = joiner_cls(suffix_a="_a", suffix_b="_b")
+    merged = joiner(["id"], iter(sorted(LEFT, key=itemgetter("id"))), iter(sorted(RIGHT, key=itemgetter("id"))))
+    hashed = HashJoin(joiner, ["id"], build_side)(iter(LEFT), iter(RIGHT))
+    assert canonical(hashed) == canonical(merged)
+
+
+@pytest.mark.parametrize("build_side", ["a", "b"])
+def test_hash_outer_join_keeps_both_unmatched_sides(build_side: str):
+    result = list(HashJoin(operations.OuterJoiner(), ["id"], build_side)(iter(LEFT), iter(RIGHT)))
+    assert len(result) == 7
+    assert {"id": 3, "name": "c", "score": 1} in result
+    assert {"id": 4, "score": 40} in result
+    assert {"id": 2, "name": "b", "score_1": 3, "score_2": 20} in result
+
+
+def test_hash_join_streams_probe_side_in_order():
+    result = list(HashJoin(operations.InnerJoiner(), ["id"])(iter(LEFT), iter(RIGHT)))
+    assert [(row["name"], row["score_2"]) for row in result] == [("a", 10), ("a", 11), ("b", 20), ("d", 10), ("d", 11)]
+
+
+def test_hash_join_requires_hashable_joiner():
+    class Merging(operations.Joiner):
+        def __call__(self, keys: tp.Sequence[str], rows_a: operations.TRowsIterable,
+                     rows_b: operations.TRowsIterable) -> operations.TRowsGenerator:
+            yield from ()
+
+    with pytest.raises(ValueError):
+        HashJoin(Merging(), ["id"])
+    with pytest.raises(ValueError):
+        HashJoin(operations.InnerJoiner(), ["id"], build_side="c")
+    with pytest.raises(ValueError):
+        Graph.graph_from_iter("a").join(operations.InnerJoiner(), Graph.graph_from_iter("b"), ["id"], strategy="x")
+
+
+def test_graph_hash_join_order():
+    left = Graph.graph_from_iter("a").sort(["id", "name"])
+    right = Graph.graph_from_iter("b")
+    assert left.join(operations.InnerJoiner(), right, ["id"], strategy="hash").order == ("id",)
+    assert left.join(operations.LeftJoiner(), right, ["id"], strategy="hash").order == ("id",)
+    assert left.join(operations.RightJoiner(), right, ["id"], strategy="hash").order == ()
+    assert right.join(operations.InnerJoiner(), left, ["id"], strategy="hash", build_side="a").order == ("id",)
+    graph = left.join(operations.InnerJoiner(), right, ["id"], strategy="hash")
+    result = list(graph.run(a=lambda: iter(LEFT), b=lambda: iter(RIGHT)))
+    assert [row["id"] for row in result] == [1, 1, 1, 1, 2]
+
+
+def test_yandex_maps_with_unsorted_edges():
+    times = [
+        {"edge_id": edge, "enter_time": f"20240101T0{hour}0000.000", "leave_time": f"20240101T0{hour}3000.000"}
+        for edge, hour in [(3, 1), (1, 1), (2, 2), (1, 2), (3, 2)]
+    ]
+    edges = [{"edge_id": edge, "length": length} for edge, length in [(2, 50), (3, 30), (1, 10)]]
+    random.Random(1).shuffle(edges)
+    graph = algorithms.yandex_maps_graph("times", "edges")
+    result = sorted(graph.run(times=lambda: iter(times), edges=lambda: iter(edges)), key=itemgetter("hour"))
+    assert result == [
+        {"weekday": "Mon", "hour": 1, "speed": pytest.approx(40.0)},
+        {"weekday": "Mon", "hour": 2, "speed": pytest.approx(60.0)},
+    ]
+
+
+def _rows(side: str, count: int, keys: int, seed: int) -> list[operations.TRow]:
+    rng = random.Random(seed)
+    return [{"id": rng.randrange(keys), side: i, f"{side}_pad": "x" * 30} for i in range(count)]
+
+
+@pytest.mark.parametrize("joiner_cls", JOINERS)
+@pytest.mark.parametrize("build_side", ["a", "b"])
+def test_grace_hash_join_matches_in_memory_join(joiner_cls: type[operations.Joiner], build_side: str,
+                                                canonical: tp.Callable[..., list[tuple]]):
+    left, right = _rows("a", 600, 300, 0), _rows("b", 500, 350, 1)
+    joiner = joiner_cls()
+    expected = HashJoin(joiner, ["id"], build_side)(iter(left), iter(right))
+    grace = GraceHashJoin(joiner, ["id"], build_side, memory_limit=2048, partitions=4)
+    assert canonical(grace(iter(left), iter(right))) == canonical(expected)
+
+
+def test_grace_hash_join_falls_back_to_merge_for_huge_keys(canonical: tp.Callable[..., list[tuple]]):
+    left, right = _rows("a", 200, 2, 2), _rows("b", 100, 3, 3)
+    expected = HashJoin(operations.InnerJoiner(), ["id"])(iter(left), iter(right))
+    grace = GraceHashJoin(operations.InnerJoiner(), ["id"], memory_limit=1024, partitions=2)
+    assert canonical(grace(iter(left), iter(right))) == canonical(expected)
+
+
+def test_graph_grace_join(canonical: tp.Callable[..., list[tuple]]):
+    left, right = _rows("a", 300, 50, 4), _rows("b", 300, 60, 5)
+    graph = Graph.graph_from_iter("a").sort(["id"]) \
+        .join(operations.LeftJoiner(), Graph.graph_from_iter("b"), ["id"], strategy="grace", memory_limit=4096)
+    assert graph.order == ()
+    expected = HashJoin(operations.LeftJoiner(), ["id"])(iter(left), iter(right))
+    assert canonical(graph.run(a=lambda: iter(left), b=lambda: iter(right))) == canonical(expected)
@@ -0,0 +1,101 @@
+import random
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, operations
+from compgraph import hash_reduce
+from compgraph.hash_reduce import HashReduce
+
+
+def _rows(count: int, groups: int, seed: int = 0) -> tp.List[dict]:
+    rnd = random.Random(seed)
+    return [{"g": rnd.randrange(groups), "h": rnd.choice("xy"), "v": i} for i in range(count)]
+
+
+class OpaqueSum(operations.Reducer):
+    """Plain reducer without partial states."""
+
+    def __call__(self, group_key: tp.Tuple[str, ...], rows: operations.TRowsIterable) -> operations.TRowsGenerator:
+        yield from operations.Sum("v")(group_key, rows)
+
+
+def _expected_sums(rows: tp.List[dict]) -> tp.List[dict]:
+    totals: tp.Dict[tp.Tuple[int, str], int] = {}
+    for row in rows:
+        totals[row["g"], row["h"]] = totals.get((row["g"], row["h"]), 0) + row["v"]
+    return sorted(({"g": g, "h": h, "v": v} for (g, h), v in totals.items()), key=itemgetter("g", "h"))
+
+
+def test_groups_unsorted_rows_in_memory():
+    rows = _rows(500, groups=7)
+    result = list(HashReduce(operations.Sum("v"), ["g", "h"])(iter(rows)))
+    assert sorted(result, key=itemgetter("g", "h")) == _expected_sums(rows)
+
+
+@pytest.mark.parametrize("reducer", [operations.Sum("v"), OpaqueSum()])
+@pytest.mark.parametrize("memory_limit", [2048, 64])
+def test_spills_to_partitions_over_budget(reducer: operations.Reducer, memory_limit: int):
+    rows = _rows(2000, groups=300, seed=1)
+    result = list(HashReduce(reducer, ["g", "h"], memory_limit=memory_limit, partitions=4)(iter(rows)))
+    assert sorted(result, key=itemgetter("g", "h")) == _expected_sums(rows)
+
+
+def test_huge_group_falls_back_to_sort_and_keeps_row_order():
+    class OpaqueFirst(operations.Reducer):
+        def __call__(self, group_key: tp.Tuple[str, ...], rows: operations.TRowsIterable) -> operations.TRowsGenerator:
+            yield from operations.FirstReducer()(group_key, rows)
+
+    rows = [{"g": 1, "v": i} for i in range(300)] + [{"g": 0, "v": -1}]
+    result = list(HashReduce(OpaqueFirst(), ["g"], memory_limit=1024, partitions=2)(iter(rows)))
+    assert sorted(result, key=itemgetter("g")) == [{"g": 0, "v": -1}, {"g": 1, "v": 0}]
+
+
+def test_partial_states_keep_first_rows_across_spills():
+    rows = _rows(3000, groups=400, seed=5)
+    result = list(HashReduce(operations.FirstReducer(), ["g"], memory_limit=256, partitions=2)(iter(rows)))
+    first: tp.Dict[int, dict] = {}
+    for row in rows:
+        first.setdefault(row["g"], row)
+    assert sorted(result, key=itemgetter("g")) == sorted(first.values(), key=itemgetter("g"))
+
+
+def test_partition_files_are_removed(monkeypatch: pytest.MonkeyPatch):
+    created: tp.List[hash_reduce.SpillFile] = []
+
+    class RecordingSpill(hash_reduce.SpillFile):
+        def __init__(self, *args: tp.Any, **kwargs: tp.Any) -> None:
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(hash_reduce, "SpillFile", RecordingSpill)
+    list(HashReduce(operations.Count("n"), ["g"], memory_limit=512, partitions=3)(iter(_rows(200, groups=50))))
+    assert created and all(spilled._file.closed for spilled in created)
+
+
+def test_plain_reducer_over_budget_is_sorted_without_partitions(monkeypatch: pytest.MonkeyPatch):
+    created: tp.List[hash_reduce.SpillFile] = []
+
+    class RecordingSpill(hash_reduce.SpillFile):
+        def __init__(self, *args: tp.Any, **kwargs: tp.Any) -> None:
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(hash_reduce, "SpillFile", RecordingSpill)
+    rows = _rows(2000, groups=3, seed=3)
+    result = list(HashReduce(OpaqueSum(), ["g", "h"], memory_limit=1024, partitions=4)(iter(rows)))
+    assert sorted(result, key=itemgetter("g", "h")) == _expected_sums(rows)
+    assert created == []
+
+
+def test_graph_aggregate_needs_no_sort():
+    rows = _rows(300, groups=5, seed=2)
+    graph = Graph.graph_from_iter("rows").aggregate(operations.Sum("v"), ["g", "h"])
+    assert graph.order == ()
+    assert sorted(graph.run(rows=lambda: iter(rows)), key=itemgetter("g", "h")) == _expected_sums(rows)
+
+
+def test_graph_aggregate_of_sorted_input_streams_groups():
+    graph = Graph.graph_from_iter("rows", sorted_by=["h", "g"]).aggregate(operations.Count("n"), ["g", "h"])
+    assert graph.order == ("h", "g")
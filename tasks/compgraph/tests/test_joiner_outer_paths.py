@@ -38,3 +38,28 @@ def test_outer_joiner_cross_product_for_shared_keys():
         ((1,), "a2", "b1"),
         ((1,), "a2", "b2"),
     }
+
+
+def test_outer_joiner_merges_sorted_streams_with_suffixes():
+    joiner = OuterJoiner(suffix_a="_l", suffix_b="_r")
+    left = [{"id": 1, "v": "a"}, {"id": 3, "v": "c"}, {"id": 3, "v": "d"}, {"id": 5, "v": "e"}]
+    right = [{"id": 0, "v": "x"}, {"id": 3, "v": "y"}, {"id": 4, "v": "z"}, {"id": 6, "v": "w"}]
+    assert materialize(joiner(["id"], iter(left), iter(right))) == [
+        {"id": 0, "v": "x"},
+        {"id": 1, "v": "a"},
+        {"id": 3, "v_l": "c", "v_r": "y"},
+        {"id": 3, "v_l": "d", "v_r": "y"},
+        {"id": 4, "v": "z"},
+        {"id": 5, "v": "e"},
+        {"id": 6, "v": "w"},
+    ]
+
+
+def test_outer_joiner_streams_without_reading_inputs_ahead():
+    def rows(count: int):
+        for i in range(count):
+            yield {"id": i}
+        raise AssertionError("input read past the first key groups")
+
+    result = OuterJoiner()(["id"], rows(10), rows(10))
+    assert [next(result) for _ in range(3)] == [{"id": 0}, {"id": 1}, {"id": 2}]
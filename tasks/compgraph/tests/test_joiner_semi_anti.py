@@ -0,0 +1,89 @@
+import random
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, hash_join, operations
+from compgraph.hash_join import GraceHashJoin, HashJoin
+
+
+LEFT = [{"k": 1, "v": "a"}, {"k": 2, "v": "b"}, {"k": 2, "v": "c"}, {"k": 4, "v": "d"}, {"k": 5, "v": "e"}]
+RIGHT = [{"k": 0}, {"k": 2, "v": "x"}, {"k": 2, "v": "y"}, {"k": 2, "v": "z"}, {"k": 5}, {"k": 7}]
+
+
+def test_semi_join_keeps_matched_rows_once_and_unchanged():
+    result = list(operations.SemiJoiner()(["k"], iter(LEFT), iter(RIGHT)))
+    assert result == [LEFT[1], LEFT[2], LEFT[4]]
+    assert result[0] is LEFT[1]
+
+
+def test_anti_join_keeps_unmatched_rows():
+    assert list(operations.AntiJoiner()(["k"], iter(LEFT), iter(RIGHT))) == [LEFT[0], LEFT[3]]
+    assert list(operations.AntiJoiner()(["k"], iter(LEFT), iter([]))) == LEFT
+    assert list(operations.SemiJoiner()(["k"], iter(LEFT), iter([]))) == []
+
+
+@pytest.mark.parametrize("joiner_cls", [operations.SemiJoiner, operations.AntiJoiner])
+def test_hash_filter_joins_match_merge(joiner_cls: tp.Type[operations.FilterJoiner]):
+    rng = random.Random(0)
+    left = [{"k": rng.randrange(200), "i": i} for i in range(1000)]
+    right = [{"k": rng.randrange(300)} for _ in range(150)]
+    joiner = joiner_cls()
+    merged = list(joiner(["k"], iter(sorted(left, key=itemgetter("k"))), iter(sorted(right, key=itemgetter("k")))))
+    hashed = list(HashJoin(joiner, ["k"])(iter(left), iter(right)))
+    assert hashed == [row for row in left if row in merged]
+    grace = GraceHashJoin(joiner, ["k"], memory_limit=1024, partitions=4)(iter(left), iter(right))
+    assert sorted(grace, key=itemgetter("i")) == hashed
+    with pytest.raises(ValueError):
+        HashJoin(joiner, ["k"], build_side="a")
+
+
+def test_grace_filter_join_does_not_spill_repeated_build_keys(monkeypatch: pytest.MonkeyPatch):
+    created: tp.List[hash_join.SpillFile] = []
+
+    class RecordingSpill(hash_join.SpillFile):
+        def __init__(self, *args: tp.Any, **kwargs: tp.Any) -> None:
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(hash_join, "SpillFile", RecordingSpill)
+    left = [{"k": k, "v": k} for k in range(10)]
+    right = [{"k": i % 3, "pad": "x" * 50} for i in range(500)]
+    grace = GraceHashJoin(operations.SemiJoiner(), ["k"], memory_limit=2048)(iter(left), iter(right))
+    assert list(grace) == left[:3]
+    assert created == []
+
+
+def test_grace_filter_join_charges_and_spills_keys_only(monkeypatch: pytest.MonkeyPatch):
+    written: tp.List[operations.TRow] = []
+
+    class RecordingSpill(hash_join.SpillFile):
+        def write(self, row: operations.TRow) -> None:
+            written.append(row)
+            super().write(row)
+
+    monkeypatch.setattr(hash_join, "SpillFile", RecordingSpill)
+    left = [{"k": k, "v": k} for k in range(0, 200, 3)]
+    right = [{"k": k, "pad": "x" * 5000} for k in range(100)]
+    grace = GraceHashJoin(operations.AntiJoiner(), ["k"], memory_limit=32 * 1024)(iter(left), iter(right))
+    assert sorted(grace, key=itemgetter("k")) == left[34:]
+    assert written == []
+
+    grace = GraceHashJoin(operations.SemiJoiner(), ["k"], memory_limit=2048, partitions=4)(iter(left), iter(right))
+    assert sorted(grace, key=itemgetter("k")) == left[:34]
+    assert written
+    assert all(set(row) in ({"k"}, {"k", "v"}) for row in written)
+
+
+def test_graph_filter_joins_keep_order_of_joined_graph():
+    left = Graph.graph_from_iter("left").sort(["k", "v"])
+    right = Graph.graph_from_iter("right").sort(["k"])
+    semi = left.join(operations.SemiJoiner(), right, ["k"])
+    assert semi.order == ("k", "v")
+    anti = Graph.graph_from_iter("left").join(operations.AntiJoiner(), Graph.graph_from_iter("right"), ["k"],
+                                              strategy="hash")
+    assert anti.order == ()
+    sources = {"left": lambda: iter(reversed(LEFT)), "right": lambda: iter(RIGHT)}
+    assert list(semi.run(**sources)) == [LEFT[1], LEFT[2], LEFT[4]]
+    assert list(anti.run(**sources)) == [LEFT[3], LEFT[0]]
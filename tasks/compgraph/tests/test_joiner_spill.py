@@ -0,0 +1,44 @@
+import tracemalloc
+import typing as tp
+
+import pytest
+
+from compgraph import operations
+
+
+def _rows(side: str, count: int, key: int = 1) -> tp.Iterator[operations.TRow]:
+    for i in range(count):
+        yield {"key": key, side: i, f"{side}_text": "x" * 100}
+
+
+@pytest.mark.parametrize("joiner_cls", [
+    operations.InnerJoiner, operations.LeftJoiner, operations.RightJoiner, operations.OuterJoiner,
+])
+def test_hot_key_groups_spill_with_same_result(joiner_cls: tp.Type[operations.Joiner]):
+    left = [*_rows("a", 300), *_rows("a", 2, key=2)]
+    right = [*_rows("b", 200), *_rows("b", 3, key=3)]
+    expected = list(joiner_cls()(["key"], iter(left), iter(right)))
+    spilled = list(joiner_cls(memory_limit=2048)(["key"], iter(left), iter(right)))
+    assert spilled == expected
+    assert len(expected) >= 60000
+
+
+@pytest.mark.parametrize("joiner_cls, buffered_side", [
+    (operations.InnerJoiner, "a"),
+    (operations.LeftJoiner, "b"),
+    (operations.RightJoiner, "b"),
+    (operations.OuterJoiner, "b"),
+])
+def test_hot_key_group_memory_stays_flat(joiner_cls: tp.Type[operations.Joiner], buffered_side: str):
+    big = _rows(buffered_side, 50000)
+    single = _rows("b" if buffered_side == "a" else "a", 1)
+    rows_a, rows_b = (big, single) if buffered_side == "a" else (single, big)
+    tracemalloc.start()
+    try:
+        joined = joiner_cls(memory_limit=64 * 1024)(["key"], rows_a, rows_b)
+        assert sum(1 for _ in joined) == 50000
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # the buffered group alone would take about 10 MiB
+    assert peak < 3 * 1024 * 1024
@@ -0,0 +1,86 @@
+import random
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, operations
+from compgraph.external_sort import sort_rows
+from compgraph.keys import key_getter, normalize, normalize_value, normalized_key_getter
+
+
+def test_key_getter_shapes():
+    row = {"a": 1, "b": "x", "c": None}
+    assert key_getter([])(row) == ()
+    assert key_getter(["a"])(row) == 1
+    assert key_getter(["a", "b"])(row) == (1, "x")
+    assert key_getter(["b"], normalize=True)(row) == normalize_value("x")
+
+
+@pytest.mark.parametrize("values", [
+    [5, -3, 0, 2 ** 70, -(2 ** 70), 2 ** 53 + 1, 2 ** 53, 2 ** 53 - 1, -(2 ** 60) - 1, -(2 ** 60)],
+    [0.5, -1.25, 3, 2, -7, float("inf"), float("-inf"), 1e300, -1e-300, True, False],
+    ["", "a", "ab", "b", "a\x00", "a\x00b", "\x00", "я", "z", "aa"],
+    [b"", b"\x00", b"\x00\x00", b"a", b"\xff", b"a\x00b"],
+    [(1, "a"), (1,), (), (0, "z"), (1, "a", None), (1, "b")],
+])
+def test_normalized_order_matches_python_order(values: list):
+    assert sorted(values, key=normalize_value) == sorted(values)
+
+
+def test_normalized_order_across_types():
+    values = [(1,), b"x", "x", 10, None, 2.5]
+    assert sorted(values, key=normalize_value) == [None, 2.5, 10, "x", b"x", (1,)]
+
+
+def test_equal_numbers_have_equal_keys():
+    assert normalize_value(1) == normalize_value(1.0) == normalize_value(True)
+    assert normalize_value(0.0) == normalize_value(-0.0)
+    assert normalize_value(2 ** 60) != normalize_value(2 ** 60 + 1)
+
+
+def test_composite_keys_compare_column_by_column():
+    rows = [{"a": a, "b": b} for a in ["x", "xy", None] for b in [2, 1, None]]
+    random.Random(0).shuffle(rows)
+    getter = normalized_key_getter(["a", "b"])
+    ordered = sorted(rows, key=getter)
+    assert [(r["a"], r["b"]) for r in ordered] == [
+        (None, None), (None, 1), (None, 2),
+        ("x", None), ("x", 1), ("x", 2),
+        ("xy", None), ("xy", 1), ("xy", 2),
+    ]
+    assert normalized_key_getter([])(rows[0]) == b"" == normalize([])
+
+
+def test_unsupported_values_are_rejected():
+    class Opaque:
+        pass
+
+    with pytest.raises(TypeError):
+        normalize_value(Opaque())
+
+
+def test_subclasses_use_base_encoding():
+    class Name(str):
+        pass
+
+    assert normalize_value(Name("abc")) == normalize_value("abc")
+
+
+def test_sort_with_normalized_keys_orders_none_first():
+    rows = [{"k": "b"}, {"k": None}, {"k": "a"}, {"k": None}]
+    assert list(sort_rows(iter(rows), ("k",), normalize_keys=True)) == [
+        {"k": None}, {"k": None}, {"k": "a"}, {"k": "b"},
+    ]
+    graph = Graph.graph_from_iter("rows").sort(["k"], normalize_keys=True)
+    assert [row["k"] for row in graph.run(rows=lambda: iter(rows))] == [None, None, "a", "b"]
+
+
+def test_merge_join_over_normalized_keys():
+    left = [{"k": None, "a": 1}, {"k": 1, "a": 2}, {"k": "x", "a": 3}]
+    right = [{"k": None, "b": 1}, {"k": 1.0, "b": 2}, {"k": "y", "b": 3}]
+    joiner = operations.InnerJoiner(normalize_keys=True)
+    result = list(joiner(["k"], iter(left), iter(right)))
+    assert sorted(result, key=itemgetter("a")) == [
+        {"k": None, "a": 1, "b": 1},
+        {"k": 1, "a": 2, "b": 2},
+    ]
@@ -0,0 +1,66 @@
+import random
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, operations
+
+
+USERS = [{"uid": 1, "name": "ann"}, {"uid": 2, "name": "bob"}, {"uid": 3, "name": "cid"}]
+ORDERS = [{"uid": 1, "total": 10}, {"uid": 1, "total": 15}, {"uid": 3, "total": 7}, {"uid": 4, "total": 1}]
+VISITS = [{"uid": 1, "page": "a"}, {"uid": 2, "page": "b"}, {"uid": 3, "page": "c"}, {"uid": 3, "page": "d"}]
+
+
+def test_multi_join_matches_chained_inner_joins(canonical: tp.Callable[..., list[tuple]]):
+    result = list(operations.MultiJoin(["uid"])(iter(USERS), iter(ORDERS), iter(VISITS)))
+    joiner = operations.InnerJoiner()
+    chained = joiner(["uid"], joiner(["uid"], iter(USERS), iter(ORDERS)), iter(VISITS))
+    assert canonical(result) == canonical(chained)
+    assert [row["uid"] for row in result] == [1, 1, 3, 3]
+
+
+def test_two_way_multi_join_equals_joiner_with_suffixes(canonical: tp.Callable[..., list[tuple]]):
+    rng = random.Random(0)
+    left = sorted(({"k": rng.randrange(20), "v": i} for i in range(100)), key=itemgetter("k"))
+    right = sorted(({"k": rng.randrange(25), "v": -i} for i in range(80)), key=itemgetter("k"))
+    expected = operations.InnerJoiner()(["k"], iter(left), iter(right))
+    assert canonical(operations.MultiJoin(["k"])(iter(left), iter(right))) == canonical(expected)
+
+
+def test_left_and_outer_multi_joins_and_suffixes():
+    left = list(operations.MultiJoin(["uid"], how="left", suffixes=["_u", "_o", "_v"])(
+        iter(USERS), iter(ORDERS), iter([{"uid": 2, "name": "visitor"}])))
+    assert left == [
+        {"uid": 1, "name": "ann", "total": 10},
+        {"uid": 1, "name": "ann", "total": 15},
+        {"uid": 2, "name_u": "bob", "name_v": "visitor"},
+        {"uid": 3, "name": "cid", "total": 7},
+    ]
+    outer = list(operations.MultiJoin(["uid"], how="outer")(iter(USERS), iter(ORDERS)))
+    assert [row["uid"] for row in outer] == [1, 1, 2, 3, 4]
+    assert outer[-1] == {"uid": 4, "total": 1}
+    with pytest.raises(ValueError):
+        operations.MultiJoin(["uid"], how="cross")
+    with pytest.raises(ValueError):
+        list(operations.MultiJoin(["uid"], suffixes=["_a"])(iter(USERS), iter(ORDERS)))
+
+
+def test_multi_join_spills_large_groups():
+    left = [{"k": 1, "a": i, "pad": "x" * 50} for i in range(100)]
+    right = [{"k": 1, "b": i} for i in range(30)]
+    small = operations.MultiJoin(["k"], memory_limit=1024)(iter(left), iter(right))
+    assert list(small) == list(operations.MultiJoin(["k"])(iter(left), iter(right)))
+
+
+def test_graph_join_many_sorts_inputs_and_is_sorted_by_keys(canonical: tp.Callable[..., list[tuple]]):
+    users = Graph.graph_from_iter("users", sorted_by=["uid"])
+    orders = Graph.graph_from_iter("orders")
+    visits = Graph.graph_from_iter("visits")
+    graph = Graph.join_many([users, orders, visits], ["uid"])
+    assert graph.order == ("uid",)
+    result = list(graph.run(users=lambda: iter(USERS), orders=lambda: iter(reversed(ORDERS)),
+                            visits=lambda: iter(reversed(VISITS))))
+    assert canonical(result) == canonical(operations.MultiJoin(["uid"])(iter(USERS), iter(ORDERS), iter(VISITS)))
+    with pytest.raises(ValueError):
+        Graph.join_many([], ["uid"])
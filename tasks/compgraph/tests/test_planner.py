@@ -0,0 +1,117 @@
+import typing as tp
+from operator import itemgetter
+
+import pytest
+
+from compgraph import Graph, graph as graph_module, operations
+from compgraph.planner import AutoAggregate, AutoJoin
+
+
+class Passthrough(operations.Reducer):
+    def __call__(self, group_key: tuple[str, ...], rows: operations.TRowsIterable) -> operations.TRowsGenerator:
+        yield from rows
+
+
+def _rows(side: str, keys: tp.Iterable[int]) -> list[operations.TRow]:
+    return [{"id": key, f"{side}_value": i, f"{side}_pad": "x" * 50} for i, key in enumerate(keys)]
+
+
+def _merged(joiner: operations.Joiner, left: list[operations.TRow],
+            right: list[operations.TRow]) -> list[operations.TRow]:
+    return list(joiner(["id"], iter(sorted(left, key=itemgetter("id"))), iter(sorted(right, key=itemgetter("id")))))
+
+
+@pytest.mark.parametrize("left_size, right_size, choice", [
+    (500, 5, "hash_b"),
+    (5, 500, "hash_a"),
+    (500, 500, "grace"),
+])
+@pytest.mark.parametrize("joiner_cls", [operations.InnerJoiner, operations.LeftJoiner, operations.OuterJoiner])
+def test_auto_join_picks_strategy_by_input_sizes(
+        left_size: int, right_size: int, choice: str, joiner_cls: type[operations.Joiner],
+        canonical: tp.Callable[..., list[tuple]]):
+    left = _rows("a", [(7 * i) % 97 for i in range(left_size)])
+    right = _rows("b", [(5 * i) % 89 for i in range(right_size)])
+    join_op = AutoJoin(joiner_cls(), ["id"], memory_limit=8 * 1024)
+    assert canonical(join_op(iter(left), iter(right))) == canonical(_merged(joiner_cls(), left, right))
+    assert join_op.choices == {choice: 1}
+
+
+def test_auto_join_never_builds_on_kept_side_of_filter_joiner(canonical: tp.Callable[..., list[tuple]]):
+    left = _rows("a", range(5))
+    right = _rows("b", range(0, 1000, 2))
+    join_op = AutoJoin(operations.SemiJoiner(), ["id"], memory_limit=8 * 1024)
+    assert canonical(join_op(iter(left), iter(right))) == canonical(left[::2])
+    assert join_op.choices == {"grace": 1}
+
+
+def test_auto_join_rejects_merge_only_joiner():
+    class MergeOnly(operations.InnerJoiner):
+        keeps_unmatched = None  # type: ignore[assignment]
+
+    with pytest.raises(ValueError):
+        AutoJoin(MergeOnly(), ["id"])
+
+
+@pytest.mark.parametrize("reducer, choice", [
+    (Passthrough(), "sort"),
+    (operations.FirstReducer(), "hash"),
+])
+def test_auto_aggregate_sorts_rows_that_do_not_collapse(reducer: operations.Reducer, choice: str,
+                                                        canonical: tp.Callable[..., list[tuple]]):
+    rows = [{"id": (7 * i) % 101, "v": i} for i in range(101)]
+    aggregate_op = AutoAggregate(reducer, ["id"], sample_rows=50)
+    result = list(aggregate_op(iter(rows)))
+    expected = operations.Reduce(reducer, ["id"])(iter(sorted(rows, key=itemgetter("id"))))
+    assert canonical(result) == canonical(expected)
+    assert aggregate_op.choices == {choice: 1}
+
+
+def test_auto_aggregate_hashes_collapsing_keys(canonical: tp.Callable[..., list[tuple]]):
+    rows = [{"id": i % 3, "v": i} for i in range(100)]
+    aggregate_op = AutoAggregate(Passthrough(), ["id"], sample_rows=50)
+    assert canonical(aggregate_op(iter(rows))) == canonical(rows)
+    assert aggregate_op.choices == {"hash": 1}
+
+
+def test_graph_auto_join_merges_sorted_inputs(monkeypatch: pytest.MonkeyPatch,
+                                              canonical: tp.Callable[..., list[tuple]]):
+    planned: list[str] = []
+
+    class RecordingAutoJoin(graph_module.AutoJoin):
+        def __init__(self, *args: tp.Any, **kwargs: tp.Any) -> None:
+            planned.append("auto")
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(graph_module, "AutoJoin", RecordingAutoJoin)
+    left = Graph.graph_from_iter("left").sort(["id"])
+    right = Graph.graph_from_iter("right").sort(["id"])
+    assert left.join(operations.InnerJoiner(), right, ["id"], strategy="auto").order == ("id",)
+    assert planned == []
+    unsorted = Graph.graph_from_iter("left").join(
+        operations.InnerJoiner(), Graph.graph_from_iter("right"), ["id"], strategy="auto")
+    assert unsorted.order == ()
+    assert planned == ["auto"]
+
+    left_rows, right_rows = _rows("a", [3, 1, 2, 1]), _rows("b", [2, 4, 1])
+    result = unsorted.run(left=lambda: iter(left_rows), right=lambda: iter(right_rows))
+    assert canonical(result) == canonical(_merged(operations.InnerJoiner(), left_rows, right_rows))
+
+
+def test_graph_auto_join_sorts_unsorted_inputs_of_merge_only_joiner(canonical: tp.Callable[..., list[tuple]]):
+    class MergeOnly(operations.InnerJoiner):
+        keeps_unmatched = None  # type: ignore[assignment]
+
+    left_rows, right_rows = _rows("a", [3, 1, 2, 1]), _rows("b", [2, 4, 1])
+    graph = Graph.graph_from_iter("left").join(MergeOnly(), Graph.graph_from_iter("right"), ["id"], strategy="auto")
+    assert graph.order == ("id",)
+    result = graph.run(left=lambda: iter(left_rows), right=lambda: iter(right_rows))
+    assert canonical(result) == canonical(_merged(operations.InnerJoiner(), left_rows, right_rows))
+
+
+def test_graph_rejects_unknown_strategies():
+    graph = Graph.graph_from_iter("rows")
+    with pytest.raises(ValueError):
+        graph.join(operations.InnerJoiner(), graph, ["id"], strategy="nested")
+    with pytest.raises(ValueError):
+        graph.aggregate(operations.Count("n"), ["id"], strategy="nested")
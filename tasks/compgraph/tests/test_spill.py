@@ -0,0 +1,151 @@
+import datetime
+import typing as tp
+from pathlib import Path
+
+import pytest
+
+from compgraph import spill
+from compgraph.spill import SpillBuffer, SpillFile, SpillTee, decode_block, encode_block, read_rows, write_rows
+
+
+ROWS = [
+    {"doc_id": 1, "text": "hello", "score": 0.5, "tags": ["a", "b"], "missing": None},
+    {"doc_id": 2, "text": "world", "score": 1.5, "tags": [], "missing": None},
+    {"edge_id": 7, "start": (37.5, 55.7)},
+]
+
+
+@pytest.mark.parametrize("codec", spill.CODECS)
+def test_block_roundtrip_keeps_mixed_schemas(codec: str):
+    assert list(decode_block(encode_block(ROWS, codec))) == ROWS
+
+
+def test_block_stores_column_names_once_per_schema():
+    rows = [{"a_rather_long_column_name": i} for i in range(100)]
+    block = encode_block(rows)
+    assert block.count(b"a_rather_long_column_name") == 1
+
+
+def test_block_falls_back_to_pickle_for_non_builtin_values():
+    rows = [
+        {"when": datetime.date(2024, 1, 1)},
+        {"nested": [datetime.date(2024, 1, 2)]},
+    ]
+    assert list(decode_block(encode_block(rows))) == rows
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        encode_block(ROWS, "zstd")
+
+
+def test_compression_shrinks_repetitive_blocks():
+    rows = [{"text": "lorem ipsum dolor sit amet"} for _ in range(1000)]
+    assert len(encode_block(rows, "zlib")) < len(encode_block(rows)) // 10
+
+
+def test_file_roundtrip_over_many_blocks(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(spill, "_RELEASE_BYTES", 1)  # release pages after every block
+    path = str(tmp_path / "rows.bin")
+    rows = [{"i": i, "text": "x" * (i % 7)} for i in range(5000)]
+    write_rows(path, rows, codec="zlib", block_rows=100)
+    assert list(read_rows(path)) == rows
+
+
+def test_empty_file_yields_nothing(tmp_path: Path):
+    path = str(tmp_path / "empty.bin")
+    write_rows(path, [])
+    assert list(read_rows(path)) == []
+
+
+def test_spill_file_replays_and_removes_itself():
+    with SpillFile(block_rows=3) as spilled:
+        spilled.write_all(ROWS * 3)
+        assert len(spilled) == 9
+        assert list(spilled) == ROWS * 3
+        spilled.write({"late": True})
+        assert list(spilled)[-1] == {"late": True}
+        path = Path(spilled.path)
+    assert not path.exists()
+    spilled.close()  # closing twice is harmless
+
+
+def test_spill_file_replays_rows_between_offsets():
+    with SpillFile(block_rows=2) as spilled:
+        spilled.write_all(ROWS)
+        middle = spilled.tell()
+        spilled.write_all(ROWS * 2)
+        end = spilled.tell()
+        spilled.write(ROWS[0])
+        assert list(spilled.read(0, middle)) == ROWS
+        assert list(spilled.read(middle, end)) == ROWS * 2
+        assert list(spilled.read(end)) == [ROWS[0]]
+
+
+def test_spill_buffer_keeps_small_groups_in_memory_and_spills_large_ones():
+    with SpillBuffer(memory_limit=10 ** 6) as small:
+        for row in ROWS:
+            small.append(row)
+        assert not small.spilled
+        assert list(small) == ROWS
+
+    rows = [{"i": i, "text": "x" * 50} for i in range(100)]
+    with SpillBuffer(memory_limit=1024) as large:
+        for row in rows:
+            large.append(row)
+        assert large.spilled
+        assert len(large) == 100
+        assert list(large) == rows
+        assert list(large) == rows
+        path = Path(large._spilled.path)
+    assert not path.exists()
+
+
+def test_spill_tee_reads_stream_once_for_readers_at_any_pace():
+    pulled = []
+
+    def source():
+        for i in range(100):
+            pulled.append(i)
+            yield {"i": i, "text": "x" * 50}
+
+    tee = SpillTee(source, consumers=3, memory_limit=2048, chunk_rows=10)
+    first, second = tee.reader(), tee.reader()
+    assert pulled == []
+    ahead = list(first)
+    assert len(ahead) == 100 and tee.spilled
+    assert tee._spill is not None
+    path = Path(tee._spill.path)
+    assert [next(second)["i"] for _ in range(3)] == [0, 1, 2]
+    assert [row["i"] for row in tee.reader()] == list(range(100))
+    assert pulled == list(range(100))
+    second.close()
+    assert not path.exists()
+
+
+def test_spill_tee_releases_chunks_passed_by_all_readers():
+    tee = SpillTee(lambda: ({"i": i} for i in range(50)), consumers=2, chunk_rows=10)
+    first, second = tee.reader(), tee.reader()
+    for _ in range(25):
+        assert next(first) == next(second)
+    assert tee._chunks[:2] == [None, None] and tee._chunks[2] is not None
+    with pytest.raises(ValueError):
+        tee.reader()
+
+
+def test_spill_tee_readers_get_rows_of_their_own():
+    tee = SpillTee(lambda: ({"i": i} for i in range(5)), consumers=2, chunk_rows=2)
+    first, second = tee.reader(), tee.reader()
+    for row in first:
+        row["i"] = -1
+    assert [row["i"] for row in second] == list(range(5))
+
+
+def test_spill_tee_appends_all_spilled_chunks_to_one_file(limit_open_files: tp.Callable[[int], None]):
+    tee = SpillTee(lambda: ({"i": i, "text": "x" * 50} for i in range(5000)), consumers=2, memory_limit=1024,
+                   chunk_rows=10)
+    first, second = tee.reader(), tee.reader()
+    limit_open_files(8)
+    assert [row["i"] for row in first] == list(range(5000))
+    assert len(tee._chunks) == 500 and tee.spilled
+    assert [row["i"] for row in second] == list(range(5000))